@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+历史窗口基准：对比各历史策略下请求体大小、估算token数和延迟随对话轮数的增长
+
+离线模式只计算每轮 /api/chat1/stream 与 stream_generate 的请求体字节数与估算token数，
+助手回复用固定长度的样例文本代替；指定 --server 时对每种策略各跑一个真实会话并记录每轮延迟
+
+用法:
+    python bench_history.py --rounds 30
+    python bench_history.py --rounds 20 --server http://127.0.0.1:5001 --plan
+    python bench_history.py --policies full,last:4,tokens:3000,pinned:3 --scenario scenario_sample.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import glob
+import json
+import os
+import time
+import uuid
+
+import http_client
+import test_interactive
+from history_policy import estimate_tokens, message_tokens, parse_policy
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_POLICIES = "full,last:3,last:6,tokens:4000,pinned:3"
+
+
+def load_user_messages(scenario_path=None):
+    """用户消息来源：场景文件的各轮消息，默认 scenario_sample.json"""
+    scenario = test_interactive.load_scenario(scenario_path or os.path.join(FIXTURE_DIR, "scenario_sample.json"))
+    return [round_data["message"] for round_data in scenario["rounds"]]
+
+
+def sample_reply(chars):
+    """用样例计划中的步骤描述拼出一段长度为 chars 的助手回复"""
+    path = sorted(glob.glob(os.path.join(FIXTURE_DIR, "plan_and_tasks_*.json")))[0]
+    with open(path, "r", encoding="utf-8") as f:
+        text = "".join(step.get("description", "") for step in json.load(f)["plan"]) or "好的。"
+    return (text * (chars // len(text) + 1))[:chars]
+
+
+def payload_bytes(messages, session_id, lang="zh"):
+    """
+    按客户端实际发送的格式计算请求体大小
+
+    aiohttp 的 json= 参数使用 json.dumps 默认参数（ensure_ascii=True），中文按 \\uXXXX 转义，
+    每个汉字占6字节
+
+    返回:
+    - (chat请求字节数, stream_generate请求字节数)
+    """
+    chat = {"id": session_id, "messages": messages, "lang": lang}
+    plan = {"id": session_id, "messages": messages, "lang": lang, "retrive_enabled": True,
+            "advise": json.dumps({"updateSteps": [1], "reason": "更新"}, ensure_ascii=False)}
+    return len(json.dumps(chat).encode("utf-8")), len(json.dumps(plan).encode("utf-8"))
+
+
+def offline_growth(policies, rounds, user_messages, reply):
+    """
+    离线计算各策略每轮的请求大小
+
+    返回:
+    - {策略名: [(chat字节, plan字节, 估算token数, 消息条数), ...每轮一项]}
+    """
+    session_id = uuid.uuid4().hex
+    results = {str(p): [] for p in policies}
+    messages = []
+    for round_number in range(rounds):
+        messages.append({"role": "user", "content": user_messages[round_number % len(user_messages)]})
+        for policy in policies:
+            window = policy.apply(messages)
+            chat_bytes, plan_bytes = payload_bytes(window, session_id)
+            tokens = sum(message_tokens(m) for m in window)
+            results[str(policy)].append((chat_bytes, plan_bytes, tokens, len(window)))
+        messages.append({"role": "assistant", "content": reply})
+    return results
+
+
+async def online_growth(server_url, policies, rounds, user_messages, with_plan=False):
+    """
+    对每种策略跑一个真实会话，记录每轮chat（及可选的计划生成）延迟
+
+    返回:
+    - {策略名: [(chat秒, plan秒或None, chat字节), ...每轮一项]}，调用失败时对应秒数为None
+    """
+    results = {}
+    for policy in policies:
+        session_id = f"history_{uuid.uuid4().hex[:8]}"
+        messages = []
+        rows = results[str(policy)] = []
+        for round_number in range(rounds):
+            messages.append({"role": "user", "content": user_messages[round_number % len(user_messages)]})
+            window = policy.apply(messages)
+            chat_bytes, _ = payload_bytes(window, session_id)
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                start_time = time.perf_counter()
+                _, chat_response = await test_interactive.call_chat_api(server_url, window, session_id)
+                chat_seconds = time.perf_counter() - start_time if chat_response else None
+                plan_seconds = None
+                if with_plan and chat_response:
+                    start_time = time.perf_counter()
+                    plan = await test_interactive.call_stream_generate(
+                        server_url, window, session_id, is_update=round_number > 0,
+                        advise={"updateSteps": chat_response.get("updateSteps") or [1],
+                                "reason": chat_response.get("reason") or "基于对话内容的自动更新"})
+                    plan_seconds = time.perf_counter() - start_time if plan else None
+            rows.append((chat_seconds, plan_seconds, chat_bytes))
+            reply = chat_response.get("response", "") if chat_response else ""
+            messages.append({"role": "assistant", "content": reply})
+            print(f"[{policy}] 第 {round_number + 1} 轮: chat {chat_bytes / 1024:.1f} KB, "
+                  f"{'失败' if chat_seconds is None else f'{chat_seconds:.2f}s'}"
+                  + (f", plan {'失败' if plan_seconds is None else f'{plan_seconds:.2f}s'}" if with_plan else ""))
+    return results
+
+
+def _cell(value, fmt):
+    return "-" if value is None else format(value, fmt)
+
+
+def print_offline(results, rounds, step):
+    names = list(results)
+    print("\n请求体大小 (chat KB / 估算token) 随轮数增长:")
+    print(f"{'轮数':>6}" + "".join(f"{name:>20}" for name in names))
+    for i in range(0, rounds, step):
+        row = f"{i + 1:>6}"
+        for name in names:
+            chat_bytes, _, tokens, _ = results[name][i]
+            row += f"{chat_bytes / 1024:>12.1f} /{tokens:>6}"
+        print(row)
+    print(f"\n第 {rounds} 轮 stream_generate 请求体 (KB):")
+    for name in names:
+        _, plan_bytes, _, count = results[name][-1]
+        print(f"  {name:<16}{plan_bytes / 1024:>10.1f}  ({count} 条消息)")
+
+
+def print_online(results, rounds, step, with_plan):
+    names = list(results)
+    print("\n每轮延迟 (秒)" + ("，chat / plan" if with_plan else "，chat") + ":")
+    print(f"{'轮数':>6}" + "".join(f"{name:>20}" for name in names))
+    for i in range(0, rounds, step):
+        row = f"{i + 1:>6}"
+        for name in names:
+            chat_seconds, plan_seconds, _ = results[name][i]
+            cell = _cell(chat_seconds, ".2f")
+            if with_plan:
+                cell += f" / {_cell(plan_seconds, '.2f')}"
+            row += f"{cell:>20}"
+        print(row)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="对话历史窗口基准")
+    parser.add_argument("--policies", default=DEFAULT_POLICIES, help="逗号分隔的历史策略")
+    parser.add_argument("--rounds", type=int, default=30, help="对话轮数")
+    parser.add_argument("--scenario", help="用户消息来源的场景文件，默认 scenario_sample.json")
+    parser.add_argument("--reply-chars", type=int, default=800, help="离线模式下每条助手回复的字符数")
+    parser.add_argument("--step", type=int, default=1, help="报告中每隔多少轮输出一行")
+    parser.add_argument("--server", help="指定时对每种策略跑真实会话并记录延迟")
+    parser.add_argument("--plan", action="store_true", help="真实会话中每轮同时调用计划生成")
+    http_client.add_client_args(parser)
+    args = parser.parse_args()
+    try:
+        policies = [parse_policy(spec.strip()) for spec in args.policies.split(",") if spec.strip()]
+    except ValueError as e:
+        parser.error(str(e))
+    http_client.configure_from_args(args)
+
+    user_messages = load_user_messages(args.scenario)
+    reply = sample_reply(args.reply_chars)
+    print(f"策略: {', '.join(map(str, policies))}; {args.rounds} 轮; "
+          f"离线助手回复 {args.reply_chars} 字符 (约 {estimate_tokens(reply)} token)")
+    print_offline(offline_growth(policies, args.rounds, user_messages, reply), args.rounds, args.step)
+
+    if args.server:
+        async def run():
+            try:
+                return await online_growth(args.server, policies, args.rounds, user_messages, args.plan)
+            finally:
+                await http_client.close()
+
+        results = asyncio.run(run())
+        print_online(results, args.rounds, args.step, args.plan)
+
+
+if __name__ == "__main__":
+    main()
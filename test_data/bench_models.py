@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+解码基准：对比当前的 json.loads 得到普通字典，与各后端解码为类型化模型的耗时和峰值内存
+
+用法:
+    python bench_models.py
+    python bench_models.py --file sampleoutput/plan_and_tasks_xxx.json --rounds 50
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+import tracemalloc
+
+import models
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure(func, rounds):
+    """返回 (最快一次耗时, 平均耗时, 峰值内存字节)"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return min(timings), sum(timings) / len(timings), peak
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="计划/任务解码基准")
+    parser.add_argument("--file", help="计划JSON文件，默认使用 plan_and_tasks_*.json 样例")
+    parser.add_argument("--rounds", type=int, default=20, help="每种方式运行次数")
+    args = parser.parse_args()
+
+    path = args.file or sorted(glob.glob(os.path.join(FIXTURE_DIR, "plan_and_tasks_*.json")))[0]
+    with open(path, "rb") as f:
+        raw = f.read()
+    print(f"输入: {os.path.basename(path)} ({len(raw) / 1024:.1f} KB), 后端: {', '.join(models.BACKENDS)}")
+
+    cases = [("json.loads (dict)", lambda: json.loads(raw))]
+    if models.orjson is not None:
+        cases.append(("orjson.loads (dict)", lambda: models.orjson.loads(raw)))
+    for backend in models.BACKENDS:
+        cases.append((f"{backend} -> Plan", lambda backend=backend: models.decode(raw, models.Plan, backend)))
+
+    print(f"{'方式':<24}{'最快(ms)':>12}{'平均(ms)':>12}{'峰值内存(KB)':>14}")
+    for name, func in cases:
+        best, mean, peak = measure(func, args.rounds)
+        print(f"{name:<24}{best * 1000:>12.3f}{mean * 1000:>12.3f}{peak / 1024:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对冲与熔断基准：在带长尾的替身后端上对比不对冲与按不同分位数对冲时，
+搜索与任务生成接口的 p50/p99 以及多发出的请求比例；并模拟一次后端故障，
+对比有无熔断时故障期间的调用耗时与打到故障后端的请求数
+
+默认在进程内启动 mock_server，各接口约 3% 的请求变成慢请求（见 DEFAULT_PROFILE）；
+也可用 --profile 指定 mock_server 的延迟配置文件，或用 --server 对真实后端只跑对冲部分
+
+用法:
+    python bench_resilience.py
+    python bench_resilience.py --calls 500 --percentiles 90,95,99
+    python bench_resilience.py --server http://127.0.0.1:5001 --endpoints web_search,task_generate
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import time
+
+import http_client
+import mock_server
+import open_loop
+import resilience
+import test_interactive
+import test_search
+from latency_stats import LatencyHistogram
+
+# 进程内替身后端的默认延迟配置：正常请求较快，约3%的请求很慢
+DEFAULT_PROFILE = {
+    "web_search": {"latency": 0.2, "jitter": 0.05, "slow_rate": 0.03, "slow_latency": 3.0},
+    "video_search": {"latency": 0.3, "jitter": 0.1, "slow_rate": 0.03, "slow_latency": 3.0},
+    "task_generate": {"latency": 1.0, "jitter": 0.2, "slow_rate": 0.03, "slow_latency": 8.0},
+}
+
+KEYWORDS = [("人工智能最新发展", "zh"), ("Python tutorial for beginners", "en"), ("Pandas数据分析", "zh")]
+
+
+def make_profiles(path=None):
+    """替身后端的接口配置：指定文件时按 mock_server 的格式读取，否则使用 DEFAULT_PROFILE"""
+    if path:
+        return mock_server.load_profiles(path)
+    profiles = mock_server.load_profiles()
+    for name, overrides in DEFAULT_PROFILE.items():
+        profiles[name] = mock_server.EndpointProfile(**overrides)
+    return profiles
+
+
+def make_caller(endpoint, server_url):
+    """
+    返回一次调用该接口的协程函数 (序号) -> 是否成功
+    """
+    if endpoint == "task_generate":
+        step = open_loop.load_sample_step()
+
+        async def call(index):
+            data = dict(step, id=f"bench_resilience_{index}")
+            return await test_interactive.call_task_generate_api(server_url, data) is not None
+        return call
+
+    search_endpoint = endpoint.replace("_search", "")
+
+    async def call(index):
+        keyword, lang = KEYWORDS[index % len(KEYWORDS)]
+        try:
+            await test_search.search_once(search_endpoint, keyword, lang, server_url)
+        except Exception:
+            return False
+        return True
+    return call
+
+
+async def run_calls(call, calls, concurrency):
+    """
+    以固定并发执行 calls 次调用
+
+    返回:
+    - (延迟直方图, 失败次数)
+    """
+    hist = LatencyHistogram("latency")
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index):
+        nonlocal failures
+        async with semaphore:
+            start_time = time.perf_counter()
+            ok = await call(index)
+            hist.record(time.perf_counter() - start_time)
+            if not ok:
+                failures += 1
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return hist, failures
+
+
+async def bench_hedging(server_url, endpoints, policies, calls, concurrency, warmup, backend=None, out=None):
+    """
+    对每个接口、每种对冲策略各跑一轮
+
+    参数:
+    - policies: [(名称, HedgePolicy或None), ...]
+    - warmup: 正式计时前的调用次数，用于积累对冲所需的延迟样本
+    - backend: 进程内替身后端，用于统计实际到达后端的请求数
+    - out: 进度输出的文件对象，默认 sys.stdout
+
+    返回:
+    - [(接口, 策略名称, 直方图, 失败次数, 额外请求比例, 对冲胜出次数), ...]
+    """
+    rows = []
+    for endpoint in endpoints:
+        call = make_caller(endpoint, server_url)
+        for name, policy in policies:
+            current = resilience.configure(policy)
+            await run_calls(call, warmup, concurrency)
+            before_guard = dict(current.guard(endpoint).stats) if current else None
+            before_backend = backend.request_counts[endpoint] if backend else None
+            hist, failures = await run_calls(call, calls, concurrency)
+            hedge_wins = 0
+            if backend is not None:
+                requests = backend.request_counts[endpoint] - before_backend
+            elif current is not None:
+                requests = current.guard(endpoint).stats["requests"] - before_guard["requests"]
+            else:
+                requests = calls
+            if current is not None:
+                hedge_wins = current.guard(endpoint).stats["hedge_wins"] - before_guard["hedge_wins"]
+            rows.append((endpoint, name, hist, failures, (requests - calls) / calls, hedge_wins))
+            print(f"  {endpoint:<14}{name:<12} p99 {hist.percentile(99):.3f}s, 额外请求 {(requests - calls) / calls:.1%}",
+                  file=out or sys.stdout, flush=True)
+    resilience.configure()
+    return rows
+
+
+async def bench_breaker(server_url, backend, endpoint, calls, concurrency, failures_threshold, outage_latency):
+    """
+    模拟后端故障：该接口每个请求都在 outage_latency 秒后返回500，对比有无熔断
+
+    返回:
+    - [(名称, 直方图, 到达后端的请求数, 快速失败次数), ...]
+    """
+    profile = backend.profiles[endpoint]
+    saved = dict(vars(profile))
+    profile.latency, profile.jitter, profile.slow_rate, profile.error_rate = outage_latency, 0.0, 0.0, 1.0
+    call = make_caller(endpoint, server_url)
+    rows = []
+    try:
+        for name, threshold in (("无熔断", None), (f"熔断@{failures_threshold}", failures_threshold)):
+            current = resilience.configure(breaker_failures=threshold, breaker_reset=3600.0)
+            before = backend.request_counts[endpoint]
+            hist, _ = await run_calls(call, calls, concurrency)
+            fast_failed = current.guard(endpoint).stats["fast_failed"] if current else 0
+            rows.append((name, hist, backend.request_counts[endpoint] - before, fast_failed))
+    finally:
+        vars(profile).update(saved)
+        resilience.configure()
+    return rows
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="对冲请求与熔断基准")
+    parser.add_argument("--server", help="真实后端URL；不指定时在进程内启动带长尾的替身后端")
+    parser.add_argument("--profile", help="替身后端的延迟配置文件（mock_server 格式）")
+    parser.add_argument("--endpoints", default="web_search,video_search,task_generate", help="逗号分隔的接口")
+    parser.add_argument("--percentiles", default="95,99", help="对比的对冲分位数，逗号分隔")
+    parser.add_argument("--calls", type=int, default=300, help="每种策略正式计时的调用次数")
+    parser.add_argument("--warmup", type=int, default=30, help="每种策略的预热调用次数")
+    parser.add_argument("--concurrency", type=int, default=10, help="并发调用数")
+    parser.add_argument("--min-delay", type=float, default=0.05, help="对冲等待时间下限(秒)")
+    parser.add_argument("--outage-calls", type=int, default=100, help="故障模拟的调用次数，0表示跳过")
+    parser.add_argument("--outage-latency", type=float, default=2.0, help="故障期间每个请求失败前的耗时(秒)")
+    parser.add_argument("--breaker", type=int, default=5, help="故障模拟中熔断的连续失败阈值")
+    parser.add_argument("--seed", type=int, default=1, help="替身后端随机种子")
+    http_client.add_client_args(parser)
+    args = parser.parse_args()
+    http_client.configure_from_args(args)
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = [e for e in endpoints if e not in ("web_search", "video_search", "task_generate")]
+    if unknown:
+        parser.error(f"不支持的接口: {', '.join(unknown)}")
+    policies = [("不对冲", None)] + [
+        (f"p{float(p):g}", resilience.HedgePolicy(float(p), args.min_delay))
+        for p in args.percentiles.split(",") if p.strip()]
+
+    async def run():
+        runner = backend = None
+        server_url = args.server
+        if server_url is None:
+            runner, server_url, backend = await mock_server.start_mock_server(
+                profiles=make_profiles(args.profile), seed=args.seed)
+        try:
+            print(f"后端: {server_url}{'（进程内替身后端）' if backend else ''}, "
+                  f"每种策略 {args.calls} 次调用, 并发 {args.concurrency}")
+            out = sys.stdout
+            breaker_rows = None
+            # 调用过程中的逐条错误输出（故障模拟时每次都会失败）没有意义，只保留进度
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                hedge_rows = await bench_hedging(server_url, endpoints, policies, args.calls,
+                                                 args.concurrency, args.warmup, backend, out)
+                if backend is not None and args.outage_calls:
+                    breaker_rows = await bench_breaker(server_url, backend, endpoints[0], args.outage_calls,
+                                                       args.concurrency, args.breaker, args.outage_latency)
+            return hedge_rows, breaker_rows
+        finally:
+            await http_client.close()
+            if runner is not None:
+                await runner.cleanup()
+
+    hedge_rows, breaker_rows = asyncio.run(run())
+
+    print(f"\n{'接口':<16}{'策略':<10}{'p50':>9}{'p99':>9}{'max':>9}{'p99变化':>10}{'额外请求':>10}"
+          f"{'对冲胜出':>10}{'失败':>6}")
+    baseline = {}
+    for endpoint, name, hist, failures, extra, wins in hedge_rows:
+        p99 = hist.percentile(99)
+        baseline.setdefault(endpoint, p99)
+        change = (p99 - baseline[endpoint]) / baseline[endpoint] if baseline[endpoint] else 0.0
+        print(f"{endpoint:<16}{name:<10}{hist.percentile(50):>9.3f}{p99:>9.3f}{hist.max:>9.3f}"
+              f"{change:>10.1%}{extra:>10.1%}{wins:>10}{failures:>6}")
+
+    if breaker_rows:
+        print(f"\n故障模拟 ({endpoints[0]} 每个请求 {args.outage_latency:g}秒后返回500, {args.outage_calls} 次调用):")
+        print(f"{'策略':<12}{'平均耗时':>10}{'p99':>9}{'到达后端':>10}{'快速失败':>10}")
+        for name, hist, requests, fast_failed in breaker_rows:
+            print(f"{name:<12}{hist.mean:>10.3f}{hist.percentile(99):>9.3f}{requests:>10}{fast_failed:>10}")
+
+
+if __name__ == "__main__":
+    main()
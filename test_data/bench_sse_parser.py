@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SSE解析基准：对比原有逐行解析方式与增量SSEParser
+
+原有方式: 逐行 startswith(b'data: ') -> decode -> replace('data: ', '') -> json.loads
+新方式:   SSEParser.feed(原始字节块) -> json.loads(event.data)
+
+数据来源默认是用 plan_and_tasks_*.json 拼出的计划流（含视频与网页搜索结果），
+也可以用 --cassette 读取 cassette.py 录制的真实流
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import time
+import tracemalloc
+
+from sse_parser import SSEParser
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def build_fixture_stream(repeat):
+    """用样例计划拼出一条SSE流，repeat控制重复次数"""
+    path = sorted(glob.glob(os.path.join(FIXTURE_DIR, "plan_and_tasks_*.json")))[0]
+    with open(path, "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    frames = [{"message": "开始生成学习计划"}, {"introduction": saved["introduction"]}]
+    steps = saved["plan"]
+    for step in steps:
+        frames.append({"step": step, "step_number": step["step"], "total": len(steps)})
+    frames.append({"done": True, "plan": {"plan": steps}})
+    one = b"".join(b"data: " + json.dumps(f, ensure_ascii=False).encode("utf-8") + b"\n\n" for f in frames)
+    return one * repeat
+
+
+def load_cassette_stream(path):
+    """拼接磁带中所有 text/event-stream 响应的原始数据"""
+    from cassette import load_cassette
+    streams = [b"".join(data for _, data in call.chunks)
+               for call in load_cassette(path) if "event-stream" in call.content_type]
+    return b"".join(streams)
+
+
+def split_chunks(stream, min_size, max_size, seed):
+    """按随机大小切分字节流，模拟网络读取"""
+    rng = random.Random(seed)
+    chunks = []
+    pos = 0
+    while pos < len(stream):
+        size = rng.randint(min_size, max_size)
+        chunks.append(stream[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def legacy_parse(chunks, decode_json=True):
+    """原有方式；先按StreamReader.readline的行为把字节块切成行"""
+    count = 0
+    pending = b""
+    for chunk in chunks:
+        data = pending + chunk
+        lines = data.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            line = line + b"\n"
+            if line.startswith(b'data: '):
+                json_str = line.decode('utf-8').replace('data: ', '')
+                if decode_json:
+                    json.loads(json_str)
+                count += 1
+    return count
+
+
+def parser_parse(chunks, decode_json=True):
+    """增量SSEParser"""
+    count = 0
+    parser = SSEParser()
+    for chunk in chunks:
+        for event in parser.feed(chunk):
+            if decode_json:
+                json.loads(event.data)
+            count += 1
+    for event in parser.close():
+        if decode_json:
+            json.loads(event.data)
+        count += 1
+    return count
+
+
+def measure(func, chunks, rounds, decode_json):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        count = func(chunks, decode_json)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    func(chunks, decode_json)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, best, peak
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="SSE解析基准")
+    parser.add_argument("--cassette", help="使用录制的磁带作为输入")
+    parser.add_argument("--repeat", type=int, default=20, help="样例流重复次数")
+    parser.add_argument("--min-chunk", type=int, default=1024, help="最小字节块大小")
+    parser.add_argument("--max-chunk", type=int, default=16384, help="最大字节块大小")
+    parser.add_argument("--rounds", type=int, default=5, help="每种方式运行次数，取最快一次")
+    parser.add_argument("--seed", type=int, default=0, help="切块随机种子")
+    args = parser.parse_args()
+
+    stream = load_cassette_stream(args.cassette) if args.cassette else build_fixture_stream(args.repeat)
+    chunks = split_chunks(stream, args.min_chunk, args.max_chunk, args.seed)
+    size_mb = len(stream) / 1024 / 1024
+    print(f"输入: {size_mb:.2f} MB, {len(chunks)} 个字节块")
+
+    print(f"{'方式':<20}{'JSON':>6}{'事件数':>8}{'耗时(ms)':>12}{'MB/s':>10}{'峰值内存(KB)':>14}")
+    for decode_json in (False, True):
+        for name, func in (("legacy readline", legacy_parse), ("SSEParser", parser_parse)):
+            count, elapsed, peak = measure(func, chunks, args.rounds, decode_json)
+            print(f"{name:<20}{'是' if decode_json else '否':>6}{count:>8}{elapsed * 1000:>12.2f}"
+                  f"{size_mb / elapsed:>10.1f}{peak / 1024:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
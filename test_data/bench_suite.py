@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+回归基准套件：对 test_data 覆盖的每个接口以固定并发跑固定次数，记录延迟分位数、吞吐与
+请求/响应字节数，保存为带版本标签的基线文件，并与指定基线比较，指标退化超过阈值时以非0退出，
+用于在每次后端部署后按延迟而不只是按返回200把关
+
+基准项:
+- plan_create / plan_update: 流式计划创建、更新（更新前先为每个并发槽位创建一次计划，
+  收到done帧即开始更新，不再固定等待）
+- chat: /api/chat1/stream
+- task_generate / task_detect / task_execute: 任务生成与任务更新
+- web_search / video_search / image_search: 三个搜索接口
+
+基线文件: baselines/<标签>.json，格式版本见 BASELINE_FORMAT
+
+用法:
+    python bench_suite.py --server http://127.0.0.1:5001 --save-baseline v1.4.0
+    python bench_suite.py --server http://127.0.0.1:5001 --baseline v1.4.0 --threshold 0.15 --threshold p99=0.3
+    python bench_suite.py --mock --cases chat,web_search --baseline latest
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import glob
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import aiohttp
+
+import http_client
+import mock_server
+import open_loop
+import test_interactive
+import test_plan_stream
+import test_search
+import test_task_update
+from cassette import ObservedStream
+from chat_stream import stream_chat
+from latency_stats import LatencyHistogram, format_report
+
+DEFAULT_SERVER = "http://172.30.116.44:5001"
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_DIR = os.path.join(FIXTURE_DIR, "baselines")
+
+# 基线文件格式版本，字段含义变化时递增
+BASELINE_FORMAT = 1
+
+# 参与回归判断的指标 -> 方向；'lower' 表示越小越好
+COMPARED_METRICS = {
+    "p50": "lower",
+    "p99": "lower",
+    "throughput": "higher",
+    "request_bytes": "lower",
+    "response_bytes": "lower",
+    "error_rate": "lower",
+    "first_step_p50": "lower",
+    "ttft_p50": "lower",
+}
+
+# 绝对变化小于该值时不判为退化，避免很小的数值因抖动误报
+MIN_DELTA = {
+    "p50": 0.005,
+    "p99": 0.005,
+    "first_step_p50": 0.005,
+    "ttft_p50": 0.005,
+    "throughput": 0.05,
+    "request_bytes": 64,
+    "response_bytes": 64,
+    "error_rate": 0.01,
+}
+
+
+class ByteCounter:
+    """统计基准期间所有请求的请求体与响应体字节数，aiohttp与httpx客户端都会计入"""
+
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self._httpx_responses = []
+
+    def reset(self):
+        self.sent = 0
+        self.received = 0
+        self._httpx_responses = []
+
+    def totals(self):
+        """返回 (请求字节, 响应字节)；httpx响应按实际下载字节数计"""
+        received = self.received + sum(r.num_bytes_downloaded for r in self._httpx_responses)
+        return self.sent, received
+
+    def trace_config(self):
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_chunk_sent(session, ctx, params):
+            self.sent += len(params.chunk)
+
+        async def on_request_end(session, ctx, params):
+            def on_data(data):
+                self.received += len(data)
+
+            params.response.content = ObservedStream(params.response.content, on_data)
+
+        trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
+        trace_config.on_request_end.append(on_request_end)
+        return trace_config
+
+    def event_hooks(self):
+        async def on_request(request):
+            self.sent += int(request.headers.get("content-length", 0) or 0)
+
+        async def on_response(response):
+            self._httpx_responses.append(response)
+
+        return {"request": [on_request], "response": [on_response]}
+
+
+class BenchCase:
+    """
+    一个基准项
+
+    参数:
+    - name: 名称
+    - call: 协程函数 (server_url, 序号, 槽位状态, 共享上下文) -> (是否成功, {附加耗时})
+    - setup: 可选协程函数 (server_url, 槽位序号, 共享上下文) -> 槽位状态，在计时开始前为每个并发槽位执行一次
+    """
+
+    def __init__(self, name, call, setup=None):
+        self.name = name
+        self.call = call
+        self.setup = setup
+
+
+async def _plan(server_url, mode, chat_id):
+    session = await http_client.get_session()
+    timings = await test_plan_stream.timed_stream_generate(session, server_url, mode, chat_id)
+    return timings["ok"], {"first_step": timings["first_step"]}
+
+
+async def call_plan_create(server_url, index, state, context):
+    return await _plan(server_url, "create", f"bench_{context['run_id']}_{index}")
+
+
+async def setup_plan_update(server_url, slot, context):
+    chat_id = f"bench_{context['run_id']}_update_{slot}"
+    await _plan(server_url, "create", chat_id)
+    return chat_id
+
+
+async def call_plan_update(server_url, index, chat_id, context):
+    return await _plan(server_url, "update", chat_id)
+
+
+async def call_chat(server_url, index, state, context):
+    messages = [{"role": "user", "content": "我想学习Python数据分析"}]
+    try:
+        result = await stream_chat(server_url, messages, f"bench_{context['run_id']}_{index}")
+    except Exception:
+        return False, {}
+    return True, {"ttft": result.ttft}
+
+
+async def call_task_generate(server_url, index, state, context):
+    step = dict(context["step"], id=f"bench_{context['run_id']}_{index}")
+    return await test_interactive.call_task_generate_api(server_url, step) is not None, {}
+
+
+async def call_task_detect(server_url, index, state, context):
+    item = context["update_items"][index % len(context["update_items"])]
+    result = await test_task_update.post_json(f"{server_url}{test_task_update.DETECT_PATH}", item)
+    return bool(result and result.get("success", True)), {}
+
+
+async def call_task_execute(server_url, index, state, context):
+    item = context["update_items"][index % len(context["update_items"])]
+    payload = {"task_data": item["task_data"], "suggestion": f"根据用户反馈调整任务: {item['user_message']}",
+               "lang": item["lang"], "chat_id": item["chat_id"]}
+    result = await test_task_update.post_json(f"{server_url}{test_task_update.EXECUTE_PATH}", payload)
+    return bool(result and result.get("success", True)), {}
+
+
+def _search_call(endpoint):
+    async def call(server_url, index, state, context):
+        keyword, lang = context["corpus"][index % len(context["corpus"])]
+        try:
+            await test_search.search_once(endpoint, keyword, lang, server_url)
+        except Exception:
+            return False, {}
+        return True, {}
+    return call
+
+
+CASES = {case.name: case for case in [
+    BenchCase("plan_create", call_plan_create),
+    BenchCase("plan_update", call_plan_update, setup_plan_update),
+    BenchCase("chat", call_chat),
+    BenchCase("task_generate", call_task_generate),
+    BenchCase("task_detect", call_task_detect),
+    BenchCase("task_execute", call_task_execute),
+    BenchCase("web_search", _search_call("web")),
+    BenchCase("video_search", _search_call("video")),
+    BenchCase("image_search", _search_call("image")),
+]}
+
+
+def make_context():
+    """各基准项共享的请求数据"""
+    return {
+        "run_id": uuid.uuid4().hex[:8],
+        "step": open_loop.load_sample_step(),
+        "update_items": test_task_update.load_update_corpus(),
+        "corpus": test_search.load_corpus(os.path.join(FIXTURE_DIR, "search_corpus.tsv")),
+    }
+
+
+async def run_case(case, server_url, calls, concurrency, warmup, context, counter):
+    """
+    运行一个基准项：concurrency 个槽位并发，每个槽位循环取下一个序号直到完成 calls 次
+
+    返回:
+    - (指标字典, 延迟直方图列表)；指标包括 count/failures/error_rate/p50/p90/p99/max/throughput/
+      request_bytes/response_bytes（每次调用平均字节数）以及附加耗时的 <名称>_p50/<名称>_p99
+    """
+    states = [None] * concurrency
+    if case.setup is not None:
+        states = await asyncio.gather(*(case.setup(server_url, slot, context) for slot in range(concurrency)))
+    indexes = itertools.count()
+    latency = LatencyHistogram(case.name)
+    extras = {}
+    failures = 0
+
+    async def slot_loop(slot, total, record):
+        nonlocal failures
+        while True:
+            index = next(indexes)
+            if index >= total:
+                return
+            start_time = time.perf_counter()
+            try:
+                ok, extra = await case.call(server_url, index, states[slot], context)
+            except Exception:
+                ok, extra = False, {}
+            if not record:
+                continue
+            if not ok:
+                failures += 1
+                continue
+            latency.record(time.perf_counter() - start_time)
+            for name, value in extra.items():
+                extras.setdefault(name, LatencyHistogram(f"{case.name}.{name}")).record(value)
+
+    if warmup:
+        await asyncio.gather(*(slot_loop(slot, warmup, False) for slot in range(concurrency)))
+        indexes = itertools.count()
+    counter.reset()
+    start_time = time.perf_counter()
+    await asyncio.gather(*(slot_loop(slot, calls, True) for slot in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+    sent, received = counter.totals()
+
+    summary = latency.summary()
+    metrics = {
+        "count": calls,
+        "failures": failures,
+        "error_rate": failures / calls if calls else 0.0,
+        "p50": summary["p50"],
+        "p90": summary["p90"],
+        "p99": summary["p99"],
+        "max": summary["max"],
+        "throughput": (calls - failures) / elapsed if elapsed else 0.0,
+        "request_bytes": sent / calls if calls else 0,
+        "response_bytes": received / calls if calls else 0,
+        "elapsed": elapsed,
+    }
+    for name, hist in extras.items():
+        metrics[f"{name}_p50"] = hist.percentile(50)
+        metrics[f"{name}_p99"] = hist.percentile(99)
+    return metrics, [latency] + list(extras.values())
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=FIXTURE_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_baseline(label, server_url, settings, results):
+    """组装基线文件内容"""
+    return {
+        "format": BASELINE_FORMAT,
+        "label": label,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "client_commit": _git_commit(),
+        "server": server_url,
+        "settings": settings,
+        "results": results,
+    }
+
+
+def baseline_path(label, baseline_dir=BASELINE_DIR):
+    """标签或路径 -> 基线文件路径；'latest' 表示目录中最新创建的基线"""
+    if label.endswith(".json") or os.sep in label:
+        return label
+    if label == "latest":
+        paths = glob.glob(os.path.join(baseline_dir, "*.json"))
+        if not paths:
+            raise FileNotFoundError(f"{baseline_dir} 中还没有基线文件")
+        return max(paths, key=lambda p: load_baseline(p)["created_at"])
+    return os.path.join(baseline_dir, f"{label}.json")
+
+
+def load_baseline(path):
+    with open(path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("format") != BASELINE_FORMAT:
+        raise ValueError(f"{path}: 基线格式版本 {baseline.get('format')} 与当前版本 {BASELINE_FORMAT} 不一致，请重新生成")
+    return baseline
+
+
+def save_baseline(baseline, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+
+
+def parse_thresholds(specs, default=0.1, error_rate=0.02):
+    """
+    解析 --threshold：'0.15' 修改除错误率外所有指标的阈值，'p99=0.3' 单独指定某个指标
+
+    返回:
+    - {指标: 允许的相对退化比例}，error_rate 为允许增加的绝对比例
+    """
+    thresholds = {metric: default for metric in COMPARED_METRICS}
+    thresholds["error_rate"] = error_rate
+    for spec in specs or []:
+        metric, sep, value = spec.partition("=")
+        if not sep:
+            thresholds.update({m: float(metric) for m in COMPARED_METRICS if m != "error_rate"})
+            continue
+        if metric not in COMPARED_METRICS:
+            raise ValueError(f"未知指标: {metric}，可选 {', '.join(COMPARED_METRICS)}")
+        thresholds[metric] = float(value)
+    return thresholds
+
+
+def compare(baseline_results, results, thresholds):
+    """
+    逐项逐指标与基线比较
+
+    错误率按绝对值比较（阈值即允许增加的比例点数），其余指标按相对变化比较
+
+    返回:
+    - [(基准项, 指标, 基线值, 当前值, 变化, 状态), ...]，状态为 ok/regressed/improved/new
+    """
+    rows = []
+    for case, metrics in results.items():
+        base = baseline_results.get(case)
+        if base is None:
+            rows.append((case, "-", None, None, None, "new"))
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            old, new = base.get(metric), metrics.get(metric)
+            if old is None or new is None:
+                continue
+            delta = new - old
+            worse = delta > 0 if direction == "lower" else delta < 0
+            if metric == "error_rate":
+                change = delta
+                exceeded = abs(delta) > thresholds[metric]
+            else:
+                change = delta / old if old else (float("inf") if delta else 0.0)
+                exceeded = abs(change) > thresholds[metric] and abs(delta) >= MIN_DELTA[metric]
+            status = "ok"
+            if exceeded:
+                status = "regressed" if worse else "improved"
+            rows.append((case, metric, old, new, change, status))
+    return rows
+
+
+def format_results(results):
+    lines = [f"{'基准项':<16}{'次数':>6}{'失败':>6}{'p50':>9}{'p90':>9}{'p99':>9}{'吞吐/s':>9}"
+             f"{'请求B':>10}{'响应B':>11}"]
+    for case, m in results.items():
+        cells = [m["p50"], m["p90"], m["p99"]]
+        lines.append(f"{case:<16}{m['count']:>6}{m['failures']:>6}"
+                     + "".join(f"{'-' if v is None else f'{v:.3f}':>9}" for v in cells)
+                     + f"{m['throughput']:>9.2f}{m['request_bytes']:>10.0f}{m['response_bytes']:>11.0f}")
+    return "\n".join(lines)
+
+
+def format_comparison(rows, label):
+    labels = {"ok": "正常", "regressed": "退化", "improved": "改善", "new": "新增"}
+    lines = [f"与基线 {label} 比较:", f"{'基准项':<16}{'指标':<16}{'基线':>12}{'当前':>12}{'变化':>10}  状态"]
+    for case, metric, old, new, change, status in rows:
+        if status == "new":
+            lines.append(f"{case:<16}{'-':<16}{'-':>12}{'-':>12}{'-':>10}  {labels[status]}")
+            continue
+        change_text = f"{change:+.1%}" if metric != "error_rate" else f"{change * 100:+.1f}pt"
+        lines.append(f"{case:<16}{metric:<16}{old:>12.3f}{new:>12.3f}{change_text:>10}  {labels[status]}")
+    return "\n".join(lines)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="回归基准套件")
+    parser.add_argument("--server", default=DEFAULT_SERVER, help="服务器URL")
+    parser.add_argument("--mock", action="store_true", help="在进程内启动替身后端代替 --server")
+    parser.add_argument("--profile", help="--mock 时替身后端的延迟配置文件")
+    parser.add_argument("--cases", default=",".join(CASES), help="逗号分隔的基准项")
+    parser.add_argument("--calls", type=int, default=20, help="每个基准项计时的调用次数")
+    parser.add_argument("--concurrency", type=int, default=2, help="每个基准项的并发数")
+    parser.add_argument("--warmup", type=int, default=2, help="每个基准项计时前的预热调用次数")
+    parser.add_argument("--baseline", help="与之比较的基线标签、路径或 latest")
+    parser.add_argument("--save-baseline", metavar="LABEL", help="把本次结果保存为该标签的基线（如部署版本号）")
+    parser.add_argument("--baseline-dir", default=BASELINE_DIR, help="基线目录")
+    parser.add_argument("--threshold", action="append", metavar="[METRIC=]RATIO",
+                        help="允许的退化比例，默认0.1（error_rate 为允许增加的绝对值，默认0.02）；"
+                             "可重复，如 --threshold p99=0.3")
+    parser.add_argument("--output", help="把本次结果（基线格式）另存到该路径")
+    parser.add_argument("--verbose", action="store_true", help="保留逐条接口输出")
+    http_client.add_client_args(parser)
+    args = parser.parse_args()
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error(f"未知基准项: {', '.join(unknown)}，可选 {', '.join(CASES)}")
+    try:
+        thresholds = parse_thresholds(args.threshold)
+    except ValueError as e:
+        parser.error(str(e))
+    baseline = None
+    if args.baseline:
+        try:
+            path = baseline_path(args.baseline, args.baseline_dir)
+            baseline = load_baseline(path)
+        except (OSError, ValueError) as e:
+            parser.error(f"无法读取基线: {e}")
+    http_client.configure_from_args(args)
+    counter = ByteCounter()
+    http_client.add_trace_config(counter.trace_config())
+    http_client.add_event_hooks(counter.event_hooks())
+
+    async def run():
+        runner = None
+        server_url = args.server
+        if args.mock:
+            runner, server_url, _ = await mock_server.start_mock_server(profiles=mock_server.load_profiles(args.profile))
+        try:
+            context = make_context()
+            results = {}
+            histograms = []
+            out = sys.stdout
+            print(f"回归基准: {server_url}, 每项 {args.calls} 次, 并发 {args.concurrency}, 预热 {args.warmup} 次")
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                for name in cases:
+                    print(f"  运行 {name} ...", file=out, flush=True)
+                    results[name], hists = await run_case(CASES[name], server_url, args.calls, args.concurrency,
+                                                          args.warmup, context, counter)
+                    histograms.extend(hists)
+            return server_url, results, histograms
+        finally:
+            await http_client.close()
+            if runner is not None:
+                await runner.cleanup()
+
+    server_url, results, histograms = asyncio.run(run())
+    print()
+    print(format_results(results))
+    print()
+    print(format_report(histograms))
+
+    settings = {"calls": args.calls, "concurrency": args.concurrency, "warmup": args.warmup, "mock": args.mock}
+    label = args.save_baseline or datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    current = build_baseline(label, server_url, settings, results)
+    if args.save_baseline:
+        path = baseline_path(args.save_baseline, args.baseline_dir)
+        save_baseline(current, path)
+        print(f"\n基线已保存到 {path}")
+    if args.output:
+        save_baseline(current, args.output)
+
+    if baseline is None:
+        return
+    if baseline["settings"] != settings:
+        print(f"\n注意: 基线的运行参数 {baseline['settings']} 与本次 {settings} 不同，比较结果仅供参考")
+    rows = compare(baseline["results"], results, thresholds)
+    print()
+    print(format_comparison(rows, baseline["label"]))
+    regressed = [(case, metric) for case, metric, _, _, _, status in rows if status == "regressed"]
+    if regressed:
+        print(f"\n{len(regressed)} 项指标退化: " + ", ".join(f"{case}.{metric}" for case, metric in regressed))
+        sys.exit(1)
+    print("\n没有指标退化")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务更新请求体基准：对比 full / slim / minimal 投影与 none / gzip / zstd 压缩下的
+请求体字节数、编码耗时，以及（指定 --server 时）detect/execute 的端到端延迟
+
+用法:
+    python bench_task_payload.py
+    python bench_task_payload.py --server http://127.0.0.1:5001 --repeat 3
+"""
+
+import argparse
+import asyncio
+import time
+
+import http_client
+import task_payload
+import test_task_update
+
+
+def variants(compressions=None):
+    """所有可用的 (投影, 压缩) 组合，未安装zstandard时跳过zstd"""
+    compressions = compressions or [c for c in task_payload.COMPRESSIONS
+                                    if c != "zstd" or task_payload.zstandard is not None]
+    return [(projection, compression) for projection in task_payload.PROJECTIONS for compression in compressions]
+
+
+def measure_bytes(items, projection, compression, rounds=5):
+    """
+    计算一次 detect + 一次 execute 的请求体字节数与编码耗时（取最快一轮）
+
+    返回:
+    - (平均每项字节数, 平均每项编码毫秒)
+    """
+    total_bytes = 0
+    best = None
+    for _ in range(rounds):
+        total_bytes = 0
+        start_time = time.perf_counter()
+        for item in items:
+            for payload in (item, {"task_data": item["task_data"], "suggestion": "", "lang": item["lang"],
+                                   "chat_id": item["chat_id"]}):
+                body, _ = task_payload.encode_body(task_payload.project_payload(payload, projection), compression)
+                total_bytes += len(body)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return total_bytes / len(items), best / len(items) * 1000
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="任务更新请求体瘦身与压缩基准")
+    parser.add_argument("--plans", nargs="*", help="plan_and_tasks_*.json，默认使用样例")
+    parser.add_argument("--server", help="指定时对每种组合实际调用 detect/execute 并记录延迟")
+    parser.add_argument("--repeat", type=int, default=1, help="在线模式下语料重复次数")
+    parser.add_argument("--concurrency", type=int, default=4, help="在线模式下的 detect/execute 并发数")
+    http_client.add_client_args(parser)
+    args = parser.parse_args()
+    http_client.configure_from_args(args)
+
+    items = test_task_update.load_update_corpus(args.plans)
+    if not items:
+        parser.error("语料中没有任务")
+    combos = variants()
+    print(f"语料: {len(items)} 个任务；每项包含一次 detect 与一次 execute 请求")
+
+    full_bytes = None
+    print(f"\n{'投影':<10}{'压缩':<8}{'字节/项':>12}{'相对full':>10}{'编码(ms)':>10}")
+    for projection, compression in combos:
+        size, encode_ms = measure_bytes(items, projection, compression)
+        full_bytes = full_bytes or size
+        print(f"{projection:<10}{compression:<8}{size:>12.0f}{size / full_bytes:>10.1%}{encode_ms:>10.3f}")
+
+    if not args.server:
+        return
+
+    async def run():
+        results = {}
+        try:
+            for projection, compression in combos:
+                print(f"\n===== {projection} / {compression} =====")
+                results[(projection, compression)] = await test_task_update.run_update_batch(
+                    args.server, items, args.repeat, args.concurrency, args.concurrency,
+                    projection, compression)
+        finally:
+            await http_client.close()
+        return results
+
+    results = asyncio.run(run())
+    print(f"\n{'投影':<10}{'压缩':<8}{'detect p50':>12}{'execute p50':>13}{'端到端 p50':>12}{'端到端 p99':>12}")
+    for (projection, compression), stats in results.items():
+        cells = [stats["detect"].percentile(50), stats["execute"].percentile(50),
+                 stats["end_to_end"].percentile(50), stats["end_to_end"].percentile(99)]
+        print(f"{projection:<10}{compression:<8}" + "".join(
+            f"{'-' if v is None else f'{v:.3f}':>12}" for v in cells))
+
+
+if __name__ == "__main__":
+    main()
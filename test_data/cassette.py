@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+录制与回放：把真实会话的请求、响应和SSE事件追加到NDJSON磁带文件，之后按原速或缩放速度回放
+
+录制:
+    python test_interactive.py --server https://study-platform.zeabur.app --record session.ndjson
+回放（作为本地后端）:
+    python cassette.py session.ndjson --port 5001 --speed 2
+    python test_interactive.py --server http://127.0.0.1:5001
+
+磁带每行一个JSON对象，按 call 字段关联同一次调用:
+- {"type": "request", "call", "t", "method", "url", "data" | "data_b64" | "body_size"}
+  请求体为UTF-8文本时记为 data，否则base64编码记为 data_b64；超过 MAX_RECORDED_BODY 时只记长度 body_size
+- {"type": "response", "call", "t", "status", "content_type"}
+- {"type": "chunk", "call", "t", "data" | "data_b64"}   响应体按读取顺序分段，SSE接口每行一段
+
+回放时优先返回方法、路径与请求体都相同的录制调用，没有时再按路径轮流返回
+"""
+
+import argparse
+import asyncio
+import base64
+import collections
+import itertools
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+from aiohttp import web
+
+# 超过此大小的请求体（例如上传的文档）只记录长度
+MAX_RECORDED_BODY = 1024 * 1024
+
+
+def _encode(data):
+    try:
+        return {"data": data.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"data_b64": base64.b64encode(data).decode("ascii")}
+
+
+def _decode(record):
+    if "data_b64" in record:
+        return base64.b64decode(record["data_b64"])
+    return record.get("data", "").encode("utf-8")
+
+
+def _body_key(data):
+    """请求体的匹配键：JSON按排序后的键规范化，其他按原始字节"""
+    try:
+        return json.dumps(json.loads(data), ensure_ascii=False, sort_keys=True)
+    except ValueError:
+        return data
+
+
+class CassetteWriter:
+    """
+    追加写入NDJSON磁带
+
+    参数:
+    - path: 磁带文件路径，已存在时追加
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._ids = itertools.count(1)
+        self._prefix = f"{os.getpid()}-{int(time.time())}"
+
+    def new_call(self):
+        return f"{self._prefix}-{next(self._ids)}"
+
+    def write(self, record):
+        record.setdefault("t", time.time())
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class ObservedStream:
+    """
+    包装响应的StreamReader，调用方每读到一段数据就调用一次 on_data(data)，读到结尾时调用一次 on_eof()
+    aiohttp的trace钩子不覆盖流式读取，录制与计时都通过它观察响应体
+    """
+
+    def __init__(self, stream, on_data, on_eof=None):
+        self._stream = stream
+        self._on_data = on_data
+        self._on_eof = on_eof
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def _record(self, data):
+        if data:
+            self._on_data(data)
+        if self._on_eof is not None and (not data or self._stream.at_eof()):
+            on_eof, self._on_eof = self._on_eof, None
+            on_eof()
+        return data
+
+    async def read(self, n=-1):
+        return self._record(await self._stream.read(n))
+
+    async def readline(self):
+        return self._record(await self._stream.readline())
+
+    async def readany(self):
+        return self._record(await self._stream.readany())
+
+    async def readexactly(self, n):
+        return self._record(await self._stream.readexactly(n))
+
+    async def readchunk(self):
+        data, end_of_http_chunk = await self._stream.readchunk()
+        return self._record(data), end_of_http_chunk
+
+    async def iter_chunked(self, n):
+        while True:
+            data = await self.read(n)
+            if not data:
+                break
+            yield data
+
+    async def iter_any(self):
+        while True:
+            data = await self.readany()
+            if not data:
+                break
+            yield data
+
+    def __aiter__(self):
+        return self._iter_lines()
+
+    async def _iter_lines(self):
+        while True:
+            line = await self.readline()
+            if not line:
+                break
+            yield line
+
+
+def recording_trace_config(writer):
+    """
+    生成把请求与响应写入磁带的aiohttp TraceConfig
+
+    参数:
+    - writer: CassetteWriter
+    """
+
+    async def on_request_start(session, ctx, params):
+        ctx.call_id = writer.new_call()
+        ctx.body = bytearray()
+        ctx.body_size = 0
+        ctx.start = time.time()
+
+    async def on_request_chunk_sent(session, ctx, params):
+        ctx.body_size += len(params.chunk)
+        if ctx.body_size <= MAX_RECORDED_BODY:
+            ctx.body.extend(params.chunk)
+
+    async def on_request_end(session, ctx, params):
+        request = {"type": "request", "call": ctx.call_id, "t": ctx.start,
+                   "method": params.method, "url": str(params.url)}
+        if ctx.body_size <= MAX_RECORDED_BODY:
+            request.update(_encode(bytes(ctx.body)))
+        else:
+            request["body_size"] = ctx.body_size
+        writer.write(request)
+        response = params.response
+        writer.write({"type": "response", "call": ctx.call_id, "status": response.status,
+                      "content_type": response.headers.get("Content-Type", "")})
+        call_id = ctx.call_id
+        response.content = ObservedStream(
+            response.content,
+            lambda data: writer.write({"type": "chunk", "call": call_id, **_encode(data)}))
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
+    trace_config.on_request_end.append(on_request_end)
+    return trace_config
+
+
+class RecordedCall:
+    """磁带中的一次调用"""
+
+    def __init__(self, call_id):
+        self.call_id = call_id
+        self.method = None
+        self.path = None
+        self.status = 200
+        self.content_type = "application/json"
+        self.request_t = None
+        self.response_t = None
+        self.body = None
+        self.chunks = []
+
+
+def load_cassette(path):
+    """
+    读取磁带
+
+    返回:
+    - 按请求开始时间排序的RecordedCall列表，缺少响应的调用会被丢弃
+    """
+    calls = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            call = calls.setdefault(record["call"], RecordedCall(record["call"]))
+            if record["type"] == "request":
+                call.method = record["method"]
+                call.path = urlsplit(record["url"]).path
+                call.request_t = record["t"]
+                if "data" in record or "data_b64" in record:
+                    call.body = _body_key(_decode(record))
+            elif record["type"] == "response":
+                call.status = record["status"]
+                call.content_type = record.get("content_type") or call.content_type
+                call.response_t = record["t"]
+            elif record["type"] == "chunk":
+                call.chunks.append((record["t"], _decode(record)))
+    complete = [c for c in calls.values() if c.request_t is not None and c.response_t is not None]
+    return sorted(complete, key=lambda c: c.request_t)
+
+
+class ReplayBackend:
+    """
+    把磁带作为后端回放：请求体与某次录制调用相同时按录制顺序轮流返回这些调用，
+    否则在同一路径的全部调用中轮流返回
+
+    参数:
+    - calls: load_cassette 返回的调用列表
+    - speed: 回放速度倍数，2表示所有等待时间减半，0表示不等待
+    """
+
+    def __init__(self, calls, speed=1.0):
+        self.speed = speed
+        self._by_route = collections.defaultdict(list)
+        by_body = collections.defaultdict(list)
+        for call in calls:
+            self._by_route[(call.method, call.path)].append(call)
+            if call.body is not None:
+                by_body[(call.method, call.path, call.body)].append(call)
+        self._cursors = {route: itertools.cycle(items) for route, items in self._by_route.items()}
+        self._body_cursors = {key: itertools.cycle(items) for key, items in by_body.items()}
+
+    def make_app(self):
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        return app
+
+    async def _wait(self, seconds):
+        if self.speed > 0 and seconds > 0:
+            await asyncio.sleep(seconds / self.speed)
+
+    async def handle(self, request):
+        body = await request.read()
+        cursor = (self._body_cursors.get((request.method, request.path, _body_key(body)))
+                  or self._cursors.get((request.method, request.path)))
+        if cursor is None:
+            raise web.HTTPNotFound(text=f"磁带中没有 {request.method} {request.path}")
+        call = next(cursor)
+
+        await self._wait(call.response_t - call.request_t)
+        response = web.StreamResponse(status=call.status, headers={"Content-Type": call.content_type})
+        await response.prepare(request)
+        previous_t = call.response_t
+        for t, data in call.chunks:
+            await self._wait(t - previous_t)
+            previous_t = t
+            await response.write(data)
+        await response.write_eof()
+        return response
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="回放NDJSON磁带作为本地后端")
+    parser.add_argument("cassette", help="磁带文件路径")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=5001, help="监听端口")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度倍数，0表示不等待")
+
+    args = parser.parse_args()
+
+    calls = load_cassette(args.cassette)
+    backend = ReplayBackend(calls, speed=args.speed)
+    print(f"回放 {len(calls)} 次调用: http://{args.host}:{args.port} (速度 x{args.speed})")
+    web.run_app(backend.make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式chat客户端：边接收边输出 /api/chat1/stream 的回复，并测量首token时间
+
+按响应的Content-Type自动选择解析方式:
+- text/event-stream: 逐个SSE事件解析，增量文本取自 delta/content/token/text 字段，
+  response 字段视为到目前为止的完整回复，updateSteps/reason 取自最后出现的帧
+- 其他（application/json 或分块传输的文本）: 边读边计时，读完后整体解析；
+  不是JSON时把整个响应体当作回复文本
+
+用法:
+    python chat_stream.py --server http://127.0.0.1:5001 --message "我想学习Python" --repeat 10
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+
+import aiohttp
+
+import http_client
+import request_timing
+from history_policy import estimate_tokens
+from latency_stats import LatencyHistogram, format_report
+from sse_parser import SSEParser, iter_sse
+
+DEFAULT_SERVER = "http://172.30.116.44:5001"
+
+# SSE帧中表示增量文本的字段
+DELTA_FIELDS = ("delta", "content", "token", "text")
+
+
+class ChatResult:
+    """
+    一次chat调用的结果与耗时
+
+    属性:
+    - response/update_steps/reason: 回复文本与更新建议
+    - streamed: 响应是否为SSE流
+    - ttfb: 请求发出到收到第一个字节（秒）
+    - ttft: 请求发出到收到第一段回复文本（秒），非流式响应等于读完响应体的时间
+    - total: 请求发出到响应结束（秒）
+    - tokens: 回复的估算token数
+    """
+
+    def __init__(self):
+        self.response = ""
+        self.update_steps = []
+        self.reason = ""
+        self.streamed = False
+        self.ttfb = None
+        self.ttft = None
+        self.total = None
+        self.tokens = 0
+
+    @property
+    def tokens_per_second(self):
+        """首token之后的生成速度，只有一段文本时无法计算，返回None"""
+        if self.ttft is None or self.total is None or self.total <= self.ttft:
+            return None
+        return self.tokens / (self.total - self.ttft)
+
+    def to_dict(self):
+        """转为原 /api/chat1/stream JSON 响应的格式"""
+        return {"response": self.response, "updateSteps": self.update_steps, "reason": self.reason}
+
+
+def _as_frame(value):
+    """
+    把解码后的data转为帧字典：JSON字符串（或无法解码的原文）即增量文本，数字与布尔值用 str() 转为文本，
+    null 返回None表示忽略，数组按JSON文本
+    """
+    if isinstance(value, dict) or value is None:
+        return value
+    if isinstance(value, str):
+        return {"delta": value}
+    if isinstance(value, (int, float)):
+        return {"delta": str(value)}
+    return {"delta": json.dumps(value, ensure_ascii=False)}
+
+
+def _apply_frame(result, frame, on_text, now, start_time):
+    """把一个SSE帧合并进结果，返回新增的文本"""
+    text = ""
+    for key in DELTA_FIELDS:
+        value = frame.get(key)
+        if isinstance(value, str):
+            text = value
+            result.response += value
+            break
+    else:
+        full = frame.get("response")
+        if isinstance(full, str) and full.startswith(result.response):
+            text = full[len(result.response):]
+            result.response = full
+        elif isinstance(full, str):
+            result.response = full
+    if frame.get("updateSteps") is not None:
+        result.update_steps = frame["updateSteps"]
+    if frame.get("reason") is not None:
+        result.reason = frame["reason"]
+    if text:
+        if result.ttft is None:
+            result.ttft = now - start_time
+        if on_text:
+            on_text(text)
+    return text
+
+
+async def stream_chat(server_url, messages, session_id=None, lang="zh", on_text=None):
+    """
+    调用chat接口并流式读取回复
+
+    参数:
+    - server_url: 服务器URL
+    - messages: 消息列表
+    - session_id: 会话ID
+    - lang: 语言
+    - on_text: 可选回调，每收到一段回复文本立即以该文本调用
+
+    返回:
+    - ChatResult；非200响应抛出 aiohttp.ClientResponseError，message 为响应体
+    """
+    url = f"{server_url}/api/chat1/stream"
+    data = {"id": session_id, "messages": messages, "lang": lang}
+    result = ChatResult()
+    session = await http_client.get_session()
+    start_time = time.perf_counter()
+    async with session.post(url, json=data) as response:
+        if response.status != 200:
+            raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                              status=response.status, message=await response.text())
+        if "event-stream" in response.headers.get("Content-Type", ""):
+            result.streamed = True
+            parser = SSEParser()
+            async for event in iter_sse(response.content, parser):
+                if result.ttfb is None:
+                    result.ttfb = parser.first_chunk_at - start_time
+                if event.data.strip() == "[DONE]":
+                    break
+                try:
+                    with request_timing.decoding():
+                        frame = json.loads(event.data)
+                except json.JSONDecodeError:
+                    # 非JSON的data直接视为增量文本
+                    frame = event.data
+                frame = _as_frame(frame)
+                if frame is None:
+                    continue
+                _apply_frame(result, frame, on_text, event.timestamp, start_time)
+                if frame.get("done"):
+                    break
+        else:
+            chunks = []
+            async for chunk in response.content.iter_any():
+                if result.ttfb is None:
+                    result.ttfb = time.perf_counter() - start_time
+                chunks.append(chunk)
+            body = b"".join(chunks)
+            result.ttft = time.perf_counter() - start_time
+            try:
+                with request_timing.decoding():
+                    frame = json.loads(body)
+            except ValueError:
+                frame = body.decode("utf-8", errors="replace")
+            frame = _as_frame(frame)
+            if frame is not None:
+                _apply_frame(result, frame, None, time.perf_counter(), start_time)
+            if on_text and result.response:
+                on_text(result.response)
+    result.total = time.perf_counter() - start_time
+    result.tokens = estimate_tokens(result.response)
+    return result
+
+
+def format_result(result):
+    """一行耗时摘要"""
+    tps = result.tokens_per_second
+    return (f"{'SSE流' if result.streamed else '非流式'}: 首字节 {result.ttfb or 0:.2f}s, "
+            f"首token {result.ttft or 0:.2f}s, 总耗时 {result.total:.2f}s, "
+            f"约 {result.tokens} token" + (f", {tps:.1f} token/s" if tps else ""))
+
+
+async def run_repeat(server_url, message, lang, repeat, concurrency, show_text):
+    """重复调用chat接口，统计首token时间、总耗时与生成速度"""
+    histograms = {name: LatencyHistogram(name) for name in ("ttfb", "ttft", "total")}
+    rates = []
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def print_text(text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    async def one(index):
+        nonlocal failures
+        async with semaphore:
+            try:
+                result = await stream_chat(server_url, [{"role": "user", "content": message}],
+                                           f"chat_{uuid.uuid4().hex[:8]}", lang,
+                                           on_text=print_text if show_text else None)
+            except Exception as e:
+                failures += 1
+                print(f"\n[{index}] 调用失败: {e}")
+                return
+            if show_text:
+                print()
+            print(f"[{index}] {format_result(result)}")
+            if result.update_steps or result.reason:
+                print(f"[{index}] 建议更新步骤: {result.update_steps}, 原因: {result.reason}")
+            histograms["ttfb"].record(result.ttfb)
+            histograms["ttft"].record(result.ttft)
+            histograms["total"].record(result.total)
+            if result.tokens_per_second:
+                rates.append(result.tokens_per_second)
+
+    await asyncio.gather(*(one(i) for i in range(repeat)))
+    print(f"\n失败: {failures}/{repeat}")
+    if rates:
+        rates.sort()
+        print(f"生成速度 token/s: p50 {rates[len(rates) // 2]:.1f}, min {rates[0]:.1f}, max {rates[-1]:.1f}")
+    print(format_report(list(histograms.values())))
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="流式chat接口测试")
+    parser.add_argument("--server", default=DEFAULT_SERVER, help="服务器URL")
+    parser.add_argument("--message", default="我想学习Python数据分析", help="用户消息")
+    parser.add_argument("--lang", default="zh", help="语言")
+    parser.add_argument("--repeat", type=int, default=1, help="调用次数")
+    parser.add_argument("--concurrency", type=int, default=1, help="最大并发数")
+    parser.add_argument("--quiet", action="store_true", help="不输出回复文本，只输出耗时")
+    http_client.add_client_args(parser)
+    args = parser.parse_args()
+    http_client.configure_from_args(args)
+
+    async def run():
+        try:
+            await run_repeat(args.server, args.message, args.lang, args.repeat, args.concurrency,
+                             show_text=not args.quiet and args.concurrency == 1)
+        finally:
+            await http_client.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多部署延迟对比：对几个部署（默认 test_interactive.DEPLOYMENTS 中的内网、zeabur 与东京）
+交错地发出同一组请求，每次调用的耗时写入本地 SQLite 结果库，之后可按部署与接口查询延迟趋势与地域差异
+
+交错方式: 每一轮对每个基准项（见 bench_suite.CASES），同时向所有部署各发一个相同请求；
+每轮轮换各部署的发出顺序，默认并发发出，--sequential 时按轮换后的顺序依次发出。
+这样各部署的样本在时间上成对出现，网络与后端负载的波动对各部署基本相同
+
+结果库表结构:
+- runs: run_id, started_at, label, client_commit, settings（json）
+- samples: run_id, deployment, base_url, endpoint, ts（调用开始的unix时间）, iteration, position（本组中的发出顺序）,
+  latency（秒）, ok；按 (deployment, endpoint, ts) 建索引。附加耗时（如 chat 的首字延迟）记为 <接口>.<名称>
+
+用法:
+    python deploy_compare.py run --iterations 20
+    python deploy_compare.py run --target zeabur --target tokyo --cases chat,web_search --label v1.4.0
+    python deploy_compare.py query --since 7d --bucket day
+    python deploy_compare.py query --endpoints chat,chat.ttft --reference tokyo --bucket run
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import time
+import uuid
+from urllib.parse import urlparse
+
+import http_client
+from bench_suite import CASES, FIXTURE_DIR, _git_commit, make_context
+from latency_stats import LatencyHistogram
+from soak_test import parse_duration
+from test_interactive import DEPLOYMENTS
+
+DEFAULT_DB = os.path.join(FIXTURE_DIR, "deploy_results.sqlite")
+DEFAULT_CASES = "chat,plan_create,task_generate,web_search"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    label TEXT,
+    client_commit TEXT,
+    settings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    deployment TEXT NOT NULL,
+    base_url TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    ts REAL NOT NULL,
+    iteration INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    latency REAL,
+    ok INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_key ON samples(deployment, endpoint, ts);
+"""
+
+SAMPLE_COLUMNS = ("run_id", "deployment", "base_url", "endpoint", "ts", "iteration", "position", "latency", "ok")
+
+
+class ResultStore:
+    """
+    SQLite 结果库
+
+    参数:
+    - path: 数据库文件路径，不存在时创建
+    """
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def start_run(self, run_id, label=None, settings=None):
+        """登记一次运行"""
+        self.conn.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?)",
+                          (run_id, time.time(), label, _git_commit(), json.dumps(settings or {}, ensure_ascii=False)))
+        self.conn.commit()
+
+    def add_samples(self, rows):
+        """
+        写入一组样本并提交，运行中途中断时已写入的轮次仍然保留
+
+        参数:
+        - rows: 字典列表，键见 SAMPLE_COLUMNS
+        """
+        self.conn.executemany(
+            f"INSERT INTO samples ({', '.join(SAMPLE_COLUMNS)}) VALUES ({', '.join('?' * len(SAMPLE_COLUMNS))})",
+            [tuple(row[c] for c in SAMPLE_COLUMNS) for row in rows])
+        self.conn.commit()
+
+    def runs(self):
+        """run_id -> 运行记录"""
+        return {row["run_id"]: row for row in self.conn.execute("SELECT * FROM runs ORDER BY started_at")}
+
+    def samples(self, since=None, deployments=None, endpoints=None, run_id=None):
+        """
+        按条件查询样本，按时间排序
+
+        参数:
+        - since: 只返回该unix时间之后的样本
+        - deployments / endpoints: 名称列表，None表示不限
+        - run_id: 只返回该次运行的样本
+        """
+        where, params = [], []
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        for column, values in (("deployment", deployments), ("endpoint", endpoints)):
+            if values:
+                where.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        if run_id is not None:
+            where.append("run_id = ?")
+            params.append(run_id)
+        sql = "SELECT * FROM samples"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self.conn.execute(sql + " ORDER BY ts", params).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def parse_targets(specs):
+    """
+    解析 --target：名称=URL、已知部署名称或URL（以主机名作名称）
+
+    返回:
+    - [(名称, URL), ...]，未指定时为全部已知部署
+    """
+    if not specs:
+        return list(DEPLOYMENTS.items())
+    targets = []
+    for spec in specs:
+        name, sep, url = spec.partition("=")
+        if not sep:
+            if spec in DEPLOYMENTS:
+                name, url = spec, DEPLOYMENTS[spec]
+            elif "://" in spec:
+                name, url = urlparse(spec).hostname, spec
+            else:
+                raise ValueError(f"未知部署: {spec}，可选 {', '.join(DEPLOYMENTS)}，或写成 名称=URL")
+        targets.append((name.strip(), url.strip().rstrip("/")))
+    names = [name for name, _ in targets]
+    if len(set(names)) != len(names):
+        raise ValueError(f"部署名称重复: {', '.join(names)}")
+    return targets
+
+
+async def _timed_call(case, url, index, state, context):
+    ts = time.time()
+    start_time = time.perf_counter()
+    try:
+        ok, extra = await case.call(url, index, state, context)
+    except Exception:
+        ok, extra = False, {}
+    return ts, time.perf_counter() - start_time, ok, extra
+
+
+async def run_group(case, order, index, states, context, sequential=False):
+    """
+    向 order 中的各部署各发一次同一个请求
+
+    参数:
+    - order: 本组的发出顺序 [(名称, URL), ...]
+    - states: (部署名称, 基准项名称) -> setup 得到的状态
+
+    返回:
+    - [(位置, 名称, URL, 开始时间, 耗时, 是否成功, {附加耗时}), ...]
+    """
+    calls = [_timed_call(case, url, index, states.get((name, case.name)), context) for name, url in order]
+    if sequential:
+        results = [await call for call in calls]
+    else:
+        results = await asyncio.gather(*calls)
+    return [(position, name, url) + result for position, ((name, url), result) in enumerate(zip(order, results))]
+
+
+async def run_interleaved(targets, cases, iterations, context, store=None, run_id=None, warmup=1,
+                          sequential=False, out=None):
+    """
+    交错运行：每轮对每个基准项调用 run_group，每轮把部署顺序轮换一位
+
+    参数:
+    - store / run_id: 结果库与本次运行ID，每组结果写入后立即提交；store为None时只返回样本
+    - warmup: 不记录的预热轮数（建立连接、填充后端缓存）
+    - out: 进度输出的文件对象，默认 sys.stdout
+
+    返回:
+    - 样本字典列表，键见 SAMPLE_COLUMNS
+    """
+    out = out or sys.stdout
+    states = {}
+    for case in cases:
+        if case.setup is not None:
+            results = await asyncio.gather(*(case.setup(url, 0, context) for _, url in targets))
+            states.update(((name, case.name), state) for (name, _), state in zip(targets, results))
+    samples = []
+    for iteration in range(-warmup, iterations):
+        shift = iteration % len(targets)
+        order = targets[shift:] + targets[:shift]
+        for case in cases:
+            group = await run_group(case, order, iteration + warmup, states, context, sequential)
+            if iteration < 0:
+                continue
+            rows = []
+            for position, name, url, ts, latency, ok, extra in group:
+                base = {"run_id": run_id, "deployment": name, "base_url": url, "ts": ts,
+                        "iteration": iteration, "position": position}
+                rows.append(dict(base, endpoint=case.name, latency=latency, ok=int(bool(ok))))
+                for extra_name, value in extra.items():
+                    if value is not None:
+                        rows.append(dict(base, endpoint=f"{case.name}.{extra_name}", latency=value, ok=1))
+            if store is not None:
+                store.add_samples(rows)
+            samples.extend(rows)
+        if iteration >= 0:
+            print(f"  第 {iteration + 1}/{iterations} 轮完成", file=out, flush=True)
+    return samples
+
+
+def _bucket(ts, bucket, run_id, runs):
+    if bucket == "run":
+        started = runs[run_id]["started_at"] if run_id in runs else ts
+        return f"{datetime.datetime.fromtimestamp(started):%Y-%m-%d %H:%M} {run_id}"
+    fmt = "%Y-%m-%d %H:00" if bucket == "hour" else "%Y-%m-%d"
+    return datetime.datetime.fromtimestamp(ts).strftime(fmt)
+
+
+def trend(samples, bucket="day", runs=None):
+    """
+    按 (接口, 部署, 时间段) 汇总
+
+    参数:
+    - bucket: run（每次运行）/ hour / day
+
+    返回:
+    - {(接口, 部署): [(时间段, 次数, 失败率, 成功请求的延迟直方图), ...]}，时间段按时间排序
+    """
+    groups = {}
+    for row in samples:
+        key = (row["endpoint"], row["deployment"])
+        period = _bucket(row["ts"], bucket, row["run_id"], runs or {})
+        entry = groups.setdefault(key, {}).setdefault(period, [0, 0, LatencyHistogram(row["endpoint"])])
+        entry[0] += 1
+        if row["ok"]:
+            entry[2].record(row["latency"])
+        else:
+            entry[1] += 1
+    return {key: [(period, count, failed / count, hist) for period, (count, failed, hist) in sorted(periods.items())]
+            for key, periods in sorted(groups.items())}
+
+
+def regional_deltas(samples, reference):
+    """
+    各部署相对参照部署的延迟差：只比较同一次运行、同一轮、同一接口中双方都成功的成对样本
+
+    返回:
+    - [(接口, 部署, 成对数, 参照p50, 该部署p50, 成对差中位数, 差值比例, 该部署更快的比例), ...]
+    """
+    paired = {}
+    for row in samples:
+        if row["ok"]:
+            paired.setdefault((row["endpoint"], row["run_id"], row["iteration"]), {})[row["deployment"]] = row["latency"]
+    diffs = {}
+    for (endpoint, _, _), latencies in paired.items():
+        if reference not in latencies:
+            continue
+        ref = latencies[reference]
+        for deployment, latency in latencies.items():
+            if deployment != reference:
+                diffs.setdefault((endpoint, deployment), []).append((ref, latency))
+    rows = []
+    for (endpoint, deployment), pairs in sorted(diffs.items()):
+        ref_p50 = statistics.median(ref for ref, _ in pairs)
+        p50 = statistics.median(latency for _, latency in pairs)
+        delta = statistics.median(latency - ref for ref, latency in pairs)
+        faster = sum(1 for ref, latency in pairs if latency < ref) / len(pairs)
+        rows.append((endpoint, deployment, len(pairs), ref_p50, p50, delta, delta / ref_p50 if ref_p50 else 0.0, faster))
+    return rows
+
+
+def format_trend(trends):
+    """趋势表：每个接口、部署一段，p50变化相对上一个时间段"""
+    lines = [f"{'接口':<18}{'部署':<12}{'时间段':<28}{'次数':>6}{'失败率':>8}{'p50':>9}{'p90':>9}{'p99':>9}"
+             f"{'p50变化':>10}"]
+    for (endpoint, deployment), periods in trends.items():
+        previous = None
+        for period, count, error_rate, hist in periods:
+            if hist.count:
+                p50 = hist.percentile(50)
+                change = f"{(p50 - previous) / previous:+.1%}" if previous else "-"
+                previous = p50
+                values = f"{p50:>9.3f}{hist.percentile(90):>9.3f}{hist.percentile(99):>9.3f}{change:>10}"
+            else:
+                values = f"{'-':>9}{'-':>9}{'-':>9}{'-':>10}"
+            lines.append(f"{endpoint:<18}{deployment:<12}{period:<28}{count:>6}{error_rate:>8.1%}{values}")
+    return "\n".join(lines)
+
+
+def format_deltas(rows, reference):
+    """地域差异表"""
+    lines = [f"相对 {reference} 的延迟差（成对样本，正值表示更慢）:",
+             f"{'接口':<18}{'部署':<12}{'成对数':>8}{f'{reference} p50':>14}{'p50':>9}{'差中位数':>10}{'差值比例':>10}"
+             f"{'更快比例':>10}"]
+    for endpoint, deployment, pairs, ref_p50, p50, delta, ratio, faster in rows:
+        lines.append(f"{endpoint:<18}{deployment:<12}{pairs:>8}{ref_p50:>14.3f}{p50:>9.3f}{delta:>+10.3f}"
+                     f"{ratio:>+10.1%}{faster:>10.0%}")
+    return "\n".join(lines)
+
+
+def default_reference(store, samples):
+    """未指定参照部署时，取样本所属的最近一次运行中排在第一位的部署"""
+    runs = store.runs()
+    for run_id in reversed(list(runs)):
+        if any(row["run_id"] == run_id for row in samples):
+            targets = json.loads(runs[run_id]["settings"]).get("targets")
+            if targets:
+                return targets[0][0]
+    return samples[0]["deployment"] if samples else None
+
+
+def report(store, samples, bucket, reference=None):
+    """打印趋势表与地域差异表"""
+    if not samples:
+        print("没有符合条件的样本")
+        return
+    print(format_trend(trend(samples, bucket, store.runs())))
+    reference = reference or default_reference(store, samples)
+    rows = regional_deltas(samples, reference)
+    if rows:
+        print()
+        print(format_deltas(rows, reference))
+
+
+def _split(text):
+    return [item.strip() for item in text.split(",") if item.strip()] if text else None
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="多部署延迟对比与结果库")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="交错地向多个部署发出同一组请求并写入结果库")
+    run_parser.add_argument("--target", action="append", metavar="[NAME=]URL",
+                            help=f"参与对比的部署，可重复；默认全部已知部署（{', '.join(DEPLOYMENTS)}）")
+    run_parser.add_argument("--cases", default=DEFAULT_CASES, help=f"逗号分隔的基准项，可选 {', '.join(CASES)}")
+    run_parser.add_argument("--iterations", type=int, default=10, help="记录的轮数")
+    run_parser.add_argument("--warmup", type=int, default=1, help="不记录的预热轮数")
+    run_parser.add_argument("--sequential", action="store_true", help="同一组内按轮换后的顺序依次发出，而不是同时发出")
+    run_parser.add_argument("--label", help="本次运行的标签（如部署版本号）")
+    run_parser.add_argument("--verbose", action="store_true", help="保留逐条接口输出")
+    http_client.add_client_args(run_parser)
+
+    query_parser = sub.add_parser("query", help="查询延迟趋势与地域差异")
+    query_parser.add_argument("--since", help="只看最近这段时间，如 6h / 7d；默认全部")
+    query_parser.add_argument("--run", help="只看该次运行")
+    query_parser.add_argument("--deployments", help="逗号分隔的部署名称")
+    query_parser.add_argument("--endpoints", help="逗号分隔的接口名称")
+    query_parser.add_argument("--bucket", choices=["run", "hour", "day"], default="day", help="趋势的时间粒度")
+    query_parser.add_argument("--reference", help="地域差异的参照部署，默认为最近一次运行的第一个部署")
+
+    for p in (run_parser, query_parser):
+        p.add_argument("--db", default=DEFAULT_DB, help="SQLite 结果库路径")
+    args = parser.parse_args()
+
+    if args.command == "query":
+        try:
+            since = time.time() - parse_duration(args.since) if args.since else None
+        except ValueError as e:
+            parser.error(str(e))
+        store = ResultStore(args.db)
+        try:
+            samples = store.samples(since, _split(args.deployments), _split(args.endpoints), args.run)
+            report(store, samples, args.bucket, args.reference)
+        finally:
+            store.close()
+        return
+
+    try:
+        targets = parse_targets(args.target)
+    except ValueError as e:
+        parser.error(str(e))
+    cases = _split(args.cases) or []
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error(f"未知基准项: {', '.join(unknown)}，可选 {', '.join(CASES)}")
+    http_client.configure_from_args(args)
+
+    run_id = uuid.uuid4().hex[:12]
+    settings = {"targets": targets, "cases": cases, "iterations": args.iterations, "warmup": args.warmup,
+                "sequential": args.sequential}
+    store = ResultStore(args.db)
+    store.start_run(run_id, args.label, settings)
+
+    async def run():
+        try:
+            out = sys.stdout
+            print(f"多部署对比 {run_id}: {', '.join(f'{name}={url}' for name, url in targets)}")
+            print(f"  基准项 {', '.join(cases)}, {args.iterations} 轮, "
+                  f"{'依次' if args.sequential else '同时'}发出, 结果库 {args.db}")
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                await run_interleaved(targets, [CASES[name] for name in cases], args.iterations, make_context(),
+                                      store, run_id, args.warmup, args.sequential, out)
+        finally:
+            await http_client.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n已中断，已完成的轮次已写入结果库")
+    try:
+        print()
+        report(store, store.samples(run_id=run_id), "run", targets[0][0])
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话历史窗口策略：决定每轮发给 /api/chat1/stream 和 stream_generate 的消息子集
+
+客户端始终保留完整历史，只在发送时按策略截取:
+- full:        全部消息（原有行为）
+- last:N       最近N轮（一轮 = 一条用户消息及其后的助手回复）
+- tokens:N     从最近往前取，估算token数不超过N
+- pinned:N     第一条用户消息（通常是学习目标）加最近N轮
+"""
+
+import re
+
+# CJK字符大约每字一个token，其余文本大约每4个字符一个token
+_CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]")
+
+
+def estimate_tokens(text):
+    """粗略估算文本的token数，用于窗口预算，不追求与具体分词器一致"""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def message_tokens(message):
+    # 每条消息额外计入角色等格式开销
+    return estimate_tokens(message.get("content", "")) + 4
+
+
+def split_rounds(messages):
+    """按用户消息把历史切成轮次，返回 [[消息, ...], ...]"""
+    rounds = []
+    for message in messages:
+        if message.get("role") == "user" or not rounds:
+            rounds.append([])
+        rounds[-1].append(message)
+    return rounds
+
+
+class HistoryPolicy:
+    """
+    历史窗口策略
+
+    参数:
+    - kind: 'full' / 'last' / 'tokens' / 'pinned'
+    - limit: last/pinned 为轮数，tokens 为token预算
+    """
+
+    KINDS = ("full", "last", "tokens", "pinned")
+
+    def __init__(self, kind="full", limit=None):
+        if kind not in self.KINDS:
+            raise ValueError(f"未知的历史策略: {kind}，可选 {', '.join(self.KINDS)}")
+        if kind != "full" and (limit is None or limit < 1):
+            raise ValueError(f"历史策略 {kind} 需要大于0的参数")
+        self.kind = kind
+        self.limit = limit
+
+    def __str__(self):
+        return self.kind if self.kind == "full" else f"{self.kind}:{self.limit}"
+
+    def apply(self, messages):
+        """
+        截取要发送的消息
+
+        参数:
+        - messages: 完整历史
+
+        返回:
+        - 新的消息列表，最后一条用户消息总会保留
+        """
+        if self.kind == "full":
+            return list(messages)
+        rounds = split_rounds(messages)
+        if self.kind == "last":
+            return [m for r in rounds[-self.limit:] for m in r]
+        if self.kind == "pinned":
+            if len(rounds) <= self.limit + 1:
+                return list(messages)
+            return rounds[0][:1] + [m for r in rounds[-self.limit:] for m in r]
+        # tokens: 以轮为单位从后往前累加，至少保留最后一轮
+        kept = []
+        budget = self.limit
+        for r in reversed(rounds):
+            cost = sum(message_tokens(m) for m in r)
+            if kept and cost > budget:
+                break
+            kept.append(r)
+            budget -= cost
+        return [m for r in reversed(kept) for m in r]
+
+
+def parse_policy(spec):
+    """
+    解析 'full'、'last:3'、'tokens:2000'、'pinned:2' 形式的策略
+
+    返回:
+    - HistoryPolicy
+    """
+    kind, _, limit = (spec or "full").partition(":")
+    return HistoryPolicy(kind.strip(), int(limit) if limit else None)
+
+
+def add_history_args(parser):
+    """为argparse解析器添加历史策略参数"""
+    parser.add_argument("--history", default="full",
+                        help="对话历史窗口策略: full / last:N / tokens:N / pinned:N")
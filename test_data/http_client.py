@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享HTTP客户端：所有test_data脚本复用同一个带连接池的异步客户端
+避免每次调用都重新建立TCP/TLS连接，使延迟数据反映后端而不是建连开销
+"""
+
+import asyncio
+
+import aiohttp
+
+import cassette
+import request_timing
+
+try:
+    import httpx
+except ImportError:  # test_search.py 以外的脚本不需要httpx
+    httpx = None
+
+
+class ClientConfig:
+    """
+    连接池与超时配置
+
+    参数:
+    - limit: 连接池总连接数上限
+    - limit_per_host: 单个主机的连接数上限
+    - keepalive_timeout: 空闲连接保活时间（秒）
+    - connect_timeout: 建连超时（秒）
+    - read_timeout: 两次读取之间的超时（秒），流式接口需要足够长
+    - total_timeout: 单次请求总超时（秒），None表示不限制
+    - http2: httpx客户端是否启用HTTP/2（需要安装h2）
+    - record_path: 不为None时把aiohttp会话的所有调用追加录制到该NDJSON磁带
+    - timing_path: 不为None时把每次调用的分阶段耗时追加写入该NDJSON文件
+    - metrics_path: 不为None时在close()时写入Prometheus文本格式的耗时指标快照
+    """
+
+    def __init__(self, limit=100, limit_per_host=20, keepalive_timeout=60.0,
+                 connect_timeout=10.0, read_timeout=300.0, total_timeout=None,
+                 http2=False, record_path=None, timing_path=None, metrics_path=None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.http2 = http2
+        self.record_path = record_path
+        self.timing_path = timing_path
+        self.metrics_path = metrics_path
+
+
+config = ClientConfig()
+
+_session = None
+_session_loop = None
+_httpx_client = None
+_httpx_loop = None
+_cassette = None
+_timing = None
+# 由 add_trace_config / add_event_hooks 注册的额外aiohttp TraceConfig与httpx事件钩子
+_extra_trace_configs = []
+_extra_event_hooks = {"request": [], "response": []}
+
+
+def configure(**kwargs):
+    """
+    修改全局配置，需在第一次获取客户端之前调用
+
+    参数:
+    - kwargs: ClientConfig 的同名字段
+    """
+    for key, value in kwargs.items():
+        if not hasattr(config, key):
+            raise ValueError(f"未知的客户端配置项: {key}")
+        setattr(config, key, value)
+
+
+def add_client_args(parser):
+    """为argparse解析器添加连接池相关参数"""
+    group = parser.add_argument_group("HTTP客户端")
+    group.add_argument("--limit", type=int, default=config.limit, help="连接池总连接数上限")
+    group.add_argument("--limit-per-host", type=int, default=config.limit_per_host, help="单主机连接数上限")
+    group.add_argument("--keepalive", type=float, default=config.keepalive_timeout, help="空闲连接保活时间(秒)")
+    group.add_argument("--connect-timeout", type=float, default=config.connect_timeout, help="建连超时(秒)")
+    group.add_argument("--read-timeout", type=float, default=config.read_timeout, help="读取超时(秒)")
+    group.add_argument("--total-timeout", type=float, default=config.total_timeout, help="请求总超时(秒)")
+    group.add_argument("--http2", action="store_true", help="httpx客户端启用HTTP/2")
+    group.add_argument("--record", metavar="PATH", help="把所有请求、响应和SSE事件录制到NDJSON磁带")
+    group.add_argument("--timing", metavar="PATH", help="把每次调用的分阶段耗时写入NDJSON文件")
+    group.add_argument("--metrics", metavar="PATH", help="退出时写入Prometheus文本格式的耗时指标快照")
+    return group
+
+
+def configure_from_args(args):
+    """根据 add_client_args 解析出的参数修改全局配置"""
+    configure(
+        limit=args.limit,
+        limit_per_host=args.limit_per_host,
+        keepalive_timeout=args.keepalive,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        total_timeout=args.total_timeout,
+        http2=args.http2,
+        record_path=args.record,
+        timing_path=args.timing,
+        metrics_path=args.metrics,
+    )
+
+
+def add_trace_config(trace_config):
+    """
+    注册一个额外的aiohttp.TraceConfig（如连接计数），需在第一次获取会话之前调用
+    """
+    _extra_trace_configs.append(trace_config)
+
+
+def add_event_hooks(hooks):
+    """
+    注册额外的httpx事件钩子，格式同 httpx 的 event_hooks，需在第一次获取httpx客户端之前调用
+    """
+    for event, funcs in hooks.items():
+        _extra_event_hooks[event].extend(funcs)
+
+
+def _get_timing():
+    """启用了 --timing 或 --metrics 时返回共享的TimingRecorder，否则返回None"""
+    global _timing
+    if _timing is None and (config.timing_path or config.metrics_path):
+        _timing = request_timing.TimingRecorder(config.timing_path, config.metrics_path)
+    return _timing
+
+
+async def get_session():
+    """
+    获取共享的aiohttp.ClientSession，不存在或已关闭时创建
+
+    返回:
+    - 绑定到当前事件循环的ClientSession，调用方不要自行关闭
+    """
+    global _session, _session_loop, _cassette
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        trace_configs = []
+        if config.record_path:
+            if _cassette is None:
+                _cassette = cassette.CassetteWriter(config.record_path)
+            trace_configs.append(cassette.recording_trace_config(_cassette))
+        timing = _get_timing()
+        if timing is not None:
+            trace_configs.append(timing.aiohttp_trace_config())
+        trace_configs.extend(_extra_trace_configs)
+        connector = aiohttp.TCPConnector(
+            limit=config.limit,
+            limit_per_host=config.limit_per_host,
+            keepalive_timeout=config.keepalive_timeout,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=config.total_timeout,
+            sock_connect=config.connect_timeout,
+            sock_read=config.read_timeout,
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=trace_configs)
+        _session_loop = loop
+    return _session
+
+
+async def get_httpx_client():
+    """
+    获取共享的httpx.AsyncClient，config.http2为True时启用HTTP/2
+
+    返回:
+    - 绑定到当前事件循环的AsyncClient，调用方不要自行关闭
+    """
+    global _httpx_client, _httpx_loop
+    if httpx is None:
+        raise RuntimeError("需要安装httpx: pip install httpx")
+    loop = asyncio.get_running_loop()
+    if _httpx_client is None or _httpx_client.is_closed or _httpx_loop is not loop:
+        limits = httpx.Limits(
+            max_connections=config.limit,
+            max_keepalive_connections=config.limit_per_host,
+            keepalive_expiry=config.keepalive_timeout,
+        )
+        timeout = httpx.Timeout(
+            config.total_timeout,
+            connect=config.connect_timeout,
+            read=config.read_timeout,
+        )
+        timing = _get_timing()
+        event_hooks = timing.httpx_event_hooks() if timing is not None else {"request": [], "response": []}
+        for event, funcs in _extra_event_hooks.items():
+            event_hooks[event] = event_hooks[event] + funcs
+        _httpx_client = httpx.AsyncClient(limits=limits, timeout=timeout, http2=config.http2,
+                                          event_hooks=event_hooks)
+        _httpx_loop = loop
+    return _httpx_client
+
+
+async def close():
+    """关闭所有共享客户端，脚本退出前调用"""
+    global _session, _httpx_client, _cassette, _timing
+    if _session is not None and not _session.closed:
+        await _session.close()
+    if _httpx_client is not None and not _httpx_client.is_closed:
+        await _httpx_client.aclose()
+    if _cassette is not None:
+        _cassette.close()
+    if _timing is not None:
+        _timing.close()
+    _session = None
+    _httpx_client = None
+    _cassette = None
+    _timing = None
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+延迟统计工具：收集耗时样本并输出 p50/p90/p99/max 报告
+
+样本按对数-线性桶计数（HDR直方图的做法），不保存原始样本：内存与跨进程传输的大小只取决于
+延迟的取值范围而与样本数无关，合并时按桶相加。分位数的相对误差不超过 1/SUB_BUCKETS
+"""
+
+import math
+
+# 每个2的幂区间内的线性子桶数（高一半）；相对误差上限为其倒数，即约0.8%
+SUB_BUCKET_BITS = 8
+SUB_BUCKETS = 1 << (SUB_BUCKET_BITS - 1)
+# 桶的最小单位（秒），低于该值的差异不区分
+RESOLUTION = 1e-6
+
+
+def _bucket_index(value):
+    units = max(0, int(value / RESOLUTION))
+    shift = max(0, units.bit_length() - SUB_BUCKET_BITS)
+    return shift * SUB_BUCKETS + (units >> shift)
+
+
+def _bucket_bounds(index):
+    """桶的 [下界, 上界)，单位秒"""
+    if index < 2 * SUB_BUCKETS:
+        low, high = index, index + 1
+    else:
+        shift = index // SUB_BUCKETS - 1
+        sub = index - shift * SUB_BUCKETS
+        low, high = sub << shift, (sub + 1) << shift
+    return low * RESOLUTION, high * RESOLUTION
+
+
+class LatencyHistogram:
+    """
+    单个指标的延迟分布
+
+    参数:
+    - name: 指标名称
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        """记录一个样本（单位：秒）"""
+        if value is None:
+            return
+        index = _bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """合并另一个同名指标，按桶相加"""
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        for bound, pick in (("min", min), ("max", max)):
+            value = getattr(other, bound)
+            if value is not None:
+                current = getattr(self, bound)
+                setattr(self, bound, value if current is None else pick(current, value))
+
+    def to_dict(self):
+        """转为可序列化的字典，便于跨进程传回后合并"""
+        return {"name": self.name, "count": self.count, "sum": self.sum, "min": self.min, "max": self.max,
+                "counts": self.counts}
+
+    @classmethod
+    def from_dict(cls, data):
+        """由 to_dict 的结果重建"""
+        hist = cls(data["name"])
+        hist.counts = {int(index): count for index, count in data["counts"].items()}
+        hist.count = data["count"]
+        hist.sum = data["sum"]
+        hist.min = data["min"]
+        hist.max = data["max"]
+        return hist
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def percentile(self, p):
+        """
+        最近秩法计算分位数，返回所在桶的中点（限制在最小值与最大值之间）
+
+        参数:
+        - p: 分位数，取值 0-100
+        """
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(p / 100 * self.count))
+        if rank >= self.count:
+            return self.max
+        if rank == 1:
+            return self.min
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, high = _bucket_bounds(index)
+                return min(max((low + high) / 2, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        """返回 count/p50/p90/p99/max 字典"""
+        if not self.count:
+            return {"count": 0, "p50": None, "p90": None, "p99": None, "max": None}
+        return {
+            "count": self.count,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+    def buckets(self, bins=10):
+        """把样本按等宽区间分桶，返回 [(下界, 上界, 数量), ...]；各桶按中点归入区间"""
+        if not self.count:
+            return []
+        low, high = self.min, self.max
+        if high == low:
+            return [(low, high, self.count)]
+        width = (high - low) / bins
+        counts = [0] * bins
+        for index, count in self.counts.items():
+            bucket_low, bucket_high = _bucket_bounds(index)
+            value = min(max((bucket_low + bucket_high) / 2, low), high)
+            counts[min(int((value - low) / width), bins - 1)] += count
+        return [(low + i * width, low + (i + 1) * width, c) for i, c in enumerate(counts)]
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.3f}"
+
+
+def format_report(histograms, show_buckets=False, bar_width=40):
+    """
+    生成多个指标的文本报告
+
+    参数:
+    - histograms: LatencyHistogram 列表
+    - show_buckets: 是否附带每个指标的分布直方图
+    - bar_width: 直方图柱的最大宽度
+    """
+    lines = [f"{'指标':<24}{'count':>8}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}"]
+    for hist in histograms:
+        s = hist.summary()
+        lines.append(
+            f"{hist.name:<24}{s['count']:>8}{_fmt(s['p50']):>10}{_fmt(s['p90']):>10}"
+            f"{_fmt(s['p99']):>10}{_fmt(s['max']):>10}"
+        )
+    if show_buckets:
+        for hist in histograms:
+            buckets = hist.buckets()
+            if not buckets:
+                continue
+            peak = max(c for _, _, c in buckets)
+            lines.append(f"\n{hist.name} 分布 (秒):")
+            for low, high, c in buckets:
+                bar = "#" * (round(c / peak * bar_width) if peak else 0)
+                lines.append(f"  {low:8.3f} - {high:8.3f} | {bar} {c}")
+    return "\n".join(lines)
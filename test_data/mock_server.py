@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线替身后端：用保存的样例数据模拟各个后端接口
+每个接口可单独配置延迟、抖动、SSE事件间隔和错误率，便于在本机复现基准测试
+
+用法:
+    python mock_server.py --port 5001 --latency 0.5 --jitter 0.2 --sse-delay 0.3
+    python test_interactive.py --server http://127.0.0.1:5001
+"""
+
+import argparse
+import ast
+import asyncio
+import copy
+import glob
+import json
+import os
+import random
+
+from aiohttp import web
+
+from task_payload import decode_body
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+async def read_json(request):
+    """读取JSON请求体，按 Content-Encoding 解压（客户端可用 --compress 压缩请求体）"""
+    body = decode_body(await request.read(), request.headers.get("Content-Encoding"))
+    return json.loads(body)
+
+# 接口名称 -> 路径，延迟配置文件中使用接口名称
+ENDPOINTS = {
+    "chat": "/api/chat1/stream",
+    "plan": "/api/learning/plan/stream_generate",
+    "task_generate": "/api/task/generate",
+    "task_detect": "/api/task/update/detect",
+    "task_execute": "/api/task/update/execute",
+    "web_search": "/api/web/search",
+    "video_search": "/api/video/search",
+    "image_search": "/api/image/search",
+    "upload": "/api/documents/upload",
+}
+
+
+class EndpointProfile:
+    """
+    单个接口的模拟参数
+
+    参数:
+    - latency: 返回前的平均等待时间（秒）
+    - jitter: 延迟在 ±jitter 范围内均匀抖动（秒）
+    - error_rate: 返回500的概率，0-1
+    - sse_delay: 流式接口相邻两个事件之间的间隔（秒）
+    - slow_rate: 请求变成慢请求的概率，0-1，用于模拟长尾
+    - slow_latency: 慢请求的延迟（秒），代替 latency
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, sse_delay=0.0, slow_rate=0.0, slow_latency=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.sse_delay = sse_delay
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+
+    def sample_delay(self, rng):
+        latency = self.latency
+        if self.slow_rate and rng.random() < self.slow_rate:
+            latency = self.slow_latency
+        return max(0.0, latency + rng.uniform(-self.jitter, self.jitter))
+
+
+def load_profiles(path=None, default=None):
+    """
+    读取延迟配置文件
+
+    参数:
+    - path: JSON文件路径，格式为 {"default": {...}, "task_generate": {"latency": 8}, ...}
+    - default: 未在文件中出现的接口使用的EndpointProfile
+
+    返回:
+    - {接口名称: EndpointProfile}
+    """
+    default = default or EndpointProfile()
+    overrides = {}
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+        if "default" in overrides:
+            default = EndpointProfile(**{**vars(default), **overrides["default"]})
+    profiles = {}
+    for name in ENDPOINTS:
+        profiles[name] = EndpointProfile(**{**vars(default), **overrides.get(name, {})})
+    return profiles
+
+
+class Fixtures:
+    """从 plan_and_tasks_*.json 和 task1.txt 读取样例响应"""
+
+    def __init__(self, fixture_dir=FIXTURE_DIR):
+        plan_files = sorted(glob.glob(os.path.join(fixture_dir, "plan_and_tasks_*.json")))
+        if not plan_files:
+            raise FileNotFoundError(f"{fixture_dir} 中没有 plan_and_tasks_*.json 样例")
+        with open(plan_files[0], "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        with open(os.path.join(fixture_dir, "task1.txt"), "r", encoding="utf-8") as f:
+            self.fallback_task = ast.literal_eval(f.read())
+
+        self.introduction = saved.get("introduction", {})
+        self.steps = []
+        self.tasks_by_step = {}
+        for step in saved["plan"]:
+            step = dict(step)
+            task = step.pop("task", None)
+            step.pop("id", None)
+            self.steps.append(step)
+            if task:
+                self.tasks_by_step[step["step"]] = task
+
+        web_res = [t["task"].get("web_res") for t in self.tasks_by_step.values() if t.get("task")]
+        self.web_res = next((w for w in web_res if w), {"query": "", "results": []})
+        self.videos = [v for step in self.steps for v in step.get("videos", [])]
+
+    def task_for(self, step_number):
+        return self.tasks_by_step.get(step_number, self.fallback_task)
+
+
+class MockBackend:
+    """
+    替身后端
+
+    参数:
+    - fixtures: Fixtures实例
+    - profiles: {接口名称: EndpointProfile}
+    - seed: 随机种子，固定后延迟与错误序列可复现
+    """
+
+    def __init__(self, fixtures, profiles, seed=None):
+        self.fixtures = fixtures
+        self.profiles = profiles
+        self.rng = random.Random(seed)
+        self.request_counts = {name: 0 for name in ENDPOINTS}
+        self.error_counts = {name: 0 for name in ENDPOINTS}
+
+    def make_app(self):
+        app = web.Application(client_max_size=1024 ** 3)
+        handlers = {
+            "chat": self.handle_chat,
+            "plan": self.handle_plan,
+            "task_generate": self.handle_task_generate,
+            "task_detect": self.handle_task_detect,
+            "task_execute": self.handle_task_execute,
+            "web_search": self.handle_web_search,
+            "video_search": self.handle_video_search,
+            "image_search": self.handle_image_search,
+            "upload": self.handle_upload,
+        }
+        for name, path in ENDPOINTS.items():
+            app.router.add_post(path, handlers[name])
+        return app
+
+    async def _simulate(self, name):
+        """计数、等待配置的延迟，并按错误率抛出500"""
+        self.request_counts[name] += 1
+        profile = self.profiles[name]
+        await asyncio.sleep(profile.sample_delay(self.rng))
+        if profile.error_rate and self.rng.random() < profile.error_rate:
+            self.error_counts[name] += 1
+            raise web.HTTPInternalServerError(text=json.dumps({"error": "mock error"}),
+                                              content_type="application/json")
+
+    async def handle_chat(self, request):
+        body = await read_json(request)
+        await self._simulate("chat")
+        user_turns = [m for m in body.get("messages", []) if m.get("role") == "user"]
+        update_steps = [1] if len(user_turns) > 1 else []
+        return web.json_response({
+            "response": "好的，我来根据你的需求调整学习计划。",
+            "updateSteps": update_steps,
+            "reason": "用户需求有所变化" if update_steps else "",
+        })
+
+    async def handle_plan(self, request):
+        body = await read_json(request)
+        await self._simulate("plan")
+        profile = self.profiles["plan"]
+
+        update_steps = set()
+        if body.get("advise"):
+            try:
+                advise = json.loads(body["advise"])
+                update_steps = set(advise.get("updateSteps") or advise.get("should_update") or [])
+            except (TypeError, ValueError):
+                pass
+
+        steps = copy.deepcopy(self.fixtures.steps)
+        for step in steps:
+            step["lang"] = body.get("lang", step.get("lang", "zh"))
+            if step["step"] in update_steps:
+                step["description"] += "（已根据反馈更新）"
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        async def send(obj):
+            await response.write(b"data: " + json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n\n")
+
+        await send({"message": "开始生成学习计划"})
+        await asyncio.sleep(profile.sse_delay)
+        await send({"introduction": self.fixtures.introduction})
+        for step in steps:
+            await asyncio.sleep(profile.sse_delay)
+            await send({"step": step, "step_number": step["step"], "total": len(steps)})
+        await send({"done": True, "plan": {"plan": steps}})
+        await response.write_eof()
+        return response
+
+    async def handle_task_generate(self, request):
+        body = await read_json(request)
+        await self._simulate("task_generate")
+        return web.json_response(self.fixtures.task_for(body.get("step")))
+
+    async def handle_task_detect(self, request):
+        body = await read_json(request)
+        await self._simulate("task_detect")
+        message = body.get("user_message", "")
+        return web.json_response({
+            "success": True,
+            "result": {"needUpdate": bool(message), "suggestion": f"根据用户反馈调整任务: {message}"},
+        })
+
+    async def handle_task_execute(self, request):
+        body = await read_json(request)
+        await self._simulate("task_execute")
+        task = dict(body.get("task_data") or self.fixtures.fallback_task["task"])
+        task["ppt_slide"] = task.get("ppt_slide", "") + f"\n\n> {body.get('suggestion', '')}"
+        return web.json_response({"success": True, "result": {"task": task}})
+
+    async def handle_web_search(self, request):
+        body = await read_json(request)
+        await self._simulate("web_search")
+        web_res = dict(self.fixtures.web_res, query=body.get("search_keyword", ""))
+        return web.json_response({"web_res": web_res})
+
+    async def handle_video_search(self, request):
+        await read_json(request)
+        await self._simulate("video_search")
+        return web.json_response({"video_res": self.fixtures.videos[:4]})
+
+    async def handle_image_search(self, request):
+        await read_json(request)
+        await self._simulate("image_search")
+        images = [{"image": "https:" + v["cover"], "title": v["title"]} for v in self.fixtures.videos[:6]]
+        return web.json_response({"image_res": images})
+
+    async def handle_upload(self, request):
+        reader = await request.multipart()
+        chat_id, filename, size = None, None, 0
+        async for part in reader:
+            if part.name == "chat_id":
+                chat_id = await part.text()
+            elif part.name == "file":
+                filename = part.filename
+                while True:
+                    chunk = await part.read_chunk()
+                    if not chunk:
+                        break
+                    size += len(chunk)
+        await self._simulate("upload")
+        return web.json_response({"success": True, "chat_id": chat_id, "filename": filename, "size": size})
+
+
+async def start_mock_server(host="127.0.0.1", port=0, profiles=None, seed=None, fixture_dir=FIXTURE_DIR):
+    """
+    在当前事件循环中启动替身后端，供基准脚本内嵌使用
+
+    返回:
+    - (runner, base_url, backend)，结束时调用 await runner.cleanup()
+    """
+    backend = MockBackend(Fixtures(fixture_dir), profiles or load_profiles(), seed=seed)
+    runner = web.AppRunner(backend.make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = runner.addresses[0][1]
+    return runner, f"http://{host}:{bound_port}", backend
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="离线替身后端")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=5001, help="监听端口")
+    parser.add_argument("--latency", type=float, default=0.0, help="所有接口的默认延迟(秒)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="所有接口的默认抖动(秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="所有接口的默认错误率(0-1)")
+    parser.add_argument("--sse-delay", type=float, default=0.0, help="流式接口事件间隔(秒)")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="慢请求比例(0-1)，模拟长尾")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="慢请求的延迟(秒)")
+    parser.add_argument("--profile", help="按接口覆盖参数的JSON配置文件")
+    parser.add_argument("--seed", type=int, help="随机种子")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="样例数据目录")
+
+    args = parser.parse_args()
+
+    default = EndpointProfile(args.latency, args.jitter, args.error_rate, args.sse_delay,
+                              args.slow_rate, args.slow_latency)
+    profiles = load_profiles(args.profile, default)
+    backend = MockBackend(Fixtures(args.fixtures), profiles, seed=args.seed)
+    print(f"替身后端启动: http://{args.host}:{args.port}")
+    web.run_app(backend.make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
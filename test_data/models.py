@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+计划、任务与搜索结果的类型化模型
+解码时同时校验结构，字段缺失或类型不符时抛出带路径的SchemaError，而不是在运行中途出现KeyError
+
+解码后端（按可用性自动选择，也可通过 backend 参数指定）:
+- msgspec: 边解码边校验，速度最快（pip install msgspec）
+- orjson:  orjson.loads 后再校验
+- json:    标准库 json.loads 后再校验
+"""
+
+import dataclasses
+import json
+import typing
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class SchemaError(ValueError):
+    """响应结构与模型不符"""
+
+
+@dataclass
+class Video:
+    title: str
+    url: str
+    cover: str = ""
+    duration: str = ""
+
+
+@dataclass
+class WebResult:
+    url: str
+    title: str
+    content: Optional[str] = None
+    score: Optional[float] = None
+    raw_content: Optional[str] = None
+
+
+@dataclass
+class WebSearchResult:
+    query: str = ""
+    results: List[WebResult] = field(default_factory=list)
+    answer: Optional[str] = None
+    follow_up_questions: Optional[List[str]] = None
+    images: List[Any] = field(default_factory=list)
+    response_time: Optional[float] = None
+
+
+@dataclass
+class Question:
+    question: str
+    type: str
+    answer: Union[str, List[str]]
+    options: List[str] = field(default_factory=list)
+
+
+@dataclass
+class CodingTask:
+    """coding类型步骤的编程任务，quiz类型步骤中为空对象或null"""
+    title: str = ""
+    description: str = ""
+    starter_code: str = ""
+    answer: str = ""
+
+
+@dataclass
+class Task:
+    type: str
+    difficulty: str
+    ppt_slide: str
+    questions: List[Question] = field(default_factory=list)
+    task: Optional[CodingTask] = None
+    videos: List[Video] = field(default_factory=list)
+    web_res: Optional[WebSearchResult] = None
+    search_keyword: Optional[str] = None
+
+
+@dataclass
+class TaskResponse:
+    """/api/task/generate 的响应"""
+    success: bool
+    task: Task
+
+
+@dataclass
+class Step:
+    step: int
+    title: str
+    description: str = ""
+    type: str = ""
+    difficulty: str = ""
+    search_keyword: str = ""
+    animation_type: str = ""
+    status: str = ""
+    previous_steps_context: List[Any] = field(default_factory=list)
+    videos: List[Video] = field(default_factory=list)
+    lang: Optional[str] = None
+    id: Optional[str] = None
+    task: Optional[TaskResponse] = None
+
+
+@dataclass
+class Introduction:
+    title: str = ""
+    course_info: str = ""
+    background: str = ""
+    overview: str = ""
+    prerequisites: str = ""
+
+
+@dataclass
+class Plan:
+    """stream_generate 返回的计划，以及 plan_and_tasks_*.json 的格式"""
+    plan: List[Step]
+    introduction: Optional[Introduction] = None
+
+
+@dataclass
+class WebSearchResponse:
+    """/api/web/search 的响应"""
+    web_res: WebSearchResult
+
+
+@dataclass
+class VideoSearchResponse:
+    """/api/video/search 的响应，无结果时 video_res 可能为null"""
+    video_res: Optional[List[Video]] = None
+
+
+@dataclass
+class ImageSearchResponse:
+    """/api/image/search 的响应，图片字段因来源不同而不同（image/url/src）"""
+    image_res: Optional[List[Dict[str, Any]]] = None
+
+
+BACKENDS = [name for name, module in (("msgspec", msgspec), ("orjson", orjson)) if module] + ["json"]
+
+_converters = {}
+
+
+def _type_name(tp):
+    return getattr(tp, "__name__", None) or str(tp).replace("typing.", "")
+
+
+def _mismatch(path, expected, value):
+    return SchemaError(f"{path}: 期望 {expected}，实际为 {type(value).__name__}")
+
+
+def _build_converter(tp):
+    """为类型生成 (value, path) -> 模型 的转换函数，按类型缓存，避免每个值都重新解析注解"""
+    if tp is Any:
+        return lambda value, path: value
+    origin = typing.get_origin(tp)
+    if origin is Union:
+        nullable = type(None) in typing.get_args(tp)
+        candidates = [_converter(arg) for arg in typing.get_args(tp) if arg is not type(None)]
+        name = _type_name(tp)
+
+        def convert_union(value, path):
+            if value is None and nullable:
+                return None
+            if len(candidates) == 1:
+                return candidates[0](value, path)
+            for candidate in candidates:
+                try:
+                    return candidate(value, path)
+                except SchemaError:
+                    pass
+            raise _mismatch(path, name, value)
+        return convert_union
+    if origin is list:
+        (item_type,) = typing.get_args(tp) or (Any,)
+        if item_type is Any:
+            def convert_any_list(value, path):
+                if not isinstance(value, list):
+                    raise _mismatch(path, "array", value)
+                return value
+            return convert_any_list
+        item = _converter(item_type)
+
+        def convert_list(value, path):
+            if not isinstance(value, list):
+                raise _mismatch(path, "array", value)
+            return [item(v, f"{path}[{i}]") for i, v in enumerate(value)]
+        return convert_list
+    if origin is dict:
+        _, value_type = typing.get_args(tp) or (str, Any)
+        item = _converter(value_type)
+
+        def convert_dict(value, path):
+            if not isinstance(value, dict):
+                raise _mismatch(path, "object", value)
+            return {k: item(v, f"{path}.{k}") for k, v in value.items()}
+        return convert_dict
+    if dataclasses.is_dataclass(tp):
+        hints = typing.get_type_hints(tp)
+        fields = []
+        for f in dataclasses.fields(tp):
+            required = f.default is dataclasses.MISSING and f.default_factory is dataclasses.MISSING
+            fields.append((f.name, required, hints[f.name]))
+        resolved = []
+
+        def convert_dataclass(value, path):
+            if not isinstance(value, dict):
+                raise _mismatch(path, f"{tp.__name__} 对象", value)
+            if not resolved:
+                # 延迟解析字段转换函数，支持嵌套类型的递归引用
+                resolved.extend((name, required, _converter(hint)) for name, required, hint in fields)
+            kwargs = {}
+            for name, required, field_converter in resolved:
+                if name in value:
+                    kwargs[name] = field_converter(value[name], f"{path}.{name}")
+                elif required:
+                    raise SchemaError(f"{path}: {tp.__name__} 缺少必需字段 '{name}'")
+            return tp(**kwargs)
+        return convert_dataclass
+    if tp is float:
+        def convert_float(value, path):
+            if value.__class__ is float:
+                return value
+            if value.__class__ is int:
+                return float(value)
+            raise _mismatch(path, "float", value)
+        return convert_float
+    if tp is int:
+        def convert_int(value, path):
+            if value.__class__ is not int:
+                raise _mismatch(path, "int", value)
+            return value
+        return convert_int
+    name = _type_name(tp)
+
+    def convert_scalar(value, path):
+        if value.__class__ is not tp:
+            raise _mismatch(path, name, value)
+        return value
+    return convert_scalar
+
+
+def _converter(tp):
+    converter = _converters.get(tp)
+    if converter is None:
+        converter = _converters[tp] = _build_converter(tp)
+    return converter
+
+
+def convert(value, tp, path="$"):
+    """
+    按模型类型校验并转换已解析的JSON对象
+
+    参数:
+    - value: json.loads 得到的对象
+    - tp: 目标类型，如 Plan、List[Video]
+    - path: 出错时报告的位置前缀
+
+    返回:
+    - 转换后的模型实例
+    """
+    return _converter(tp)(value, path)
+
+
+def decode(data, tp, backend=None):
+    """
+    解码JSON并校验为模型
+
+    参数:
+    - data: bytes 或 str
+    - tp: 目标类型
+    - backend: 'msgspec' / 'orjson' / 'json'，默认取 BACKENDS[0]
+
+    返回:
+    - 模型实例
+    """
+    backend = backend or BACKENDS[0]
+    if backend == "msgspec":
+        if msgspec is None:
+            raise RuntimeError("需要安装msgspec: pip install msgspec")
+        try:
+            return msgspec.json.decode(data, type=tp)
+        except msgspec.ValidationError as e:
+            raise SchemaError(str(e)) from None
+    if backend == "orjson":
+        if orjson is None:
+            raise RuntimeError("需要安装orjson: pip install orjson")
+        return convert(orjson.loads(data), tp)
+    return convert(json.loads(data), tp)
+
+
+def to_dict(obj):
+    """把模型实例转回普通字典，便于 json.dump"""
+    return dataclasses.asdict(obj)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程负载测试：把会话分片到多个工作进程，每个进程运行独立的事件循环与连接池
+
+单进程解析SSE流和大段JSON（计划、内嵌web_res的task_data）时会先于后端成为瓶颈，
+这里每个进程各自统计延迟直方图与计数，由协调进程合并成一份报告
+
+用法:
+    python multiprocess_load.py --server http://127.0.0.1:5001 --sessions 400 --workers 4 --concurrency 50
+    python multiprocess_load.py --sessions 200 --mode both --tasks 3
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import http_client
+import test_interactive
+import test_plan_stream
+from latency_stats import LatencyHistogram, format_report
+from open_loop import load_sample_step
+
+DEFAULT_SERVER = "http://172.30.116.44:5001"
+
+PLAN_METRICS = ("ttfb", "introduction", "first_step", "step_gap", "total")
+
+
+def shard(total, workers):
+    """把 total 个会话尽量均匀地分给 workers 个进程，返回每个进程的会话数"""
+    base, extra = divmod(total, workers)
+    return [base + (1 if i < extra else 0) for i in range(workers)]
+
+
+async def _worker_main(worker_index, server_url, sessions, concurrency, modes, tasks_per_session, run_id):
+    histograms = {}
+    counters = {}
+
+    def record(name, value):
+        if name not in histograms:
+            histograms[name] = LatencyHistogram(name)
+        histograms[name].record(value)
+
+    def count(name):
+        counters[name] = counters.get(name, 0) + 1
+
+    step = load_sample_step() if tasks_per_session else None
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed_task(chat_id):
+        start_time = time.perf_counter()
+        result = await test_interactive.call_task_generate_api(server_url, dict(step, id=chat_id))
+        record("task.total", time.perf_counter() - start_time)
+        count("task.ok" if result is not None else "task.failed")
+
+    async def one_session(index):
+        chat_id = f"mp_{run_id}_{worker_index}_{index}"
+        async with semaphore:
+            session = await http_client.get_session()
+            for mode in modes:
+                timings = await test_plan_stream.timed_stream_generate(session, server_url, mode, chat_id)
+                count(f"{mode}.ok" if timings["ok"] else f"{mode}.failed")
+                for metric in ("ttfb", "introduction", "first_step", "total"):
+                    record(f"{mode}.{metric}", timings[metric])
+                for gap in timings["step_gaps"]:
+                    record(f"{mode}.step_gap", gap)
+            if tasks_per_session:
+                await asyncio.gather(*(timed_task(chat_id) for _ in range(tasks_per_session)))
+
+    try:
+        await asyncio.gather(*(one_session(i) for i in range(sessions)))
+    finally:
+        await http_client.close()
+    return histograms, counters
+
+
+def run_worker(worker_index, server_url, sessions, concurrency, modes, tasks_per_session, run_id, client_config):
+    """
+    工作进程入口：在本进程中运行一个事件循环驱动分到的会话
+
+    返回:
+    - 可pickle的结果字典: histograms(to_dict列表)/counters/wall/cpu
+    """
+    client_config = dict(client_config)
+    # 各进程同时追加写同一个文件会交错，录制与计时输出按进程分文件
+    for key in ("record_path", "timing_path", "metrics_path"):
+        if client_config.get(key):
+            root, ext = os.path.splitext(client_config[key])
+            client_config[key] = f"{root}.{worker_index}{ext}"
+    http_client.configure(**client_config)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    histograms, counters = asyncio.run(_worker_main(
+        worker_index, server_url, sessions, concurrency, modes, tasks_per_session, run_id))
+    return {
+        "worker": worker_index,
+        "pid": os.getpid(),
+        "sessions": sessions,
+        "histograms": [hist.to_dict() for hist in histograms.values()],
+        "counters": counters,
+        "wall": time.perf_counter() - wall_start,
+        "cpu": time.process_time() - cpu_start,
+    }
+
+
+def merge_results(results):
+    """
+    合并各工作进程的结果
+
+    返回:
+    - (名称 -> LatencyHistogram, 名称 -> 计数)
+    """
+    histograms = {}
+    counters = {}
+    for result in results:
+        for data in result["histograms"]:
+            hist = LatencyHistogram.from_dict(data)
+            if hist.name in histograms:
+                histograms[hist.name].merge(hist)
+            else:
+                histograms[hist.name] = hist
+        for name, value in result["counters"].items():
+            counters[name] = counters.get(name, 0) + value
+    return histograms, counters
+
+
+def run_multiprocess_load(server_url, sessions, workers, concurrency, scenario="create",
+                          tasks_per_session=0, client_config=None):
+    """
+    多进程负载测试
+
+    参数:
+    - server_url: 服务器URL
+    - sessions: 总会话数
+    - workers: 工作进程数
+    - concurrency: 每个进程的最大并发会话数
+    - scenario: 'create'/'update' 单一模式，'both' 先创建再更新
+    - tasks_per_session: 每个会话在计划之后调用 /api/task/generate 的次数
+    - client_config: 传给各进程 http_client.configure 的参数
+
+    返回:
+    - (合并后的直方图, 合并后的计数, 各进程结果)
+    """
+    modes = ["create", "update"] if scenario == "both" else [scenario]
+    run_id = int(time.time())
+    shards = [n for n in shard(sessions, workers) if n]
+    print(f"多进程负载测试: {sessions} 个会话, {len(shards)} 个进程, 每进程并发 {concurrency}, "
+          f"场景 {scenario}, 每会话任务 {tasks_per_session}")
+    start_time = time.perf_counter()
+    # spawn: 各进程从干净的解释器启动，不继承父进程的事件循环与连接
+    with ProcessPoolExecutor(len(shards), mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(run_worker, i, server_url, n, concurrency, modes, tasks_per_session,
+                               run_id, client_config or {})
+                   for i, n in enumerate(shards)]
+        results = [future.result() for future in futures]
+    duration = time.perf_counter() - start_time
+
+    histograms, counters = merge_results(results)
+    print(f"\n负载测试完成! 耗时: {duration:.2f}秒, 吞吐: {sessions / duration:.2f} 会话/秒")
+    print(f"{'进程':<6}{'pid':>8}{'会话':>8}{'耗时(s)':>10}{'CPU(s)':>10}{'CPU占用':>10}")
+    for result in results:
+        print(f"{result['worker']:<6}{result['pid']:>8}{result['sessions']:>8}{result['wall']:>10.2f}"
+              f"{result['cpu']:>10.2f}{result['cpu'] / result['wall'] if result['wall'] else 0:>10.1%}")
+    for name in modes + (["task"] if tasks_per_session else []):
+        ok, failed = counters.get(f"{name}.ok", 0), counters.get(f"{name}.failed", 0)
+        print(f"{name} 失败: {failed}/{ok + failed}")
+    order = [f"{mode}.{metric}" for mode in modes for metric in PLAN_METRICS] + ["task.total"]
+    print()
+    print(format_report([histograms[name] for name in order if name in histograms], show_buckets=True))
+    return histograms, counters, results
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="多进程流式计划/任务生成负载测试")
+    parser.add_argument("--server", default=DEFAULT_SERVER, help="服务器URL")
+    parser.add_argument("--sessions", type=int, default=100, help="总会话数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="工作进程数")
+    parser.add_argument("--concurrency", type=int, default=50, help="每个进程的最大并发会话数")
+    parser.add_argument("--mode", choices=["create", "update", "both"], default="create", help="计划生成场景")
+    parser.add_argument("--tasks", type=int, default=0, help="每个会话在计划之后调用任务生成的次数")
+    http_client.add_client_args(parser)
+
+    args = parser.parse_args()
+    if args.workers < 1 or args.sessions < 1:
+        parser.error("--workers 与 --sessions 至少为1")
+    http_client.configure_from_args(args)
+    # 每个进程的连接池至少要容纳该进程的全部并发请求
+    needed = args.concurrency * max(1, args.tasks)
+    http_client.configure(
+        limit=max(args.limit, needed),
+        limit_per_host=max(args.limit_per_host, needed),
+    )
+    run_multiprocess_load(args.server, args.sessions, args.workers, args.concurrency,
+                          args.mode, args.tasks, dict(vars(http_client.config)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+开环负载测试：按固定到达速率（泊松或匀速）发起会话，不等待前一个会话完成
+
+闭环压测（test_plan_stream.py --load 等）在后端变慢时会自动降低发压速度，排队时间被隐藏，
+尾延迟看起来反而更好（coordinated omission）。这里每个会话的延迟都从“计划开始时间”算起，
+因此客户端来不及按时发起、连接池排队和后端排队的时间都会计入
+
+用法:
+    python open_loop.py --server http://127.0.0.1:5001 --rate 5 --duration 60
+    python open_loop.py --rate 2 --arrival constant --workload plan:1,chat:2,search:4
+"""
+
+import argparse
+import asyncio
+import contextlib
+import glob
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+import http_client
+import resilience
+import test_interactive
+import test_plan_stream
+import test_search
+from latency_stats import LatencyHistogram, format_report
+
+DEFAULT_SERVER = "http://172.30.116.44:5001"
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def arrival_offsets(rate, duration, arrival="poisson", seed=None):
+    """
+    生成到达时间表
+
+    参数:
+    - rate: 平均到达速率（次/秒）
+    - duration: 持续时间（秒）
+    - arrival: 'poisson' 指数分布间隔，'constant' 等间隔
+    - seed: 随机种子
+
+    返回:
+    - 相对开始时间的偏移量列表（秒）
+    """
+    rng = random.Random(seed)
+    offsets = []
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+        if t >= duration:
+            return offsets
+        offsets.append(t)
+
+
+def parse_workload(spec):
+    """
+    解析 'plan:1,chat:2' 形式的会话类型权重
+
+    返回:
+    - [(名称, 权重), ...]
+    """
+    mix = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, weight = part.partition(":")
+        if name not in WORKLOADS:
+            raise ValueError(f"未知会话类型: {name}，可选 {', '.join(WORKLOADS)}")
+        mix.append((name, float(weight or 1)))
+    if not mix:
+        raise ValueError("至少需要一种会话类型")
+    return mix
+
+
+def load_sample_step():
+    """从 plan_and_tasks_*.json 样例中取第一个步骤，作为任务生成请求"""
+    path = sorted(glob.glob(os.path.join(FIXTURE_DIR, "plan_and_tasks_*.json")))[0]
+    with open(path, "r", encoding="utf-8") as f:
+        step = dict(json.load(f)["plan"][0])
+    step.pop("task", None)
+    step["retrive_enabled"] = True
+    return step
+
+
+async def run_plan(server_url, index, context):
+    session = await http_client.get_session()
+    timings = await test_plan_stream.timed_stream_generate(
+        session, server_url, "create", f"openloop_{context['run_id']}_{index}")
+    return timings["ok"]
+
+
+async def run_chat(server_url, index, context):
+    messages = [{"role": "user", "content": "我想学习Python数据分析"}]
+    _, result = await test_interactive.call_chat_api(
+        server_url, messages, f"openloop_{context['run_id']}_{index}")
+    return result is not None
+
+
+async def run_task(server_url, index, context):
+    step = dict(context["step"], id=f"openloop_{context['run_id']}_{index}")
+    return await test_interactive.call_task_generate_api(server_url, step) is not None
+
+
+async def run_search(server_url, index, context):
+    keyword, lang = context["corpus"][index % len(context["corpus"])]
+    endpoint = ("web", "video", "image")[index % 3]
+    await test_search.search_once(endpoint, keyword, lang, server_url)
+    return True
+
+
+# 会话类型 -> 协程函数 (server_url, 序号, 共享上下文) -> 是否成功
+WORKLOADS = {
+    "plan": run_plan,
+    "chat": run_chat,
+    "task": run_task,
+    "search": run_search,
+}
+
+
+async def run_open_loop(server_url, rate, duration, mix, arrival="poisson", seed=None,
+                        max_in_flight=1000, corpus_path=None, verbose=False):
+    """
+    按到达时间表发起会话并统计延迟
+
+    参数:
+    - server_url: 服务器URL
+    - rate: 平均到达速率（会话/秒）
+    - duration: 发压时长（秒）
+    - mix: parse_workload 返回的会话类型权重
+    - arrival: 'poisson' 或 'constant'
+    - seed: 随机种子，决定到达时间与会话类型
+    - max_in_flight: 同时进行的会话上限，超出时该会话记为丢弃而不是延后发起
+    - corpus_path: search 会话使用的关键词语料
+    - verbose: 是否保留各接口调用的逐条输出
+
+    返回:
+    - {会话类型: 统计字典}
+    """
+    # 会话类型与到达间隔用不同的种子，否则两者取自同一随机序列，第k个间隔总与第k次类型选择相关
+    rng = random.Random(None if seed is None else seed + 1)
+    offsets = arrival_offsets(rate, duration, arrival, seed)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    plan = [(offset, rng.choices(names, weights)[0]) for offset in offsets]
+    context = {
+        "run_id": uuid.uuid4().hex[:8],
+        "step": load_sample_step() if "task" in names else None,
+        "corpus": test_search.load_corpus(corpus_path or os.path.join(FIXTURE_DIR, "search_corpus.tsv"))
+        if "search" in names else None,
+    }
+    stats = {}
+    for name in names:
+        stats[name] = {
+            # 从计划开始时间算起，开环测试应关注的延迟
+            "latency": LatencyHistogram(f"{name}.latency"),
+            # 从实际发起时间算起，即闭环测试报告的延迟
+            "service": LatencyHistogram(f"{name}.service"),
+            # 实际发起时间比计划晚了多少
+            "start_lag": LatencyHistogram(f"{name}.start_lag"),
+            "ok": 0, "failed": 0, "dropped": 0,
+        }
+    in_flight = 0
+    peak_in_flight = 0
+    tasks = []
+
+    async def one_session(index, name, intended):
+        nonlocal in_flight
+        s = stats[name]
+        started = time.perf_counter()
+        s["start_lag"].record(started - intended)
+        try:
+            ok = await WORKLOADS[name](server_url, index, context)
+        except Exception:
+            ok = False
+        finished = time.perf_counter()
+        in_flight -= 1
+        s["ok" if ok else "failed"] += 1
+        s["latency"].record(finished - intended)
+        s["service"].record(finished - started)
+
+    print(f"开环测试: {arrival} 到达, {rate:g} 会话/秒, 持续 {duration:g} 秒, 共 {len(plan)} 个会话, "
+          f"类型 {', '.join(f'{n}:{w:g}' for n, w in mix)}")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+        start_time = time.perf_counter()
+        for index, (offset, name) in enumerate(plan):
+            intended = start_time + offset
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if in_flight >= max_in_flight:
+                stats[name]["dropped"] += 1
+                continue
+            in_flight += 1
+            peak_in_flight = max(peak_in_flight, in_flight)
+            tasks.append(asyncio.ensure_future(one_session(index, name, intended)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start_time
+
+    offered = len(plan) / duration if duration else 0.0
+    completed = sum(s["ok"] for s in stats.values())
+    print(f"\n开环测试完成! 总耗时 {elapsed:.2f}秒, 目标速率 {offered:.2f}/秒, "
+          f"成功完成 {completed / elapsed if elapsed else 0:.2f}/秒, 峰值并发 {peak_in_flight}")
+    print(f"{'类型':<10}{'发起':>8}{'成功':>8}{'失败':>8}{'丢弃':>8}")
+    for name in names:
+        s = stats[name]
+        print(f"{name:<10}{s['ok'] + s['failed']:>8}{s['ok']:>8}{s['failed']:>8}{s['dropped']:>8}")
+    print()
+    print(format_report([s[metric] for s in stats.values() for metric in ("latency", "service", "start_lag")]))
+    if resilience.current() is not None:
+        print()
+        print(resilience.current().format_stats())
+    return stats
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="开环到达速率负载测试")
+    parser.add_argument("--server", default=DEFAULT_SERVER, help="服务器URL")
+    parser.add_argument("--rate", type=float, required=True, help="平均到达速率(会话/秒)")
+    parser.add_argument("--duration", type=float, default=60, help="发压时长(秒)")
+    parser.add_argument("--arrival", choices=["poisson", "constant"], default="poisson", help="到达过程")
+    parser.add_argument("--workload", default="plan", help="会话类型及权重，例如 plan:1,chat:2,task:2,search:4")
+    parser.add_argument("--seed", type=int, help="随机种子，固定后到达时间表可复现")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="同时进行的会话上限，超出记为丢弃")
+    parser.add_argument("--corpus", help="search 会话使用的关键词语料，默认 search_corpus.tsv")
+    parser.add_argument("--verbose", action="store_true", help="保留逐条接口输出")
+    http_client.add_client_args(parser)
+    resilience.add_resilience_args(parser)
+
+    args = parser.parse_args()
+    if args.rate <= 0:
+        parser.error("--rate 必须大于0")
+    try:
+        mix = parse_workload(args.workload)
+    except ValueError as e:
+        parser.error(str(e))
+    http_client.configure_from_args(args)
+    resilience.configure_from_args(args)
+    # 连接池排队会让客户端自己变成瓶颈，开环模式下放开到会话上限
+    http_client.configure(
+        limit=max(args.limit, args.max_in_flight),
+        limit_per_host=max(args.limit_per_host, args.max_in_flight),
+    )
+
+    async def run():
+        try:
+            await run_open_loop(args.server, args.rate, args.duration, mix, args.arrival, args.seed,
+                                args.max_in_flight, args.corpus, args.verbose)
+        finally:
+            await http_client.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
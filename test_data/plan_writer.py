@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+计划与任务的增量NDJSON输出：每收到一个课程介绍、步骤或任务就立即追加一行，
+中途崩溃或Ctrl-C时已收到的数据不会丢失，写入时内存占用与会话数无关
+
+记录格式（每行一个JSON对象）:
+- {"type": "introduction", "session", "round", "t", "data": {...}}
+- {"type": "step", "session", "round", "t", "step": 编号, "data": {...}}
+- {"type": "plan", "session", "round", "t", "steps": [编号, ...], "data": [...]}
+  计划完成时的最终步骤顺序；data 只包含本轮没有以 step 记录流式收到的步骤（如更新模式下未改动的步骤）
+- {"type": "task", "session", "round", "t", "step": 编号, "data": {...}}
+
+压缩按文件扩展名选择: .gz 使用gzip，.zst 使用zstd（pip install zstandard），
+每条记录后都会刷新压缩块，已写入的记录在进程异常退出后仍可读取；之后用同一路径追加写入时，
+中断处之前与之后追加的记录都能读回
+
+整理为原有的 plan_and_tasks_<session>.json 格式:
+    python plan_writer.py compact run.ndjson.gz --out-dir sampleoutput
+检查各格式在写入中断后再追加时的恢复:
+    python plan_writer.py check
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _compression_for(path):
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("需要安装zstandard: pip install zstandard")
+        return "zstd"
+    return None
+
+
+class PlanRecordWriter:
+    """
+    追加写入计划/任务记录
+
+    参数:
+    - path: 输出路径，扩展名 .gz / .zst 时压缩
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.compression = _compression_for(path)
+        self.records = 0
+        # (会话, 轮次) -> 已写入的步骤编号，写入 plan 记录后清除
+        self._streamed = {}
+        self._raw = open(path, "ab")
+        if self.compression is None and self._raw.tell() and not _ends_with_newline(path):
+            # 上次写入中断留下半行：另起一行，否则本次的第一条记录会接在半行后面一起无法解析
+            self._raw.write(b"\n")
+        if self.compression == "gzip":
+            self._file = gzip.GzipFile(fileobj=self._raw, mode="ab")
+        elif self.compression == "zstd":
+            self._file = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._file = self._raw
+
+    def write(self, record_type, session_id, round_number=None, **fields):
+        """写入一条记录并刷新到磁盘"""
+        record = {"type": record_type, "session": session_id, "round": round_number, "t": time.time()}
+        record.update(fields)
+        self._file.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        if self.compression == "zstd":
+            self._file.flush(zstandard.FLUSH_BLOCK)
+        else:
+            self._file.flush()
+        if self._file is not self._raw:
+            self._raw.flush()
+        self.records += 1
+
+    def introduction(self, session_id, round_number, introduction):
+        self.write("introduction", session_id, round_number, data=introduction)
+
+    def step(self, session_id, round_number, step_number, step):
+        self.write("step", session_id, round_number, step=step_number, data=step)
+        self._streamed.setdefault((session_id, round_number), set()).add(step_number)
+
+    def plan(self, session_id, round_number, plan):
+        """记录计划完成时的步骤顺序；已由 step 记录写入的步骤不重复写入"""
+        streamed = self._streamed.pop((session_id, round_number), set())
+        steps = []
+        missing = []
+        for i, step in enumerate(plan.get("plan", [])):
+            number = step.get("step", i + 1)
+            steps.append(number)
+            if number not in streamed:
+                missing.append(dict(step, step=number))
+        self.write("plan", session_id, round_number, steps=steps, data=missing)
+
+    def task(self, session_id, round_number, step_number, task):
+        self.write("task", session_id, round_number, step=step_number, data=task)
+
+    def close(self):
+        if self._file is not self._raw and not self._raw.closed:
+            self._file.close()
+        if not self._raw.closed:
+            self._raw.close()
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _find_header(f, offset, header, chunk_size=1 << 16):
+    """从 offset 起查找下一个帧头（gzip member头或zstd帧头），返回其位置，找不到时返回None"""
+    while True:
+        f.seek(offset)
+        data = f.read(chunk_size)
+        if len(data) < len(header):
+            return None
+        index = data.find(header)
+        if index >= 0:
+            return offset + index
+        offset += len(data) - len(header) + 1
+
+
+def _iter_frames(f, make_decompressor, errors, header, chunk_size=1 << 16):
+    """
+    逐块解压由多个帧组成的压缩文件：每次打开写入器追加一个gzip member或zstd帧
+
+    写入中断的帧直到进程退出都没有结束，之后追加的新帧头会落在解码器期待下一个块的位置，
+    gzip/zstd模块在拼接处报错并丢掉之后的全部内容；这里只放弃出错的帧的剩余部分，
+    从下一个帧头继续，并插入换行把两边隔开
+
+    参数:
+    - make_decompressor: 返回新解压对象的函数，需支持 decompress / eof / unused_data
+    - errors: 解压出错时抛出的异常类型
+    - header: 帧头字节，用于出错后查找下一帧
+    """
+    frame_start = 0
+    while True:
+        decompressor = make_decompressor()
+        f.seek(frame_start)
+        position = frame_start
+        try:
+            while not decompressor.eof:
+                data = f.read(chunk_size)
+                if not data:
+                    return
+                try:
+                    output = decompressor.decompress(data)
+                except errors:
+                    # 出错的这一块从出错前的状态逐字节重放，保留出错位置之前已写入的记录
+                    yield from _salvage(f, make_decompressor, errors, frame_start, position, data, chunk_size)
+                    raise
+                position += len(data)
+                if output:
+                    yield output
+        except errors:
+            frame_start = _find_header(f, frame_start + 1, header)
+            if frame_start is None:
+                return
+            yield b"\n"
+            continue
+        frame_start = position - len(decompressor.unused_data)
+
+
+def _salvage(f, make_decompressor, errors, frame_start, position, data, chunk_size):
+    """重新解压 frame_start 到 position 之间已输出过的部分，再逐字节解压 data 直到出错"""
+    decompressor = make_decompressor()
+    f.seek(frame_start)
+    remaining = position - frame_start
+    while remaining:
+        block = f.read(min(chunk_size, remaining))
+        remaining -= len(block)
+        decompressor.decompress(block)
+    for i in range(len(data)):
+        try:
+            output = decompressor.decompress(data[i:i + 1])
+        except errors:
+            return
+        if output:
+            yield output
+
+
+def _iter_lines(path):
+    """按文件头判断压缩格式，逐行返回字节串"""
+    with open(path, "rb") as f:
+        magic = f.read(4)
+        if magic.startswith(_GZIP_MAGIC):
+            chunks = _iter_frames(f, lambda: zlib.decompressobj(16 + zlib.MAX_WBITS), zlib.error,
+                                  _GZIP_MAGIC + b"\x08")
+        elif magic == _ZSTD_MAGIC:
+            if zstandard is None:
+                raise RuntimeError("需要安装zstandard: pip install zstandard")
+            chunks = _iter_frames(f, lambda: zstandard.ZstdDecompressor().decompressobj(), zstandard.ZstdError,
+                                  _ZSTD_MAGIC)
+        else:
+            f.seek(0)
+            yield from f
+            return
+        pending = b""
+        for data in chunks:
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            yield from lines
+        if pending:
+            yield pending
+
+
+def read_records(path, stats=None):
+    """
+    逐条读取记录；无法解析的行（进程中断时写了一半的记录，或之后追加写入时与之相邻的残行）跳过
+
+    参数:
+    - stats: 可选字典，跳过的行数累加到 stats["skipped"]
+    """
+    skipped = 0
+    try:
+        for line in _iter_lines(path):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line.decode("utf-8", errors="replace"))
+            except json.JSONDecodeError:
+                skipped += 1
+    finally:
+        if stats is not None:
+            stats["skipped"] = stats.get("skipped", 0) + skipped
+
+
+def _step_hash(step, number):
+    """步骤内容（不含任务）的摘要"""
+    content = {k: v for k, v in dict(step, step=number).items() if k != "task"}
+    return hashlib.sha1(json.dumps(content, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def compact(path, session_id=None, stats=None):
+    """
+    把记录还原为原有的嵌套计划格式，每个会话取最后一轮
+
+    上一轮的任务只在本轮同一编号的步骤内容未变时沿用，轮次中断时不会把旧任务挂到新步骤上
+
+    参数:
+    - path: NDJSON文件
+    - session_id: 只还原该会话，None表示全部
+    - stats: 可选字典，见 read_records
+
+    返回:
+    - {会话ID: {"plan": [...], "introduction": {...}}}
+    """
+    sessions = {}
+    for record in read_records(path, stats):
+        sid = record.get("session")
+        if session_id is not None and sid != session_id:
+            continue
+        state = sessions.get(sid)
+        if state is None or record.get("round") != state["round"]:
+            # 新的一轮：步骤重新生成，但上一轮的介绍与任务在本轮未覆盖时仍然有效
+            previous = state or {"introduction": None, "tasks": {}}
+            state = sessions[sid] = {
+                "round": record.get("round"),
+                "introduction": previous["introduction"],
+                "steps": {},
+                "order": None,
+                "tasks": dict(previous["tasks"]),
+            }
+        kind = record["type"]
+        if kind == "introduction":
+            state["introduction"] = record["data"]
+        elif kind == "step":
+            state["steps"][record["step"]] = record["data"]
+        elif kind == "plan":
+            state["order"] = record["steps"]
+            for step in record.get("data", []):
+                state["steps"][step["step"]] = step
+        elif kind == "task":
+            step = state["steps"].get(record["step"])
+            state["tasks"][record["step"]] = (state["round"], _step_hash(step, record["step"]) if step else None,
+                                           record["data"])
+
+    plans = {}
+    for sid, state in sessions.items():
+        order = state["order"] or sorted(state["steps"])
+        steps = []
+        for number in order:
+            step = dict(state["steps"].get(number) or {"step": number})
+            step.setdefault("step", number)
+            if number in state["tasks"]:
+                task_round, step_hash, task = state["tasks"][number]
+                if task_round == state["round"] or step_hash == _step_hash(step, number):
+                    step["task"] = task
+            steps.append(step)
+        plan = {"plan": steps}
+        if state["introduction"]:
+            plan["introduction"] = state["introduction"]
+        plans[sid] = plan
+    return plans
+
+
+def check_recovery(directory=None, records=20):
+    """
+    自检：写入一个会话后模拟进程被杀（压缩帧未结束，且最后一条记录只写了一半），
+    再用新的写入器向同一文件追加另一个会话，确认中断前后完整写入的记录都能读回
+
+    返回:
+    - [(格式, 是否通过, 说明), ...]；未安装zstandard时跳过 .zst
+    """
+    results = []
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        for ext in ("", ".gz", ".zst"):
+            name = ext or "plain"
+            if ext == ".zst" and zstandard is None:
+                results.append((name, True, "跳过（未安装zstandard）"))
+                continue
+            path = os.path.join(tmp, f"check.ndjson{ext}")
+            writer = PlanRecordWriter(path)
+            for i in range(records - 1):
+                writer.task("before", 0, i, {"index": i})
+            complete = os.path.getsize(path)
+            writer.task("before", 0, records - 1, {"index": records - 1})
+            # 进程被杀时磁盘上的内容：最后一条记录已刷新但帧尚未结束
+            with open(path, "rb") as f:
+                killed = f.read()
+            writer.close()
+            with open(path, "wb") as f:
+                f.write(killed[:(complete + len(killed)) // 2])
+
+            writer = PlanRecordWriter(path)
+            for i in range(records):
+                writer.task("after", 0, i, {"index": i})
+            writer.close()
+
+            stats = {}
+            try:
+                read = [(r["session"], r["step"]) for r in read_records(path, stats)]
+            except Exception as e:
+                results.append((name, False, f"读取失败: {type(e).__name__}: {e}"))
+                continue
+            expected = [("before", i) for i in range(records - 1)] + [("after", i) for i in range(records)]
+            missing = [key for key in expected if key not in read]
+            ok = not missing
+            detail = f"读回 {len(read)} 条，跳过 {stats.get('skipped', 0)} 行"
+            if missing:
+                detail += f"，缺少 {len(missing)} 条"
+            results.append((name, ok, detail))
+    return results
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="计划/任务NDJSON记录工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compact_parser = sub.add_parser("compact", help="还原为 plan_and_tasks_<session>.json")
+    compact_parser.add_argument("path", help="NDJSON文件（可为 .gz / .zst）")
+    compact_parser.add_argument("--session", help="只还原指定会话")
+    compact_parser.add_argument("--out-dir", default="sampleoutput", help="输出目录")
+    sub.add_parser("check", help="检查各格式在写入中断后再追加时能否读回全部记录")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        results = check_recovery()
+        for name, ok, detail in results:
+            print(f"{name:<6} {'通过' if ok else '失败'}: {detail}")
+        if not all(ok for _, ok, _ in results):
+            sys.exit(1)
+        return
+
+    stats = {}
+    plans = compact(args.path, args.session, stats)
+    if stats.get("skipped"):
+        print(f"跳过 {stats['skipped']} 行无法解析的记录（写入中断留下的残行）")
+    os.makedirs(args.out_dir, exist_ok=True)
+    for sid, plan in plans.items():
+        filename = os.path.join(args.out_dir, f"plan_and_tasks_{sid}.json")
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(plan, f, ensure_ascii=False, indent=4)
+        tasks = sum(1 for step in plan["plan"] if "task" in step)
+        print(f"{filename}: {len(plan['plan'])} 个步骤, {tasks} 个任务")
+
+
+if __name__ == "__main__":
+    main()
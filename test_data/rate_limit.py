@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+令牌桶限速器：限制异步调用的平均速率，允许一定突发
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    参数:
+    - rate: 每秒补充的令牌数，即平均请求速率
+    - burst: 桶容量，即允许的最大突发请求数，默认等于 max(1, rate)
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("rate 必须大于0")
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens=1):
+        """等待直到取得 tokens 个令牌，等待者按先来先得的顺序放行"""
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+逐请求耗时分解：把每次API调用拆成DNS、建连、TLS、发送、首字节、传输和JSON解码几段，
+用来判断慢在网络、代理还是后端LLM
+
+启用:
+    python test_interactive.py --timing timing.ndjson --metrics metrics.prom
+
+各阶段（秒，未发生时为null）:
+- queue:    等待连接池空闲连接
+- dns:      域名解析（aiohttp；httpx计入connect）
+- connect:  TCP建连（aiohttp包含TLS握手）
+- tls:      TLS握手（仅httpx可单独测量）
+- send:     发送请求头与请求体
+- ttfb:     请求发完到收到响应头，主要是代理与后端处理时间
+- transfer: 收到响应头到响应体读完（流式接口读到done帧后释放响应为止），流式接口即生成耗时
+- decode:   JSON解码与模型校验，需调用方用 read_json / decoding() 包裹
+- total:    请求开始到响应体读完
+
+NDJSON每行一次调用:
+- {"type": "timing", "call", "t", "client", "method", "url", "path", "status", "error",
+   "request_bytes", "response_bytes", "queue", "dns", ...}
+"""
+
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from cassette import ObservedStream
+
+PHASES = ["queue", "dns", "connect", "tls", "send", "ttfb", "transfer", "decode", "total"]
+
+# Prometheus直方图的桶上界（秒）
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0]
+
+METRIC_PREFIX = "learnorbit_client"
+
+# 当前任务最近一次发起的调用，供 decoding() 把解码耗时记到对应调用上
+_current_call = contextvars.ContextVar("request_timing_call", default=None)
+
+
+class CallTiming:
+    """一次调用的时间点与字节数，时间点取自 time.perf_counter()"""
+
+    def __init__(self, recorder, call_id, client, method, url, defer):
+        self.recorder = recorder
+        self.call_id = call_id
+        self.client = client
+        self.method = method
+        self.url = url
+        self.t = time.time()
+        self.start = time.perf_counter()
+        self.marks = {}
+        self.status = None
+        self.error = None
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.decode = 0.0
+        # httpx响应，响应体读完时取实际下载的字节数（分块传输时没有Content-Length）
+        self.response = None
+        # defer为True时，响应体读完后还要等调用方解码结束才输出
+        self.defer = defer
+        self.body_done = False
+        self.emitted = False
+
+    def mark(self, name):
+        self.marks[name] = time.perf_counter()
+
+    def _span(self, begin, end):
+        if begin in self.marks and end in self.marks:
+            return self.marks[end] - self.marks[begin]
+        return None
+
+    def phases(self):
+        """计算各阶段耗时"""
+        marks = self.marks
+        dns = self._span("dns_start", "dns_end")
+        connect = self._span("connect_start", "connect_end")
+        if connect is not None and dns is not None:
+            connect -= dns
+        sent = marks.get("sent")
+        send_from = max((marks[k] for k in ("connect_end", "tls_end", "queue_end") if k in marks),
+                        default=self.start)
+        headers = marks.get("headers")
+        body_end = marks.get("body_end")
+        return {
+            "queue": self._span("queue_start", "queue_end"),
+            "dns": dns,
+            "connect": connect,
+            "tls": self._span("tls_start", "tls_end"),
+            "send": sent - send_from if sent is not None else None,
+            "ttfb": headers - (sent or self.start) if headers is not None else None,
+            "transfer": body_end - headers if headers is not None and body_end is not None else None,
+            "decode": self.decode if self.decode else None,
+            "total": (body_end or marks.get("failed", time.perf_counter())) - self.start,
+        }
+
+    def end_body(self):
+        """记录响应体结束的时间点，只记第一次"""
+        if not self.body_done:
+            self.mark("body_end")
+            self.body_done = True
+
+    def finish_body(self):
+        self.end_body()
+        if not self.defer:
+            self.recorder.emit(self)
+
+    def release(self):
+        """
+        响应被释放或关闭：流式接口读到done帧就停止读取，不会读到结尾，以此时作为响应体结束；
+        此前的解码耗时都已计入，直接输出
+        """
+        self.end_body()
+        self.recorder.emit(self)
+
+    def fail(self, exc):
+        self.mark("failed")
+        self.error = f"{type(exc).__name__}: {exc}"
+        self.recorder.emit(self)
+
+    def to_record(self):
+        record = {
+            "type": "timing",
+            "call": self.call_id,
+            "t": self.t,
+            "client": self.client,
+            "method": self.method,
+            "url": self.url,
+            "path": urlsplit(self.url).path,
+            "status": self.status,
+            "error": self.error,
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+        }
+        record.update(self.phases())
+        return record
+
+
+class _Histogram:
+    """Prometheus风格的累积桶直方图"""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+class TimingRecorder:
+    """
+    收集调用耗时，逐行写NDJSON，并维护可导出为Prometheus文本格式的聚合指标
+
+    参数:
+    - ndjson_path: NDJSON输出路径（追加写入），None表示不写
+    - metrics_path: close() 时写入Prometheus文本快照的路径，None表示不写
+    """
+
+    def __init__(self, ndjson_path=None, metrics_path=None):
+        self.ndjson_path = ndjson_path
+        self.metrics_path = metrics_path
+        self._file = open(ndjson_path, "a", encoding="utf-8") if ndjson_path else None
+        self._ids = itertools.count(1)
+        self._prefix = f"{os.getpid()}-{int(time.time())}"
+        self._pending = set()
+        self.histograms = {}
+        self.requests = {}
+        self.request_bytes = {}
+        self.response_bytes = {}
+
+    def start(self, client, method, url, defer=False):
+        """登记一次新调用，并输出当前任务中上一次仍在等待解码的调用"""
+        previous = _current_call.get()
+        if previous is not None and previous.recorder is self and previous.body_done:
+            self.emit(previous)
+        call = CallTiming(self, f"{self._prefix}-{next(self._ids)}", client, method, str(url), defer)
+        self._pending.add(call)
+        _current_call.set(call)
+        return call
+
+    def emit(self, call):
+        """输出一次调用的记录并计入聚合指标，重复调用无效"""
+        if call.emitted:
+            return
+        call.emitted = True
+        self._pending.discard(call)
+        record = call.to_record()
+        if self._file is not None:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+        key = (call.client, call.method, record["path"])
+        for phase in PHASES:
+            if record[phase] is not None:
+                self.histograms.setdefault(key + (phase,), _Histogram()).observe(record[phase])
+        status_key = key + (str(call.status) if call.status is not None else "error",)
+        self.requests[status_key] = self.requests.get(status_key, 0) + 1
+        self.request_bytes[key] = self.request_bytes.get(key, 0) + call.request_bytes
+        self.response_bytes[key] = self.response_bytes.get(key, 0) + call.response_bytes
+
+    def prometheus(self):
+        """返回Prometheus文本格式的指标快照"""
+        lines = [
+            f"# HELP {METRIC_PREFIX}_phase_seconds Per-request latency broken down by phase.",
+            f"# TYPE {METRIC_PREFIX}_phase_seconds histogram",
+        ]
+        for (client, method, path, phase), hist in sorted(self.histograms.items()):
+            labels = _labels(client=client, method=method, path=path, phase=phase)
+            for bound, count in zip(BUCKETS, hist.counts):
+                lines.append(f'{METRIC_PREFIX}_phase_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{METRIC_PREFIX}_phase_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+            lines.append(f"{METRIC_PREFIX}_phase_seconds_sum{{{labels}}} {hist.sum:.6f}")
+            lines.append(f"{METRIC_PREFIX}_phase_seconds_count{{{labels}}} {hist.count}")
+        lines.append(f"# HELP {METRIC_PREFIX}_requests_total Requests by response status.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_requests_total counter")
+        for (client, method, path, status), count in sorted(self.requests.items()):
+            labels = _labels(client=client, method=method, path=path, status=status)
+            lines.append(f"{METRIC_PREFIX}_requests_total{{{labels}}} {count}")
+        for name, totals in (("request_bytes", self.request_bytes), ("response_bytes", self.response_bytes)):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name}_total Body bytes transferred.")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+            for (client, method, path), total in sorted(totals.items()):
+                labels = _labels(client=client, method=method, path=path)
+                lines.append(f"{METRIC_PREFIX}_{name}_total{{{labels}}} {total}")
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path=None):
+        """把指标快照写入文件（先写临时文件再替换，便于被node_exporter的textfile收集器读取）"""
+        path = path or self.metrics_path
+        if not path:
+            return
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, path)
+
+    def close(self):
+        """输出仍未结束的调用，写入指标快照并关闭文件"""
+        for call in list(self._pending):
+            if call.body_done:
+                self.emit(call)
+            else:
+                call.fail(RuntimeError("响应体未读完"))
+        self.write_metrics()
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+
+    def aiohttp_trace_config(self):
+        """生成记录各阶段时间点的aiohttp TraceConfig"""
+
+        async def on_request_start(session, ctx, params):
+            ctx.call = self.start("aiohttp", params.method, params.url)
+
+        async def on_connection_queued_start(session, ctx, params):
+            ctx.call.mark("queue_start")
+
+        async def on_connection_queued_end(session, ctx, params):
+            ctx.call.mark("queue_end")
+
+        async def on_connection_create_start(session, ctx, params):
+            ctx.call.mark("connect_start")
+
+        async def on_connection_create_end(session, ctx, params):
+            ctx.call.mark("connect_end")
+
+        async def on_dns_resolvehost_start(session, ctx, params):
+            ctx.call.mark("dns_start")
+
+        async def on_dns_resolvehost_end(session, ctx, params):
+            ctx.call.mark("dns_end")
+
+        async def on_request_headers_sent(session, ctx, params):
+            ctx.call.mark("sent")
+
+        async def on_request_chunk_sent(session, ctx, params):
+            ctx.call.request_bytes += len(params.chunk)
+            ctx.call.mark("sent")
+
+        async def on_request_end(session, ctx, params):
+            call = ctx.call
+            call.mark("headers")
+            response = params.response
+            call.status = response.status
+
+            def on_data(data):
+                call.response_bytes += len(data)
+
+            # 读到结尾只记时间点，输出推迟到响应释放时，最后一帧的解码耗时才能计入
+            response.content = ObservedStream(response.content, on_data, call.end_body)
+            for name in ("release", "close"):
+                original = getattr(response, name)
+
+                def released(*args, _original=original, **kwargs):
+                    call.release()
+                    return _original(*args, **kwargs)
+
+                setattr(response, name, released)
+
+        async def on_request_exception(session, ctx, params):
+            ctx.call.fail(params.exception)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_queued_start.append(on_connection_queued_start)
+        trace_config.on_connection_queued_end.append(on_connection_queued_end)
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+        trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+        if hasattr(trace_config, "on_request_headers_sent"):  # aiohttp >= 3.8
+            trace_config.on_request_headers_sent.append(on_request_headers_sent)
+        trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        return trace_config
+
+    def httpx_event_hooks(self):
+        """
+        生成httpx的event_hooks；请求钩子给每个请求挂上httpcore的trace扩展
+        httpx在返回前已读完响应体，因此解码耗时要等调用方的 decoding() 结束后才输出
+        """
+        # httpcore trace事件名（去掉http11./http2./connection.前缀）-> 时间点
+        events = {
+            "connect_tcp.started": "connect_start",
+            "connect_tcp.complete": "connect_end",
+            "start_tls.started": "tls_start",
+            "start_tls.complete": "tls_end",
+            "send_request_headers.complete": "sent",
+            "send_request_body.complete": "sent",
+            "receive_response_headers.complete": "headers",
+        }
+
+        async def on_request(request):
+            call = self.start("httpx", request.method, request.url, defer=True)
+            call.request_bytes = int(request.headers.get("content-length", 0) or 0)
+
+            async def trace(name, info):
+                event = name.split(".", 1)[-1]
+                if event in events:
+                    call.mark(events[event])
+                elif event == "receive_response_body.complete":
+                    if call.response is not None:
+                        call.response_bytes = call.response.num_bytes_downloaded
+                    call.finish_body()
+                elif event.endswith(".failed") and not call.emitted:
+                    call.fail(info.get("exception") or RuntimeError(name))
+
+            request.extensions["trace"] = trace
+
+        async def on_response(response):
+            call = _current_call.get()
+            if call is not None and call.recorder is self:
+                call.status = response.status_code
+                call.response = response
+
+        return {"request": [on_request], "response": [on_response]}
+
+
+@contextlib.contextmanager
+def decoding():
+    """把代码块的耗时计为当前任务最近一次调用的JSON解码时间；未启用计时时只执行代码块"""
+    call = _current_call.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if call is not None and not call.emitted:
+            call.decode += time.perf_counter() - start
+            if call.body_done and call.defer:
+                call.recorder.emit(call)
+
+
+async def read_json(response):
+    """
+    读取aiohttp响应体并解码JSON，代替 await response.json() 以便把解码时间计入该调用
+
+    返回:
+    - 解码后的对象
+    """
+    call = _current_call.get()
+    if call is not None:
+        call.defer = True
+    body = await response.read()
+    with decoding():
+        return json.loads(body)
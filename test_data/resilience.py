@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对冲请求与熔断器：用于搜索与任务生成等幂等调用
+
+- 对冲：第一次请求在该接口近期延迟的 p95（可配置）内没有返回时，再发一个相同的请求，
+  采用先返回的成功结果并取消其余请求。用少量额外请求换取尾延迟的下降
+- 熔断：同一接口连续失败达到阈值后打开熔断器，之后的调用立即失败（CircuitOpenError）
+  而不是等到超时；经过冷却时间后进入半开状态，放行少量探测请求，成功则恢复
+
+默认不启用，与 http_client 一样通过 add_resilience_args / configure_from_args 配置，
+未启用时 call() 直接执行原请求
+"""
+
+import asyncio
+import collections
+import math
+import time
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时的快速失败"""
+
+    def __init__(self, endpoint, retry_after):
+        super().__init__(f"{endpoint} 熔断中，{retry_after:.1f}秒后重试")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+def _status_of(exc):
+    """从aiohttp/httpx的HTTP错误中取出状态码，其他异常返回None"""
+    status = getattr(exc, "status", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_failure(exc):
+    """4xx是请求本身的问题，不计入熔断；5xx、超时与连接错误计入"""
+    status = _status_of(exc)
+    return status is None or status >= 500
+
+
+class HedgePolicy:
+    """
+    对冲参数
+
+    参数:
+    - percentile: 用近期成功请求延迟的该分位数作为对冲等待时间
+    - min_delay: 对冲等待时间下限（秒），避免后端很快时几乎每个请求都被对冲
+    - max_delay: 对冲等待时间上限（秒），None表示不限
+    - window: 参与计算分位数的近期样本数
+    - min_samples: 样本不足时不对冲
+    - max_hedges: 每次调用最多额外发出的请求数
+    """
+
+    def __init__(self, percentile=95, min_delay=0.05, max_delay=None, window=200, min_samples=20, max_hedges=1):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.window = window
+        self.min_samples = min_samples
+        self.max_hedges = max_hedges
+
+    def __str__(self):
+        return f"hedge p{self.percentile:g}"
+
+
+class CircuitBreaker:
+    """
+    单个接口的熔断器: closed -> open -> half_open -> closed
+
+    参数:
+    - failure_threshold: 连续失败多少次后打开
+    - reset_timeout: 打开后多久进入半开状态（秒）
+    - half_open_probes: 半开状态下同时放行的探测请求数
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, half_open_probes=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.probes = 0
+        self.opened_count = 0
+
+    def before_call(self, endpoint):
+        """调用前检查，熔断中抛出CircuitOpenError"""
+        if self.state == "open":
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.reset_timeout:
+                raise CircuitOpenError(endpoint, self.reset_timeout - elapsed)
+            self.state = "half_open"
+            self.probes = 0
+        if self.state == "half_open":
+            if self.probes >= self.half_open_probes:
+                raise CircuitOpenError(endpoint, 0.0)
+            self.probes += 1
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.probes = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened_count += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.probes = 0
+
+    def release_probe(self):
+        """半开探测被取消（既未成功也未失败）时归还名额"""
+        if self.state == "half_open" and self.probes:
+            self.probes -= 1
+
+
+class EndpointGuard:
+    """单个接口的近期延迟、熔断器与统计"""
+
+    def __init__(self, name, hedge=None, breaker=None):
+        self.name = name
+        self.hedge = hedge
+        self.breaker = breaker
+        self.latencies = collections.deque(maxlen=hedge.window if hedge else 1)
+        self.stats = {"calls": 0, "requests": 0, "hedged": 0, "hedge_wins": 0, "failed": 0, "fast_failed": 0}
+
+    def hedge_delay(self):
+        """当前的对冲等待时间，样本不足或未启用对冲时返回None"""
+        if self.hedge is None or len(self.latencies) < self.hedge.min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        rank = max(1, math.ceil(self.hedge.percentile / 100 * len(ordered)))
+        delay = max(self.hedge.min_delay, ordered[rank - 1])
+        if self.hedge.max_delay is not None:
+            delay = min(delay, self.hedge.max_delay)
+        return delay
+
+    async def call(self, attempt):
+        """
+        执行一次调用
+
+        参数:
+        - attempt: 无参协程函数，每次调用发出一个请求并返回结果，失败时抛出异常
+        """
+        self.stats["calls"] += 1
+        if self.breaker is not None:
+            try:
+                self.breaker.before_call(self.name)
+            except CircuitOpenError:
+                self.stats["fast_failed"] += 1
+                raise
+        try:
+            result = await self._hedged(attempt)
+        except asyncio.CancelledError:
+            if self.breaker is not None:
+                self.breaker.release_probe()
+            raise
+        except Exception as e:
+            self.stats["failed"] += 1
+            if self.breaker is not None:
+                if is_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+            raise
+        if self.breaker is not None:
+            self.breaker.record_success()
+        return result
+
+    async def _timed(self, attempt):
+        start_time = time.perf_counter()
+        try:
+            result = await attempt()
+        except asyncio.CancelledError:
+            # 被对冲取消的慢请求至少耗时这么久；不计入的话分位数只看得到快请求，会越估越低
+            self.latencies.append(time.perf_counter() - start_time)
+            raise
+        self.latencies.append(time.perf_counter() - start_time)
+        return result
+
+    async def _hedged(self, attempt):
+        delay = self.hedge_delay()
+        self.stats["requests"] += 1
+        if delay is None:
+            return await self._timed(attempt)
+        first = asyncio.ensure_future(self._timed(attempt))
+        pending = {first}
+        hedges = 0
+        error = None
+        try:
+            while pending:
+                can_hedge = hedges < self.hedge.max_hedges
+                done, pending = await asyncio.wait(pending, timeout=delay if can_hedge else None,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+                if not done:
+                    # 等待超过对冲时间仍未返回：再发一个相同请求
+                    hedges += 1
+                    if hedges == 1:
+                        self.stats["hedged"] += 1
+                    self.stats["requests"] += 1
+                    pending.add(asyncio.ensure_future(self._timed(attempt)))
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+class Resilience:
+    """
+    按接口名称管理 EndpointGuard
+
+    参数:
+    - hedge: HedgePolicy，None表示不对冲
+    - breaker_failures: 熔断阈值（连续失败次数），None表示不启用熔断
+    - breaker_reset: 熔断冷却时间（秒）
+    - half_open_probes: 半开状态下的探测请求数
+    """
+
+    def __init__(self, hedge=None, breaker_failures=None, breaker_reset=30.0, half_open_probes=1):
+        self.hedge = hedge
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self.half_open_probes = half_open_probes
+        self.guards = {}
+
+    def guard(self, endpoint):
+        if endpoint not in self.guards:
+            breaker = None
+            if self.breaker_failures:
+                breaker = CircuitBreaker(self.breaker_failures, self.breaker_reset, self.half_open_probes)
+            self.guards[endpoint] = EndpointGuard(endpoint, self.hedge, breaker)
+        return self.guards[endpoint]
+
+    async def call(self, endpoint, attempt):
+        return await self.guard(endpoint).call(attempt)
+
+    def format_stats(self):
+        """各接口的对冲与熔断统计表"""
+        lines = [f"{'接口':<16}{'调用':>8}{'请求':>8}{'额外请求':>10}{'对冲':>8}{'对冲胜出':>10}"
+                 f"{'失败':>8}{'快速失败':>10}{'熔断次数':>10}{'对冲等待':>10}"]
+        for name, guard in self.guards.items():
+            s = guard.stats
+            extra = (s["requests"] - (s["calls"] - s["fast_failed"])) / max(s["calls"], 1)
+            delay = guard.hedge_delay()
+            lines.append(
+                f"{name:<16}{s['calls']:>8}{s['requests']:>8}{extra:>10.1%}{s['hedged']:>8}{s['hedge_wins']:>10}"
+                f"{s['failed']:>8}{s['fast_failed']:>10}"
+                f"{guard.breaker.opened_count if guard.breaker else 0:>10}"
+                f"{'-' if delay is None else f'{delay:.3f}':>10}")
+        return "\n".join(lines)
+
+
+_current = None
+
+
+def configure(hedge=None, breaker_failures=None, breaker_reset=30.0, half_open_probes=1):
+    """
+    启用（或关闭）全局的对冲与熔断，会清空已有的延迟样本与熔断状态
+
+    返回:
+    - 新的Resilience实例；两者都未启用时为None
+    """
+    global _current
+    if hedge is None and not breaker_failures:
+        _current = None
+    else:
+        _current = Resilience(hedge, breaker_failures, breaker_reset, half_open_probes)
+    return _current
+
+
+def current():
+    """当前启用的Resilience实例，未启用时为None"""
+    return _current
+
+
+async def call(endpoint, attempt):
+    """
+    按全局配置执行一次幂等调用；未启用对冲与熔断时直接执行 attempt()
+
+    参数:
+    - endpoint: 接口名称，用于区分延迟样本与熔断器
+    - attempt: 无参协程函数，发出一个请求，失败时抛出异常
+    """
+    if _current is None:
+        return await attempt()
+    return await _current.call(endpoint, attempt)
+
+
+def add_resilience_args(parser):
+    """为argparse解析器添加对冲与熔断参数"""
+    group = parser.add_argument_group("对冲与熔断（仅用于搜索与任务生成）")
+    group.add_argument("--hedge", action="store_true", help="启用对冲请求")
+    group.add_argument("--hedge-percentile", type=float, default=95, help="对冲等待时间取近期延迟的分位数")
+    group.add_argument("--hedge-min-delay", type=float, default=0.05, help="对冲等待时间下限(秒)")
+    group.add_argument("--hedge-max-delay", type=float, help="对冲等待时间上限(秒)")
+    group.add_argument("--breaker", type=int, metavar="N", help="连续失败N次后熔断该接口")
+    group.add_argument("--breaker-reset", type=float, default=30.0, help="熔断冷却时间(秒)")
+    return group
+
+
+def configure_from_args(args):
+    """根据 add_resilience_args 解析出的参数配置全局对冲与熔断"""
+    hedge = None
+    if args.hedge:
+        hedge = HedgePolicy(args.hedge_percentile, args.hedge_min_delay, args.hedge_max_delay)
+    return configure(hedge, args.breaker, args.breaker_reset)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索结果磁盘缓存：以 (端点, 关键词, 语言) 的内容哈希为键保存原始响应
+- TTL: 以文件mtime记录写入时间，过期即视为未命中并删除
+- LRU: 以文件atime记录最近访问时间（读取时显式更新），超过容量时淘汰最久未用的条目
+- 键不含服务器：同一目录只能用于一个后端，cache_from_args 在 --cache-dir 下按服务器主机分子目录
+"""
+
+import hashlib
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+
+class SearchCache:
+    """
+    搜索结果缓存
+
+    参数:
+    - directory: 缓存目录
+    - ttl: 条目有效期（秒），None表示永不过期
+    - max_bytes: 缓存总大小上限（字节），None表示不限制
+    """
+
+    def __init__(self, directory, ttl=24 * 3600, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def key(endpoint, keyword, lang):
+        canonical = json.dumps([endpoint, keyword, lang], ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _entries(self):
+        """遍历缓存文件，产出 (路径, 大小, 最近访问时间)"""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_atime
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        self._size -= size
+
+    def __contains__(self, item):
+        """item 为 (端点, 关键词, 语言)；只检查是否存在且未过期，不计入命中统计"""
+        try:
+            st = os.stat(self._path(self.key(*item)))
+        except FileNotFoundError:
+            return False
+        return self.ttl is None or time.time() - st.st_mtime <= self.ttl
+
+    def get(self, endpoint, keyword, lang):
+        """
+        读取缓存
+
+        返回:
+        - 原始响应字节，未命中或已过期时返回None
+        """
+        path = self._path(self.key(endpoint, keyword, lang))
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        now = time.time()
+        if self.ttl is not None and now - st.st_mtime > self.ttl:
+            self._remove(path)
+            self.expired += 1
+            self.misses += 1
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path, (now, st.st_mtime))
+        self.hits += 1
+        self.bytes_read += len(data)
+        return data
+
+    def put(self, endpoint, keyword, lang, data):
+        """写入一条原始响应，必要时淘汰最久未用的条目"""
+        path = self._path(self.key(endpoint, keyword, lang))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            self._remove(path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._size += len(data)
+        self.bytes_written += len(data)
+        if self.max_bytes is not None and self._size > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        for path, _, _ in sorted(self._entries(), key=lambda entry: entry[2]):
+            if self._size <= self.max_bytes:
+                break
+            self._remove(path)
+            self.evictions += 1
+
+    def stats(self):
+        """返回命中与字节统计"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "size_bytes": self._size,
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"搜索缓存: 命中 {s['hits']}, 未命中 {s['misses']} (命中率 {s['hit_ratio']:.1%}), "
+                f"过期 {s['expired']}, 淘汰 {s['evictions']}, "
+                f"从缓存读取 {s['bytes_read'] / 1024:.1f} KB, 写入 {s['bytes_written'] / 1024:.1f} KB, "
+                f"当前大小 {s['size_bytes'] / 1024:.1f} KB")
+
+
+def add_cache_args(parser):
+    """为argparse解析器添加缓存相关参数"""
+    group = parser.add_argument_group("搜索缓存")
+    group.add_argument("--cache-dir", help="启用磁盘缓存并指定目录（按服务器主机分子目录）")
+    group.add_argument("--cache-ttl", type=float, default=24 * 3600, help="缓存有效期(秒)")
+    group.add_argument("--cache-max-mb", type=float, default=256, help="缓存容量上限(MB)")
+    return group
+
+
+def cache_directory(root, server_url):
+    """服务器对应的缓存目录：<root>/<主机_端口>，避免替身后端、内网与线上的结果混在一起"""
+    host = urlsplit(server_url).netloc or server_url
+    return os.path.join(root, host.replace(":", "_"))
+
+
+def cache_from_args(args, server_url):
+    """根据 add_cache_args 解析出的参数创建 server_url 的缓存，未指定 --cache-dir 时返回None"""
+    if not args.cache_dir:
+        return None
+    return SearchCache(cache_directory(args.cache_dir, server_url), ttl=args.cache_ttl,
+                       max_bytes=int(args.cache_max_mb * 1024 * 1024))
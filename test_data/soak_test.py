@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+长时间浸泡测试：持续数小时循环执行脚本化会话，按固定间隔采样客户端资源与延迟，
+结束时判断各指标是否随时间漂移，用于区分客户端泄漏与后端变慢
+
+每个采样区间记录:
+- 进程RSS、tracemalloc跟踪的Python堆大小及增长最多的分配位置
+- 打开的文件描述符数、socket数、新建/复用的连接数（连接抖动）
+- 事件循环延迟（定时器实际唤醒时间比预期晚多少）
+- 本区间内各阶段延迟的 p50/p99
+
+RSS、fd、socket 优先使用 psutil（pip install psutil），否则读取 /proc（仅Linux）
+
+用法:
+    python soak_test.py --server http://127.0.0.1:5001 --duration 4h --interval 60 --concurrency 5
+    python soak_test.py --workload plan --duration 30m --output soak.ndjson
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import signal
+import sys
+import time
+import tracemalloc
+import uuid
+
+import aiohttp
+
+import http_client
+import test_interactive
+import test_plan_stream
+from latency_stats import LatencyHistogram
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DEFAULT_SERVER = "http://172.30.116.44:5001"
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 判断漂移的客户端资源指标；延迟指标按阶段动态加入
+RESOURCE_METRICS = ("rss_mb", "traced_mb", "fds", "sockets", "loop_lag_p99")
+
+# 统计tracemalloc增长时忽略的分配位置
+_TRACEMALLOC_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def parse_duration(text):
+    """
+    解析时长，支持 90 / 90s / 30m / 4h / 2d
+
+    返回:
+    - 秒数
+    """
+    text = str(text).strip().lower()
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    try:
+        if text and text[-1] in units:
+            return float(text[:-1]) * units[text[-1]]
+        return float(text)
+    except ValueError:
+        raise ValueError(f"无法解析时长: {text}，示例: 90 / 30m / 4h") from None
+
+
+def process_stats():
+    """
+    当前进程的RSS（MB）、打开的文件描述符数与socket数，无法获取的项为None
+    """
+    if psutil is not None:
+        proc = psutil.Process()
+        fds = proc.num_fds() if hasattr(proc, "num_fds") else None
+        return proc.memory_info().rss / 1048576, fds, len(proc.net_connections(kind="all"))
+    rss = fds = sockets = None
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576
+        names = os.listdir("/proc/self/fd")
+        fds = len(names)
+        sockets = 0
+        for name in names:
+            try:
+                if os.readlink(f"/proc/self/fd/{name}").startswith("socket:"):
+                    sockets += 1
+            except OSError:
+                # 列目录与readlink之间该fd已被关闭
+                pass
+    except OSError:
+        # 非Linux：只能拿到峰值RSS（macOS单位为字节，Linux为KB）
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss = peak / 1048576 if sys.platform == "darwin" else peak / 1024
+    return rss, fds, sockets
+
+
+class IntervalStats:
+    """
+    按采样区间轮换的统计容器，可直接作为 run_scenario_session 的 histograms / failures 参数，
+    长时间运行的会话跨区间时样本计入记录时所在的区间
+    """
+
+    def __init__(self):
+        self.current = {}
+
+    def __contains__(self, key):
+        return key in self.current
+
+    def __getitem__(self, key):
+        return self.current[key]
+
+    def __setitem__(self, key, value):
+        self.current[key] = value
+
+    def get(self, key, default=None):
+        return self.current.get(key, default)
+
+    def rotate(self):
+        """结束当前区间，返回其内容"""
+        current, self.current = self.current, {}
+        return current
+
+
+class ConnectionCounter:
+    """用aiohttp TraceConfig统计新建与复用的连接数"""
+
+    def __init__(self):
+        self.created = 0
+        self.reused = 0
+
+    def trace_config(self):
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_create(session, ctx, params):
+            self.created += 1
+
+        async def on_reuse(session, ctx, params):
+            self.reused += 1
+
+        trace_config.on_connection_create_end.append(on_create)
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        return trace_config
+
+    def take(self):
+        """返回自上次调用以来的 (新建, 复用) 并清零"""
+        counts = (self.created, self.reused)
+        self.created = self.reused = 0
+        return counts
+
+
+async def monitor_loop_lag(stats, period=0.1):
+    """每 period 秒唤醒一次，把实际唤醒时间比预期晚的秒数记入 stats['loop_lag']"""
+    while True:
+        start_time = time.perf_counter()
+        await asyncio.sleep(period)
+        stats["loop_lag"].record(max(0.0, time.perf_counter() - start_time - period))
+
+
+def _record(histograms, phase, value):
+    key = ("all", phase)
+    if key not in histograms:
+        histograms[key] = LatencyHistogram(phase)
+    histograms[key].record(value)
+
+
+async def run_plan_session(server_url, session_id, histograms, failures):
+    """plan 工作负载：先创建再更新一次计划"""
+    session = await http_client.get_session()
+    for mode in ("create", "update"):
+        timings = await test_plan_stream.timed_stream_generate(session, server_url, mode, session_id)
+        if not timings["ok"]:
+            failures[("all", f"plan_{mode}")] = failures.get(("all", f"plan_{mode}"), 0) + 1
+            continue
+        _record(histograms, f"plan_{mode}_first_step", timings["first_step"])
+        _record(histograms, f"plan_{mode}", timings["total"])
+
+
+def _mean(values):
+    return sum(values) / len(values)
+
+
+def detect_drift(samples, metric, threshold=0.2, window=0.25):
+    """
+    比较开头与结尾各 window 比例的采样均值，并用最小二乘估计每小时斜率
+
+    参数:
+    - samples: 区间采样列表，每项含 t（秒）与各指标
+    - metric: 指标名
+    - threshold: 结尾均值比开头均值增长超过该比例且斜率为正时视为漂移
+    - window: 开头/结尾各取的采样比例
+
+    返回:
+    - {metric, first, last, change, slope_per_hour, drift}，有效采样少于4个时返回None
+    """
+    points = [(s["t"], s.get(metric)) for s in samples]
+    points = [(t, v) for t, v in points if v is not None]
+    if len(points) < 4:
+        return None
+    n = max(1, int(len(points) * window))
+    first = _mean([v for _, v in points[:n]])
+    last = _mean([v for _, v in points[-n:]])
+    mean_t = _mean([t for t, _ in points])
+    mean_v = _mean([v for _, v in points])
+    var_t = sum((t - mean_t) ** 2 for t, _ in points)
+    slope = sum((t - mean_t) * (v - mean_v) for t, v in points) / var_t * 3600 if var_t else 0.0
+    if first > 0:
+        change = (last - first) / first
+    else:
+        change = float("inf") if last > 0 else 0.0
+    return {"metric": metric, "first": first, "last": last, "change": change,
+            "slope_per_hour": slope, "drift": change > threshold and slope > 0}
+
+
+class SoakSampler:
+    """
+    周期采样器：汇总一个区间的资源与延迟数据
+
+    参数:
+    - histograms/failures: 会话写入的 IntervalStats
+    - connections: ConnectionCounter
+    - top: 每次记录的tracemalloc增长最多的分配位置个数
+    """
+
+    def __init__(self, histograms, failures, connections, top=10):
+        self.histograms = histograms
+        self.failures = failures
+        self.connections = connections
+        self.top = top
+        self.loop_stats = {"loop_lag": LatencyHistogram("loop_lag")}
+        self.baseline = None
+        self.sessions = 0
+        self.samples = []
+        self.start_time = time.perf_counter()
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(_TRACEMALLOC_FILTERS)
+
+    def top_allocators(self, snapshot=None):
+        """相对基线增长最多的分配位置: [(位置, 增长KB, 当前KB), ...]"""
+        if self.baseline is None or not tracemalloc.is_tracing():
+            return []
+        snapshot = snapshot or self._snapshot()
+        rows = []
+        for stat in snapshot.compare_to(self.baseline, "lineno")[:self.top]:
+            frame = stat.traceback[0]
+            rows.append((f"{os.path.basename(frame.filename)}:{frame.lineno}",
+                         stat.size_diff / 1024, stat.size / 1024))
+        return rows
+
+    def sample(self):
+        """结束当前区间并返回采样字典"""
+        rss, fds, sockets = process_stats()
+        created, reused = self.connections.take()
+        lag = self.loop_stats["loop_lag"]
+        self.loop_stats["loop_lag"] = LatencyHistogram("loop_lag")
+        histograms = self.histograms.rotate()
+        failures = self.failures.rotate()
+        sample = {
+            "t": round(time.perf_counter() - self.start_time, 3),
+            "rss_mb": rss,
+            "fds": fds,
+            "sockets": sockets,
+            "traced_mb": None,
+            "connections_created": created,
+            "connections_reused": reused,
+            "loop_lag_p99": lag.percentile(99),
+            "loop_lag_max": lag.max,
+            "sessions": self.sessions,
+            "failures": sum(failures.values()),
+            "phases": {},
+            "top_allocators": [],
+        }
+        self.sessions = 0
+        for (round_key, phase), hist in histograms.items():
+            if round_key != "all" or not hist.count:
+                continue
+            sample["phases"][phase] = {"count": hist.count, "p50": hist.percentile(50), "p99": hist.percentile(99)}
+        if tracemalloc.is_tracing():
+            sample["traced_mb"] = tracemalloc.get_traced_memory()[0] / 1048576
+            snapshot = self._snapshot()
+            if self.baseline is None:
+                # 第一个区间结束时（连接池、缓存已预热）作为基线
+                self.baseline = snapshot
+            else:
+                sample["top_allocators"] = self.top_allocators(snapshot)
+        self.samples.append(sample)
+        return sample
+
+
+def format_sample(sample):
+    """一行区间摘要"""
+    def cell(value, fmt):
+        return "-" if value is None else format(value, fmt)
+
+    latency = ", ".join(f"{phase} p50 {s['p50']:.2f}/p99 {s['p99']:.2f}"
+                        for phase, s in sorted(sample["phases"].items()))
+    return (f"[{sample['t'] / 60:7.1f} 分] RSS {cell(sample['rss_mb'], '.1f')} MB, "
+            f"堆 {cell(sample['traced_mb'], '.1f')} MB, fd {cell(sample['fds'], 'd')}, "
+            f"socket {cell(sample['sockets'], 'd')}, 连接 新建 {sample['connections_created']}"
+            f"/复用 {sample['connections_reused']}, 循环延迟 p99 {cell(sample['loop_lag_p99'], '.3f')}s, "
+            f"会话 {sample['sessions']}, 失败 {sample['failures']}" + (f" | {latency}" if latency else ""))
+
+
+def format_drift(samples, threshold):
+    """
+    漂移报告与判断
+
+    返回:
+    - (报告文本, 发生漂移的指标列表)
+    """
+    metrics = list(RESOURCE_METRICS)
+    phases = sorted({phase for s in samples for phase in s["phases"]})
+    metrics += [f"{phase}_{p}" for phase in phases for p in ("p50", "p99")]
+    # 把各阶段分位数展开为顶层指标，没有样本的区间记为None
+    samples = [dict(s, **{f"{phase}_{p}": s["phases"].get(phase, {}).get(p) for phase in phases for p in ("p50", "p99")})
+               for s in samples]
+    lines = [f"{'指标':<32}{'开头':>12}{'结尾':>12}{'变化':>10}{'每小时斜率':>14}  判断"]
+    drifted = []
+    for metric in metrics:
+        result = detect_drift(samples, metric, threshold)
+        if result is None:
+            continue
+        if result["drift"]:
+            drifted.append(metric)
+        lines.append(f"{metric:<32}{result['first']:>12.3f}{result['last']:>12.3f}"
+                     f"{result['change']:>10.1%}{result['slope_per_hour']:>14.3f}  "
+                     f"{'漂移' if result['drift'] else '稳定'}")
+    client = [m for m in drifted if m in RESOURCE_METRICS and m != "loop_lag_p99"]
+    latency = [m for m in drifted if m not in RESOURCE_METRICS]
+    if client:
+        lines.append(f"\n客户端资源持续增长 ({', '.join(client)})：优先检查客户端泄漏，见下方分配位置")
+    elif latency:
+        lines.append("\n客户端资源稳定但延迟持续上升：更可能是后端变慢或泄漏")
+    elif len(samples) >= 4:
+        lines.append("\n未发现漂移")
+    else:
+        lines.append("\n采样少于4个，无法判断漂移，请延长 --duration 或缩短 --interval")
+    return "\n".join(lines), drifted
+
+
+async def run_soak(server_url, duration, interval, concurrency, workload="scenario", scenario=None,
+                   output_path=None, threshold=0.2, top=10, verbose=False, **session_kwargs):
+    """
+    循环执行会话直到 duration 秒或收到 Ctrl-C，每 interval 秒采样一次
+
+    参数:
+    - server_url: 服务器URL
+    - duration: 总时长（秒）
+    - interval: 采样间隔（秒）
+    - concurrency: 同时进行的会话数
+    - workload: 'scenario' 按场景文件执行多轮对话，'plan' 只做计划创建+更新
+    - scenario: load_scenario 返回的场景，scenario 工作负载时使用
+    - output_path: 每个区间的采样追加写入该NDJSON文件
+    - threshold: 漂移判断阈值
+    - top: 记录的tracemalloc增长位置个数
+    - verbose: 是否保留各接口调用的逐条输出
+    - session_kwargs: 传给 run_scenario_session 的其余参数
+
+    返回:
+    - (采样列表, 发生漂移的指标列表)
+    """
+    histograms = IntervalStats()
+    failures = IntervalStats()
+    connections = ConnectionCounter()
+    http_client.add_trace_config(connections.trace_config())
+    sampler = SoakSampler(histograms, failures, connections, top)
+    run_id = uuid.uuid4().hex[:8]
+    deadline = time.perf_counter() + duration
+    stop = asyncio.Event()
+    out = sys.stdout
+    output = open(output_path, "a", encoding="utf-8") if output_path else None
+
+    loop = asyncio.get_running_loop()
+    with contextlib.suppress(NotImplementedError):
+        # 第一次Ctrl-C：不再开始新会话，等进行中的会话结束后输出报告
+        loop.add_signal_handler(signal.SIGINT, stop.set)
+
+    async def worker(worker_index):
+        iteration = 0
+        while not stop.is_set() and time.perf_counter() < deadline:
+            session_id = f"soak_{run_id}_{worker_index}_{iteration}"
+            iteration += 1
+            try:
+                if workload == "plan":
+                    await run_plan_session(server_url, session_id, histograms, failures)
+                else:
+                    await test_interactive.run_scenario_session(server_url, scenario, session_id,
+                                                                histograms, failures, **session_kwargs)
+            except Exception as e:
+                print(f"[{session_id}] 会话出错: {e!r}", file=out)
+                failures[("all", "session")] = failures.get(("all", "session"), 0) + 1
+            sampler.sessions += 1
+
+    async def sample_loop():
+        while True:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop.wait(), interval)
+            if stop.is_set():
+                return
+            sample = sampler.sample()
+            print(format_sample(sample), file=out, flush=True)
+            if output is not None:
+                output.write(json.dumps(sample, ensure_ascii=False) + "\n")
+                output.flush()
+
+    print(f"浸泡测试: 工作负载 {workload}, 并发 {concurrency}, 时长 {duration / 3600:.2f} 小时, "
+          f"采样间隔 {interval:g} 秒, tracemalloc {'开启' if tracemalloc.is_tracing() else '关闭'}, "
+          f"进程信息来源 {'psutil' if psutil is not None else '/proc'}")
+    lag_task = asyncio.ensure_future(monitor_loop_lag(sampler.loop_stats))
+    sample_task = asyncio.ensure_future(sample_loop())
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+            await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    finally:
+        stop.set()
+        await sample_task
+        lag_task.cancel()
+        with contextlib.suppress(NotImplementedError):
+            loop.remove_signal_handler(signal.SIGINT)
+        if output is not None:
+            output.close()
+
+    samples = sampler.samples
+    report, drifted = format_drift(samples, threshold)
+    print(f"\n浸泡测试结束! 共 {len(samples)} 个采样区间")
+    print(report)
+    allocators = sampler.top_allocators()
+    if allocators:
+        print("\n相对第一个区间增长最多的分配位置:")
+        print(f"{'位置':<48}{'增长KB':>12}{'当前KB':>12}")
+        for where, diff, size in allocators:
+            print(f"{where:<48}{diff:>12.1f}{size:>12.1f}")
+    return samples, drifted
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="长时间浸泡测试：客户端内存、连接抖动与延迟漂移")
+    parser.add_argument("--server", default=DEFAULT_SERVER, help="服务器URL")
+    parser.add_argument("--duration", default="1h", help="总时长，例如 90 / 30m / 4h / 2d")
+    parser.add_argument("--interval", default="60", help="采样间隔，例如 30 / 5m")
+    parser.add_argument("--concurrency", type=int, default=5, help="同时进行的会话数")
+    parser.add_argument("--workload", choices=["scenario", "plan"], default="scenario",
+                        help="scenario: 按场景文件执行多轮对话; plan: 计划创建+更新")
+    parser.add_argument("--scenario", help="场景文件，默认 scenario_sample.json")
+    parser.add_argument("--pipeline", action="store_true", help="计划流式返回时即开始逐步生成任务")
+    parser.add_argument("--task-concurrency", type=int, default=5, help="每个会话任务生成的最大并发数")
+    parser.add_argument("--task-timeout", type=float, default=None, help="单个任务生成请求的超时(秒)")
+    parser.add_argument("--output", help="每个区间的采样追加写入该NDJSON文件")
+    parser.add_argument("--drift-threshold", type=float, default=0.2,
+                        help="结尾均值比开头增长超过该比例且斜率为正时判为漂移")
+    parser.add_argument("--top", type=int, default=10, help="报告的tracemalloc增长位置个数")
+    parser.add_argument("--tracemalloc-frames", type=int, default=1,
+                        help="tracemalloc保留的调用栈深度，0表示关闭tracemalloc")
+    parser.add_argument("--verbose", action="store_true", help="保留逐条接口输出")
+    http_client.add_client_args(parser)
+    args = parser.parse_args()
+    try:
+        duration = parse_duration(args.duration)
+        interval = parse_duration(args.interval)
+    except ValueError as e:
+        parser.error(str(e))
+    http_client.configure_from_args(args)
+    needed = args.concurrency * (args.task_concurrency + 1)
+    http_client.configure(
+        limit=max(args.limit, needed),
+        limit_per_host=max(args.limit_per_host, needed),
+    )
+    scenario = None
+    if args.workload == "scenario":
+        scenario = test_interactive.load_scenario(args.scenario or os.path.join(FIXTURE_DIR, "scenario_sample.json"))
+    if args.tracemalloc_frames > 0:
+        tracemalloc.start(args.tracemalloc_frames)
+
+    async def run():
+        try:
+            return await run_soak(
+                args.server, duration, interval, args.concurrency, args.workload, scenario,
+                args.output, args.drift_threshold, args.top, args.verbose,
+                pipeline=args.pipeline,
+                task_concurrency=args.task_concurrency,
+                task_timeout=args.task_timeout,
+            )
+        finally:
+            await http_client.close()
+
+    _, drifted = asyncio.run(run())
+    # 发现漂移时以非0退出，便于在定时任务中告警
+    sys.exit(1 if drifted else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量SSE解析器：直接处理原始字节块，支持完整的事件语法
+- data 字段多行拼接，event/id/retry 字段，注释行
+- \\n、\\r\\n、\\r 三种换行，事件跨字节块拆分
+- 每个事件记录到达时间戳
+"""
+
+import time
+
+
+class SSEEvent:
+    """
+    一个已分发的SSE事件
+
+    属性:
+    - event: 事件类型，未指定时为 'message'
+    - data: data 字段内容，多行以 \\n 连接
+    - id: 最近一次 id 字段的值
+    - retry: retry 字段（毫秒），未指定为None
+    - timestamp: 完成该事件的字节块到达时间（time.perf_counter）
+    """
+
+    __slots__ = ("event", "data", "id", "retry", "timestamp")
+
+    def __init__(self, event, data, id, retry, timestamp):
+        self.event = event
+        self.data = data
+        self.id = id
+        self.retry = retry
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return f"SSEEvent(event={self.event!r}, id={self.id!r}, data={self.data[:60]!r})"
+
+
+class SSEParser:
+    """
+    增量解析器，逐块调用 feed()，流结束时调用 close()
+
+    参数:
+    - clock: 时间戳函数，默认time.perf_counter
+
+    属性:
+    - first_chunk_at: 第一个非空字节块的到达时间，可用于计算首字节时间
+    - last_event_id: 最近一次 id 字段的值
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self._buffer = bytearray()
+        self._data = []
+        self._event = None
+        self._retry = None
+        self.last_event_id = None
+        self.first_chunk_at = None
+        self._started = False
+
+    def feed(self, chunk, now=None):
+        """
+        输入一个字节块
+
+        参数:
+        - chunk: bytes/bytearray
+        - now: 到达时间，默认取clock()
+
+        返回:
+        - 本块中完成的SSEEvent列表
+        """
+        if now is None:
+            now = self._clock()
+        if self.first_chunk_at is None and chunk:
+            self.first_chunk_at = now
+        buf = self._buffer
+        buf += chunk
+        if not self._started:
+            if len(buf) < 3 and b"\xef\xbb\xbf".startswith(bytes(buf)):
+                return []
+            if buf.startswith(b"\xef\xbb\xbf"):
+                del buf[:3]
+            self._started = True
+
+        events = []
+        start = 0
+        size = len(buf)
+        next_cr = buf.find(b"\r")
+        with memoryview(buf) as view:
+            while start < size:
+                next_lf = buf.find(b"\n", start)
+                if 0 <= next_cr < start:
+                    next_cr = buf.find(b"\r", start)
+                if next_cr != -1 and (next_lf == -1 or next_cr < next_lf):
+                    if next_cr + 1 == size:
+                        break  # 需要下一块才能确定是否是 \r\n
+                    end = next_cr
+                    after = end + 2 if buf[end + 1] == 0x0A else end + 1
+                elif next_lf != -1:
+                    end = next_lf
+                    after = end + 1
+                else:
+                    break
+                self._process_line(buf, view, start, end, now, events)
+                start = after
+        if start:
+            del buf[:start]
+        return events
+
+    def close(self, now=None):
+        """
+        流结束：处理缓冲区中剩余的最后一行，并分发尚未以空行结束的事件
+        （规范要求丢弃不完整事件，这里宽松处理，避免漏掉服务端最后一条done事件）
+        """
+        if now is None:
+            now = self._clock()
+        events = []
+        buf = self._buffer
+        if buf:
+            end = len(buf) - 1 if buf.endswith(b"\r") else len(buf)
+            with memoryview(buf) as view:
+                self._process_line(buf, view, 0, end, now, events)
+            buf.clear()
+        self._dispatch(now, events)
+        return events
+
+    def _process_line(self, buf, view, start, end, now, events):
+        if start == end:
+            self._dispatch(now, events)
+            return
+        if buf[start] == 0x3A:  # ':' 注释行
+            return
+        colon = buf.find(b":", start, end)
+        if colon == -1:
+            name_end = value_start = end
+        else:
+            name_end = colon
+            value_start = colon + 1
+            if value_start < end and buf[value_start] == 0x20:
+                value_start += 1
+        name_len = name_end - start
+        if name_len == 4 and buf.startswith(b"data", start):
+            self._data.append(str(view[value_start:end], "utf-8"))
+        elif name_len == 5 and buf.startswith(b"event", start):
+            self._event = str(view[value_start:end], "utf-8")
+        elif name_len == 2 and buf.startswith(b"id", start):
+            if buf.find(b"\x00", value_start, end) == -1:
+                self.last_event_id = str(view[value_start:end], "utf-8")
+        elif name_len == 5 and buf.startswith(b"retry", start):
+            value = bytes(view[value_start:end])
+            if value.isdigit():
+                self._retry = int(value)
+
+    def _dispatch(self, now, events):
+        if self._data:
+            events.append(SSEEvent(self._event or "message", "\n".join(self._data),
+                                   self.last_event_id, self._retry, now))
+        self._data = []
+        self._event = None
+
+
+async def iter_sse(content, parser=None):
+    """
+    从aiohttp响应体中逐个产出SSE事件
+
+    参数:
+    - content: response.content（StreamReader）
+    - parser: 可选的SSEParser，默认新建
+    """
+    parser = parser or SSEParser()
+    async for chunk in content.iter_any():
+        for event in parser.feed(chunk):
+            yield event
+    for event in parser.close():
+        yield event
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务更新请求体瘦身与压缩
+
+task_data 原样发送时包含完整的 videos 列表和 web_res（每条结果的 content、raw_content 等），
+detect/execute 各发一次。这里提供两种投影:
+- slim:    视频只保留标题与链接，网页搜索结果只保留标题与链接
+- minimal: 去掉 videos 与 web_res，只保留幻灯片、题目与编程任务
+以及可选的 gzip / zstd 请求体压缩（zstd 需要 pip install zstandard，服务端需按 Content-Encoding 解压）
+"""
+
+import gzip
+import json
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PROJECTIONS = ("full", "slim", "minimal")
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+# minimal 投影保留的字段
+MINIMAL_FIELDS = ("type", "difficulty", "ppt_slide", "questions", "task", "search_keyword")
+
+
+def project_task(task, projection="full"):
+    """
+    按投影裁剪任务
+
+    参数:
+    - task: 任务字典（Task 模型的JSON形式）
+    - projection: 'full' / 'slim' / 'minimal'
+
+    返回:
+    - 新的任务字典，full 时返回原对象
+    """
+    if projection == "full":
+        return task
+    if projection == "minimal":
+        return {key: task[key] for key in MINIMAL_FIELDS if key in task}
+    if projection != "slim":
+        raise ValueError(f"未知投影: {projection}，可选 {', '.join(PROJECTIONS)}")
+    slim = dict(task)
+    if task.get("videos"):
+        slim["videos"] = [{"title": v.get("title", ""), "url": v.get("url", "")} for v in task["videos"]]
+    web_res = task.get("web_res")
+    if web_res:
+        slim["web_res"] = {
+            "query": web_res.get("query", ""),
+            "results": [{"title": r.get("title", ""), "url": r.get("url", "")} for r in web_res.get("results", [])],
+        }
+    return slim
+
+
+def project_payload(payload, projection="full"):
+    """对请求体中的 task_data 应用投影，其余字段不变"""
+    if projection == "full" or "task_data" not in payload:
+        return payload
+    return dict(payload, task_data=project_task(payload["task_data"], projection))
+
+
+def restore_task(original, updated, projection="full"):
+    """
+    把execute返回的任务与原任务合并：投影时裁掉或精简的字段从原任务恢复
+
+    返回:
+    - 合并后的任务字典
+    """
+    if projection == "full":
+        return updated
+    merged = dict(updated)
+    for key in ("videos", "web_res"):
+        if key in original:
+            merged[key] = original[key]
+    return merged
+
+
+def encode_body(payload, compression="none", level=None):
+    """
+    把请求体编码为字节
+
+    与 aiohttp 的 json= 参数一致使用 json.dumps 默认参数，未压缩时字节数与原来发送的相同
+
+    参数:
+    - payload: 请求体对象
+    - compression: 'none' / 'gzip' / 'zstd'
+    - level: 压缩级别，默认 gzip 6、zstd 3
+
+    返回:
+    - (请求体字节, 需要附加的请求头)
+    """
+    body = json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if compression in (None, "none"):
+        return body, headers
+    if compression == "gzip":
+        body = gzip.compress(body, compresslevel=6 if level is None else level)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("需要安装zstandard: pip install zstandard")
+        body = zstandard.ZstdCompressor(level=3 if level is None else level).compress(body)
+    else:
+        raise ValueError(f"未知压缩方式: {compression}，可选 {', '.join(COMPRESSIONS)}")
+    headers["Content-Encoding"] = compression
+    return body, headers
+
+
+def decode_body(body, encoding):
+    """按 Content-Encoding 解压请求体，供 mock_server 使用"""
+    if not encoding or encoding == "identity":
+        return body
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("需要安装zstandard: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    raise ValueError(f"不支持的Content-Encoding: {encoding}")
+
+
+def add_payload_args(parser):
+    """为argparse解析器添加请求体瘦身与压缩参数"""
+    group = parser.add_argument_group("请求体")
+    group.add_argument("--projection", choices=PROJECTIONS, default="full", help="task_data 投影方式")
+    group.add_argument("--compress", choices=COMPRESSIONS, default="none", help="请求体压缩方式")
+    return group
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务调度器：限制并发、按优先级执行异步调用，并按完成顺序返回结果
+用于控制 /api/task/generate 的并发量，让编号靠前的步骤先完成
+"""
+
+import asyncio
+import itertools
+
+_DONE = object()
+
+
+class _Entry:
+    def __init__(self, key, factory):
+        self.key = key
+        self.factory = factory
+        self.task = None
+        self.cancelled = False
+        self.finished = False
+
+
+class TaskScheduler:
+    """
+    有界并发的优先级调度器
+
+    参数:
+    - concurrency: 同时执行的调用数上限
+    - timeout: 单次调用超时（秒），None表示不限制
+
+    用法:
+    - submit(key, factory, priority) 提交任务，priority越小越先执行
+    - close() 声明不再提交，之后 as_completed() 在全部完成后结束
+    - as_completed() 按完成顺序产出 (key, result, error)
+    """
+
+    def __init__(self, concurrency=5, timeout=None):
+        if concurrency < 1:
+            raise ValueError("concurrency 必须大于0")
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._queue = asyncio.PriorityQueue()
+        self._results = asyncio.Queue()
+        self._entries = {}
+        self._seq = itertools.count()
+        self._workers = []
+        self._outstanding = 0
+        self._closed = False
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        """已提交且未取消的任务键（包含已完成的）"""
+        return set(self._entries)
+
+    def submit(self, key, factory, priority=0):
+        """
+        提交一个调用，同一key重复提交时取消旧的调用
+
+        参数:
+        - key: 任务标识，结果中原样返回
+        - factory: 无参可调用对象，返回要执行的协程
+        - priority: 优先级，数值越小越先执行
+        """
+        if self._closed:
+            raise RuntimeError("调度器已关闭，不能再提交任务")
+        self.cancel(key)
+        entry = _Entry(key, factory)
+        self._entries[key] = entry
+        self._outstanding += 1
+        self._queue.put_nowait((priority, next(self._seq), entry))
+        if not self._workers:
+            self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.concurrency)]
+
+    def cancel(self, key):
+        """取消排队中或执行中的调用，已完成的调用只会被移除"""
+        entry = self._entries.pop(key, None)
+        if entry is None or entry.finished:
+            return
+        entry.cancelled = True
+        if entry.task is not None:
+            entry.task.cancel()
+
+    def close(self):
+        """声明不再提交新任务"""
+        self._closed = True
+        if self._outstanding == 0:
+            self._results.put_nowait(_DONE)
+
+    async def as_completed(self):
+        """按完成顺序产出 (key, result, error)，被取消的调用不产出"""
+        try:
+            while True:
+                item = await self._results.get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            await self.shutdown()
+
+    async def shutdown(self):
+        """取消所有未完成的调用并停止工作协程"""
+        self._closed = True
+        for entry in list(self._entries.values()):
+            if entry.task is not None and not entry.finished:
+                entry.task.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _settle(self):
+        self._outstanding -= 1
+        if self._closed and self._outstanding == 0:
+            self._results.put_nowait(_DONE)
+
+    async def _worker(self):
+        while True:
+            _, _, entry = await self._queue.get()
+            if entry.cancelled:
+                self._settle()
+                continue
+            entry.task = asyncio.ensure_future(asyncio.wait_for(entry.factory(), self.timeout))
+            await asyncio.wait([entry.task])
+            entry.finished = True
+            if entry.cancelled or entry.task.cancelled():
+                self._settle()
+                continue
+            error = entry.task.exception()
+            result = None if error else entry.task.result()
+            self._results.put_nowait((entry.key, result, error))
+            self._settle()
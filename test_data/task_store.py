@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务缓存：以步骤内容哈希为键保存已生成的任务
+计划更新后只有新增或内容变化的步骤需要重新调用 /api/task/generate
+"""
+
+import hashlib
+import json
+
+# 这些字段由客户端附加或只反映进度，不影响任务内容
+IGNORED_STEP_FIELDS = ("id", "retrive_enabled", "task", "status")
+
+
+def step_hash(step):
+    """
+    计算步骤内容的哈希
+
+    参数:
+    - step: 计划中的步骤字典
+
+    返回:
+    - sha256十六进制字符串
+    """
+    content = {k: v for k, v in step.items() if k not in IGNORED_STEP_FIELDS}
+    canonical = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class TaskStore:
+    """按步骤内容哈希缓存任务，并统计命中情况"""
+
+    def __init__(self):
+        self._tasks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __contains__(self, step):
+        return step_hash(step) in self._tasks
+
+    def get(self, step):
+        """返回内容相同步骤的已生成任务，没有则返回None"""
+        task = self._tasks.get(step_hash(step))
+        if task is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return task
+
+    def put(self, step, task):
+        """保存步骤对应的任务"""
+        if task:
+            self._tasks[step_hash(step)] = task
+
+    def stats(self):
+        """返回命中统计字典"""
+        return {"entries": len(self._tasks), "hits": self.hits, "misses": self.misses}
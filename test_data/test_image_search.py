@@ -2,13 +2,20 @@
 """
 测试 /api/image/search API
 """
+import argparse
 import asyncio
-import aiohttp
 import json
 
-async def test_image_search_api():
-    """测试图片搜索功能"""
-    url = "http://172.30.116.44:5001/api/image/search"
+import http_client
+import request_timing
+from search_cache import add_cache_args, cache_from_args
+
+SERVER_URL = "http://172.30.116.44:5001"
+
+
+async def test_image_search_api(cache=None):
+    """测试图片搜索功能，传入cache时优先读取缓存"""
+    url = f"{SERVER_URL}/api/image/search"
     data = {
         "search_keyword": "apple company",
         "lang": "en"
@@ -18,29 +25,54 @@ async def test_image_search_api():
     print(f"请求 URL: {url}")
     print(f"请求数据: {json.dumps(data, indent=2)}")
     
+    if cache is not None:
+        cached = cache.get("image", data["search_keyword"], data["lang"])
+        if cached is not None:
+            print("命中缓存，响应内容:")
+            print(json.dumps(json.loads(cached), indent=2, ensure_ascii=False))
+            return
+
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url,
-                json=data,
-                headers={'Content-Type': 'application/json'}
-            ) as response:
-                print(f"响应状态码: {response.status}")
+        session = await http_client.get_session()
+        async with session.post(
+            url,
+            json=data,
+            headers={'Content-Type': 'application/json'}
+        ) as response:
+            print(f"响应状态码: {response.status}")
                 
-                if response.status == 200:
-                    response_json = await response.json()
-                    print("响应内容:")
-                    print(json.dumps(response_json, indent=2, ensure_ascii=False))
-                else:
-                    error_text = await response.text()
-                    print(f"请求失败: {error_text}")
+            if response.status == 200:
+                response_json = await request_timing.read_json(response)
+                body = await response.read()
+                if cache is not None:
+                    cache.put("image", data["search_keyword"], data["lang"], body)
+                print("响应内容:")
+                print(json.dumps(response_json, indent=2, ensure_ascii=False))
+            else:
+                error_text = await response.text()
+                print(f"请求失败: {error_text}")
                     
     except Exception as e:
         print(f"请求过程中发生错误: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="测试图片搜索 API")
+    http_client.add_client_args(parser)
+    add_cache_args(parser)
+    args = parser.parse_args()
+    http_client.configure_from_args(args)
+    cache = cache_from_args(args, SERVER_URL)
+
     print("开始测试图片搜索 API...")
     
-    asyncio.run(test_image_search_api())
+    async def run():
+        try:
+            await test_image_search_api(cache)
+        finally:
+            await http_client.close()
+    
+    asyncio.run(run())
+    if cache is not None:
+        print(cache.format_stats())
     
-    print("\n测试完成！") 
\ No newline at end of file
+    print("\n测试完成！")
\ No newline at end of file
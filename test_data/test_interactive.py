@@ -3,75 +3,90 @@
 """
 交互式测试工具：依次调用chat接口和stream_generate接口
 支持多轮对话，保存对话历史
+使用 --scenario 时按场景文件无交互地运行，可同时驱动多个会话
 """
 
 import asyncio
+import contextlib
+import functools
 import hashlib
 import aiohttp
 import json
 import sys
 import time
 import uuid
+import mimetypes
 import os
 
-import requests
+import http_client
+import request_timing
+import resilience
+from chat_stream import format_result, stream_chat
+from history_policy import HistoryPolicy, add_history_args, parse_policy
+from latency_stats import LatencyHistogram, format_report
+from plan_writer import PlanRecordWriter
+from sse_parser import iter_sse
+from task_scheduler import TaskScheduler
+from task_store import TaskStore
 output_dir="sampleoutput"
-DEFAULT_SERVER = "http://172.30.116.44:5001"
-# DEFAULT_SERVER="https://study-platform.zeabur.app"
-# DEFAULT_SERVER="https://studyplatform-tokyo.zeabur.app"
+# 已知部署：--server 可直接写名称；deploy_compare.py 默认同时对比这几个
+DEPLOYMENTS = {
+    "internal": "http://172.30.116.44:5001",
+    "zeabur": "https://study-platform.zeabur.app",
+    "tokyo": "https://studyplatform-tokyo.zeabur.app",
+}
+DEFAULT_SERVER = DEPLOYMENTS["internal"]
 
 async def call_task_generate_api(server_url, input_data):
     url = f"{server_url}/api/task/generate"
+    session = await http_client.get_session()
+
+    async def attempt():
+        async with session.post(url, json=input_data) as response:
+            if response.status != 200:
+                raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                  status=response.status, message=await response.text())
+            return await request_timing.read_json(response)
+
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=input_data) as response:
-                if response.status != 200:
-                    print(f"请求失败，状态码：{response.status}")
-                    error_text = await response.text()
-                    print(f"错误信息: {error_text}")
-                    return None
-                return await response.json()
+        # 启用 --hedge / --breaker 时对冲与熔断，否则直接请求
+        return await resilience.call("task_generate", attempt)
+    except aiohttp.ClientResponseError as e:
+        print(f"请求失败，状态码：{e.status}")
+        print(f"错误信息: {e.message}")
+        return None
     except Exception as e:
         print(f"调用Task Generate API时出错: {e}")
         return None
 
-async def call_chat_api(server_url, messages, session_id=None,lang="zh"):
+async def call_chat_api(server_url, messages, session_id=None,lang="zh", on_text=None):
     """
-    调用chat接口
+    调用chat接口，流式读取回复
     
     参数:
     - server_url: 服务器URL
     - messages: 消息列表
     - session_id: 会话ID，如果为None则生成新ID
+    - on_text: 可选回调，每收到一段回复文本立即调用，用于边收边显示
     
     返回:
-    - 会话ID和响应内容
+    - 会话ID和响应内容 {response, updateSteps, reason}
     """    
-    url = f"{server_url}/api/chat1/stream"
-    data = {
-        "id": session_id,
-        "messages": messages,
-        "lang": lang
-    }
-    
     print(f"正在调用Chat API...")
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=data) as response:
-                if response.status != 200:
-                    print(f"请求失败，状态码：{response.status}")
-                    error_text = await response.text()
-                    print(f"错误信息: {error_text}")
-                    return session_id, None
-                
-                result = await response.json()
-                return session_id, result
-                
+        result = await stream_chat(server_url, messages, session_id, lang, on_text)
+    except aiohttp.ClientResponseError as e:
+        print(f"请求失败，状态码：{e.status}")
+        print(f"错误信息: {e.message}")
+        return session_id, None
     except Exception as e:
         print(f"调用Chat API时出错: {e}")
         return session_id, None
+    print(format_result(result))
+    return session_id, result.to_dict()
 
-async def call_stream_generate(server_url, messages, session_id, is_update=False, advise=None,lang="zh"):
+async def call_stream_generate(server_url, messages, session_id, is_update=False, advise=None,lang="zh", on_step=None,
+                               on_introduction=None):
     """
     调用stream_generate接口
     
@@ -81,6 +96,8 @@ async def call_stream_generate(server_url, messages, session_id, is_update=False
     - session_id: 会话ID
     - is_update: 是否为更新模式
     - advise: 更新建议
+    - on_step: 可选回调，每收到一个step事件立即以(step_number, step)调用
+    - on_introduction: 可选回调，收到课程介绍时立即以介绍内容调用
     """
     url = f"{server_url}/api/learning/plan/stream_generate"
     
@@ -98,111 +115,359 @@ async def call_stream_generate(server_url, messages, session_id, is_update=False
     print(f"正在{mode}学习计划...")
     
     try:
-        async with aiohttp.ClientSession() as session:
-            start_time = time.time()
-            async with session.post(url, json=data) as response:
-                if response.status != 200:
-                    print(f"请求失败，状态码：{response.status}")
-                    error_text = await response.text()
-                    print(f"错误信息: {error_text}")
-                    return None
+        session = await http_client.get_session()
+        start_time = time.time()
+        async with session.post(url, json=data) as response:
+            if response.status != 200:
+                print(f"请求失败，状态码：{response.status}")
+                error_text = await response.text()
+                print(f"错误信息: {error_text}")
+                return None
                 
-                print("开始接收流式响应...")
-                step_count = 0
-                introduction = None
+            print("开始接收流式响应...")
+            step_count = 0
+            introduction = None
                 
-                async for line in response.content:
-                    if line.startswith(b'data: '):
-                        json_str = line.decode('utf-8').replace('data: ', '')
-                        try:
-                            data_obj = json.loads(json_str)
+            async for event in iter_sse(response.content):
+                try:
+                    with request_timing.decoding():
+                        data_obj = json.loads(event.data)
+                        
+                    if "error" in data_obj:
+                        print(f"\n错误: {data_obj['error']}")
+                    elif "warning" in data_obj:
+                        print(f"\n警告: {data_obj['warning']}")
+                    elif "message" in data_obj:
+                        print(f"\n消息: {data_obj['message']}")
+                    elif "introduction" in data_obj:
+                        print("\n课程介绍:")
+                        intro = data_obj["introduction"]
+                        introduction = intro
+                        print(json.dumps(intro, ensure_ascii=False, indent=2))
+                        if on_introduction:
+                            on_introduction(intro)
+                    elif "step" in data_obj:
+                        step_count += 1
+                        step = data_obj["step"]
+                        step_number = data_obj.get("step_number", step_count)
+                        total = data_obj.get("total", "未知")
                             
-                            if "error" in data_obj:
-                                print(f"\n错误: {data_obj['error']}")
-                            elif "warning" in data_obj:
-                                print(f"\n警告: {data_obj['warning']}")
-                            elif "message" in data_obj:
-                                print(f"\n消息: {data_obj['message']}")
-                            elif "introduction" in data_obj:
-                                print("\n课程介绍:")
-                                intro = data_obj["introduction"]
-                                introduction = intro
-                                print(json.dumps(intro, ensure_ascii=False, indent=2))
-                            elif "step" in data_obj:
-                                step_count += 1
-                                step = data_obj["step"]
-                                step_number = data_obj.get("step_number", step_count)
-                                total = data_obj.get("total", "未知")
-                                
-                                print(f"\n步骤 {step_number}/{total}:")
-                                print(step)
-                                # print(f"标题: {step.get('title', '无标题')}")
-                                # print(f"描述: {step.get('description', '无描述')}...")
-                                if "videos" in step:
-                                    print(f"视频数量: {len(step.get('videos', []))}")
-                            elif "done" in data_obj and data_obj["done"]:
-                                end_time = time.time()
-                                duration = end_time - start_time
-                                print(f"\n计划生成完成! 耗时: {duration:.2f}秒")
-                                if "plan" in data_obj:
-                                    plan = data_obj["plan"]
-                                    if introduction:
-                                        plan["introduction"] = introduction
-                                    print(f"计划包含 {len(plan.get('plan', []))} 个步骤")
-                                    return plan
-                        except json.JSONDecodeError as e:
-                            print(f"解析JSON失败: {e}")
-                            print(f"原始数据: {json_str}")
+                        print(f"\n步骤 {step_number}/{total}:")
+                        print(step)
+                        # print(f"标题: {step.get('title', '无标题')}")
+                        # print(f"描述: {step.get('description', '无描述')}...")
+                        if "videos" in step:
+                            print(f"视频数量: {len(step.get('videos', []))}")
+                        if on_step:
+                            on_step(step_number, step)
+                    elif "done" in data_obj and data_obj["done"]:
+                        end_time = time.time()
+                        duration = end_time - start_time
+                        print(f"\n计划生成完成! 耗时: {duration:.2f}秒")
+                        if "plan" in data_obj:
+                            plan = data_obj["plan"]
+                            if introduction:
+                                plan["introduction"] = introduction
+                            print(f"计划包含 {len(plan.get('plan', []))} 个步骤")
+                            return plan
+                except json.JSONDecodeError as e:
+                    print(f"解析JSON失败: {e}")
+                    print(f"原始数据: {event.data}")
     
     except Exception as e:
         print(f"调用Stream Generate API时出错: {e}")
     
     return None
-async def upload_document(server_url, file_path, session_id):
-    """Upload a document to the server
+class _ProgressReader:
+    """File wrapper that counts bytes as aiohttp reads them (in its executor thread)"""
+
+    def __init__(self, f, on_read):
+        self._f = f
+        self._on_read = on_read
+        self.name = f.name
+
+    def read(self, size=-1):
+        chunk = self._f.read(size)
+        if chunk:
+            self._on_read(len(chunk))
+        return chunk
+
+    def fileno(self):
+        return self._f.fileno()
+
+    def tell(self):
+        return self._f.tell()
+
+    def seek(self, offset, whence=0):
+        return self._f.seek(offset, whence)
+
+    def close(self):
+        self._f.close()
+
+async def upload_document(server_url, file_path, session_id, progress_interval=1.0):
+    """Upload a document to the server as a streamed multipart body
+    
+    The file is read in chunks off the event loop, so other requests keep
+    running while a large PDF is being sent.
     
     Parameters:
     - server_url: Server URL
     - file_path: Path to the document file
     - session_id: Chat ID to associate the document with
+    - progress_interval: Seconds between progress lines, 0 to disable
     
     Returns:
-    - True if upload was successful, False otherwise
+    - Stats dict (file, bytes, seconds, mb_per_s) if upload was successful, None otherwise
     """
     url = f"{server_url}/api/documents/upload"
     
     if not os.path.exists(file_path):
         print(f"File not found: {file_path}")
-        return False
-        
+        return None
+    
+    name = os.path.basename(file_path)
+    total = os.path.getsize(file_path)
+    sent = 0
+    
+    def on_read(n):
+        nonlocal sent
+        sent += n
+    
+    async def report_progress():
+        while True:
+            await asyncio.sleep(progress_interval)
+            print(f"  {name}: {sent / 1024 / 1024:.1f}/{total / 1024 / 1024:.1f} MB ({sent * 100 / max(total, 1):.0f}%)")
+    
+    progress_task = None
+    reader = None
     try:
-        with open(file_path, 'rb') as f:
-            files = {'file': f}
-            data = {'chat_id': session_id}
-            
-            print(f"Uploading document: {os.path.basename(file_path)}...")
-            upload_response = requests.post(url, files=files, data=data)
+        session = await http_client.get_session()
+        content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        with aiohttp.MultipartWriter("form-data") as form:
+            part = form.append(session_id)
+            part.set_content_disposition("form-data", name="chat_id")
+            reader = _ProgressReader(open(file_path, 'rb'), on_read)
+            part = form.append_payload(aiohttp.payload.BufferedReaderPayload(reader, content_type=content_type))
+            part.set_content_disposition("form-data", name="file", filename=name)
             
-            if upload_response.status_code == 200:
-                upload_result = upload_response.json()
-                print("Upload successful:")
-                print(json.dumps(upload_result, indent=2))
-                return True
-            else:
-                print(f"Upload failed with status code {upload_response.status_code}:")
-                print(upload_response.text)
-                return False
+            print(f"Uploading document: {name} ({total / 1024 / 1024:.2f} MB)...")
+            if progress_interval:
+                progress_task = asyncio.ensure_future(report_progress())
+            start_time = time.perf_counter()
+            async with session.post(url, data=form) as upload_response:
+                body = await upload_response.text()
+                elapsed = time.perf_counter() - start_time
+                
+                if upload_response.status == 200:
+                    print("Upload successful:")
+                    print(json.dumps(json.loads(body), indent=2))
+                    stats = {
+                        "file": name,
+                        "bytes": total,
+                        "seconds": elapsed,
+                        "mb_per_s": total / 1024 / 1024 / elapsed if elapsed else 0.0,
+                    }
+                    print(f"{name}: {total / 1024 / 1024:.2f} MB in {elapsed:.2f}s ({stats['mb_per_s']:.2f} MB/s)")
+                    return stats
+                else:
+                    print(f"Upload failed with status code {upload_response.status}:")
+                    print(body)
+                    return None
     except Exception as e:
         print(f"Error uploading document: {str(e)}")
-        return False
+        return None
+    finally:
+        if progress_task:
+            progress_task.cancel()
+        if reader:
+            reader.close()
+
+async def upload_documents(server_url, file_paths, session_id, concurrency=4):
+    """Upload several documents for one chat_id concurrently
+    
+    Parameters:
+    - server_url: Server URL
+    - file_paths: List of document paths
+    - session_id: Chat ID to associate the documents with
+    - concurrency: Maximum number of uploads in flight
+    
+    Returns:
+    - List of per-file stats dicts (None for failed uploads), in input order
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def upload_one(path):
+        async with semaphore:
+            return await upload_document(server_url, path, session_id)
+    
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*(upload_one(path) for path in file_paths))
+    elapsed = time.perf_counter() - start_time
+    
+    uploaded = [r for r in results if r]
+    total_bytes = sum(r["bytes"] for r in uploaded)
+    print(f"Uploaded {len(uploaded)}/{len(file_paths)} documents, "
+          f"{total_bytes / 1024 / 1024:.2f} MB in {elapsed:.2f}s "
+          f"({total_bytes / 1024 / 1024 / elapsed if elapsed else 0:.2f} MB/s aggregate)")
+    return results
 
-async def interactive_test(server_url):
+async def process_task(server_url, step_data):
+    """调用Task Generate API并打印结果"""
+    task_data = await call_task_generate_api(server_url, step_data)
+    print(f"step {step_data['step']}:")
+    print(task_data)
+    print("*"*100)
+    return task_data
+
+async def generate_tasks_for_plan(server_url, plan, session_id, scheduler, task_store=None, on_task=None):
+    """
+    为计划中的每个步骤生成任务，并按完成顺序把结果写回plan
+    
+    参数:
+    - server_url: 服务器URL
+    - plan: stream_generate返回的计划
+    - session_id: 会话ID
+    - scheduler: TaskScheduler，流水线模式下可能已提交了部分步骤
+    - task_store: 可选TaskStore，内容未变化的步骤直接复用已生成的任务
+    - on_task: 可选回调，每个步骤的任务就绪（生成完成或复用）时以(step_number, task_data)调用
+    """
+    index_by_step = {}
+    reused = 0
+    for i, step in enumerate(plan['plan']):
+        step["id"] = session_id
+        step["retrive_enabled"] = True
+        step_number = step.setdefault("step", i + 1)
+        index_by_step[step_number] = i
+        if step_number in scheduler:
+            continue
+        cached = task_store.get(step) if task_store is not None else None
+        if cached is not None:
+            step['task'] = cached
+            reused += 1
+            if on_task:
+                on_task(step_number, cached)
+        else:
+            scheduler.submit(step_number, functools.partial(process_task, server_url, step), priority=step_number)
+    
+    # 最终计划中已不存在的步骤，其提前发起的任务不再需要
+    for step_number in scheduler.keys() - index_by_step.keys():
+        scheduler.cancel(step_number)
+    scheduler.close()
+    if reused:
+        print(f"复用 {reused} 个内容未变化步骤的已生成任务")
+    
+    async for step_number, task_data, error in scheduler.as_completed():
+        if error:
+            print(f"step {step_number} 任务生成失败: {error!r}")
+        elif task_data and step_number in index_by_step:
+            step = plan['plan'][index_by_step[step_number]]
+            step['task'] = task_data
+            if task_store is not None:
+                task_store.put(step, task_data)
+            if on_task:
+                on_task(step_number, task_data)
+
+async def plan_and_tasks(server_url, messages, session_id, is_update, advise, lang,
+                         pipeline=False, task_concurrency=5, task_timeout=None, task_store=None,
+                         writer=None, round_number=None):
+    """
+    生成（或更新）学习计划，并为计划中的步骤生成任务
+    
+    参数:
+    - server_url: 服务器URL
+    - messages: 消息列表
+    - session_id: 会话ID
+    - is_update: 是否为更新模式
+    - advise: 更新建议
+    - lang: 语言
+    - pipeline: 是否在计划流式返回过程中，每收到一个步骤就立即生成其任务
+    - task_concurrency: 同时进行的任务生成请求数上限
+    - task_timeout: 单个任务生成请求的超时（秒）
+    - task_store: 可选TaskStore
+    - writer: 可选PlanRecordWriter，课程介绍、步骤与任务一到达就追加写入
+    - round_number: 写入记录时的对话轮数
+    
+    返回:
+    - (计划, 耗时字典{plan, tasks})，计划生成失败时计划为None
+    """
+    # 任务调度器：限制并发，步骤编号越小越先执行
+    scheduler = TaskScheduler(task_concurrency, task_timeout)
+    # 流水线模式：每收到一个步骤就立即提交任务生成
+    on_step = None
+    if pipeline:
+        def on_step(step_number, step):
+            step_data = dict(step, id=session_id, retrive_enabled=True)
+            step_number = step_data.setdefault("step", step_number)
+            if task_store is not None and step_data in task_store:
+                return
+            scheduler.submit(step_number, functools.partial(process_task, server_url, step_data), priority=step_number)
+    
+    on_introduction = on_task = None
+    if writer is not None:
+        pipeline_on_step = on_step
+
+        def on_step(step_number, step):
+            writer.step(session_id, round_number, step_number, step)
+            if pipeline_on_step:
+                pipeline_on_step(step_number, step)
+
+        def on_introduction(introduction):
+            writer.introduction(session_id, round_number, introduction)
+
+        def on_task(step_number, task_data):
+            writer.task(session_id, round_number, step_number, task_data)
+    
+    timings = {"plan": None, "tasks": None}
+    start_time = time.perf_counter()
+    plan = await call_stream_generate(
+        server_url, 
+        messages, 
+        session_id, 
+        is_update, 
+        advise,
+        lang=lang,
+        on_step=on_step,
+        on_introduction=on_introduction
+    )
+    timings["plan"] = time.perf_counter() - start_time
+    
+    if not plan or 'plan' not in plan:
+        await scheduler.shutdown()
+        return None, timings
+    if writer is not None:
+        writer.plan(session_id, round_number, plan)
+    
+    print("\n开始并发生成任务...")
+    start_time = time.perf_counter()
+    await generate_tasks_for_plan(server_url, plan, session_id, scheduler, task_store, on_task)
+    timings["tasks"] = time.perf_counter() - start_time
+    return plan, timings
+
+def save_plan(plan, session_id):
+    """把计划与任务保存到 output_dir，返回文件名"""
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    filename = f"plan_and_tasks_{session_id}.json"
+    with open(os.path.join(output_dir, filename), 'w', encoding='utf-8') as f:
+        json.dump(plan, f, ensure_ascii=False, indent=4)
+    return filename
+
+async def interactive_test(server_url, pipeline=False, task_concurrency=5, task_timeout=None, reuse_tasks=True,
+                           history=None, writer=None):
     """
     交互式测试主函数
     
     参数:
     - server_url: 服务器URL
+    - pipeline: 是否在计划流式返回过程中，每收到一个步骤就立即生成其任务
+    - task_concurrency: 同时进行的任务生成请求数上限
+    - task_timeout: 单个任务生成请求的超时（秒），None表示不限制
+    - reuse_tasks: 计划更新时是否只为新增或内容变化的步骤重新生成任务
+    - history: 可选HistoryPolicy，决定每轮发送哪些历史消息，默认发送全部
+    - writer: 可选PlanRecordWriter，计划与任务一到达就追加写入NDJSON
     """
+    history = history or HistoryPolicy()
+    task_store = TaskStore() if reuse_tasks else None
     session_id = None
     messages = []
     round_count = 0
@@ -219,11 +484,11 @@ async def interactive_test(server_url):
     # 文档上传
     upload_doc_input = input("是否需要上传文档？ (y/n): ").lower()
     if upload_doc_input == 'y':
-        file_path = input("请输入文档路径: ")
-        if file_path:
-            upload_success = await upload_document(server_url, file_path, session_id)
-            if not upload_success:
-                print("文档上传失败，继续进行对话测试...")
+        file_paths = [p.strip() for p in input("请输入文档路径(多个用逗号分隔): ").split(",") if p.strip()]
+        if file_paths:
+            upload_results = await upload_documents(server_url, file_paths, session_id)
+            if not all(upload_results):
+                print("部分文档上传失败，继续进行对话测试...")
         else:
             print("未提供文件路径，跳过文档上传")
     
@@ -241,7 +506,12 @@ async def interactive_test(server_url):
         messages.append({"role": "user", "content": user_input})
         
         # 调用Chat API
-        session_id, chat_response = await call_chat_api(server_url, messages, session_id, lang=lang)
+        print("\n回复: ", end="", flush=True)
+        session_id, chat_response = await call_chat_api(
+            server_url, history.apply(messages), session_id, lang=lang,
+            on_text=lambda text: print(text, end="", flush=True)
+        )
+        print()
         if chat_response:
             print("\nChat API 响应:")
             print(chat_response)
@@ -293,67 +563,262 @@ async def interactive_test(server_url):
                         except ValueError:
                             print("步骤编号格式错误，将不指定要更新的步骤")
             
-            # 调用学习计划生成API
-            last_plan = await call_stream_generate(
-                server_url, 
-                messages, 
-                session_id, 
-                is_update, 
-                advise,
-                lang=lang
+            # 调用学习计划生成API，并为计划中的步骤生成任务
+            round_start = time.time()
+            last_plan, _ = await plan_and_tasks(
+                server_url, history.apply(messages), session_id, is_update, advise, lang,
+                pipeline, task_concurrency, task_timeout, task_store,
+                writer=writer, round_number=round_count
             )
             
-            if last_plan and 'plan' in last_plan:
-                # 准备并发请求的任务列表
-                task_requests = []
-                for i, step in enumerate(last_plan['plan']):
-                    step["id"] = session_id
-                    step["retrive_enabled"] = True
-                    task_requests.append((i, step))
-                
-                print("\n开始并发生成任务...")
-                
-                # 定义辅助函数来处理单个任务请求
-                async def process_task(index, step_data):
-                    task_data = await call_task_generate_api(server_url, step_data)
-                    print(f"step {step_data['step']}:")
-                    print(task_data)
-                    print("*"*100)
-                    return index, task_data
-                
-                # 并发执行所有任务请求
-                tasks = [process_task(idx, step) for idx, step in task_requests]
-                task_results = await asyncio.gather(*tasks)
-                
-                # 将结果映射回原始计划
-                for idx, task_data in task_results:
-                    if task_data:
-                        last_plan['plan'][idx]['task'] = task_data
+            if last_plan:
+                print(f"\n计划与任务总耗时: {time.time() - round_start:.2f}秒")
+                if task_store is not None:
+                    print(f"任务缓存: {task_store.stats()}")
 
                 print("\n学习计划生成成功!")
                 if output_json:
-                    if not os.path.exists(output_dir):
-                        os.makedirs(output_dir)
-                    filename = f"plan_and_tasks_{session_id}.json"
-                    with open(os.path.join(output_dir, filename), 'w', encoding='utf-8') as f:
-                        json.dump(last_plan, f, ensure_ascii=False, indent=4)
+                    filename = save_plan(last_plan, session_id)
                     print(f"\n计划和任务已保存到 {filename}")
             else:
                 print("\n学习计划生成失败!")
         else:
             print("Chat API调用失败，跳过本轮对话")
 
+def load_scenario(path):
+    """
+    读取对话场景文件
+    
+    格式（JSON）:
+    {
+        "lang": "zh",
+        "documents": ["notes.pdf"],
+        "rounds": [
+            {"message": "我想学习Python"},
+            {"message": "第二步太难了", "updateSteps": [2], "reason": "降低难度"}
+        ]
+    }
+    也可以直接是 rounds 列表。每轮可单独指定 lang；updateSteps/reason 只在chat接口
+    没有返回建议的更新步骤时使用，相当于交互模式下的手动输入
+    
+    返回:
+    - 规范化后的场景字典: lang/documents/rounds
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        scenario = json.load(f)
+    if isinstance(scenario, list):
+        scenario = {"rounds": scenario}
+    rounds = scenario.get("rounds") or []
+    if not rounds:
+        raise ValueError(f"{path}: 场景中没有对话轮次")
+    for i, round_data in enumerate(rounds, 1):
+        if not isinstance(round_data, dict) or not round_data.get("message"):
+            raise ValueError(f"{path}: 第 {i} 轮缺少 message")
+    return {
+        "lang": scenario.get("lang", "zh"),
+        "documents": scenario.get("documents", []),
+        "rounds": rounds,
+    }
+
+async def run_scenario_session(server_url, scenario, session_id, histograms, failures,
+                               pipeline=False, task_concurrency=5, task_timeout=None,
+                               reuse_tasks=True, output_json=False, history=None, writer=None):
+    """
+    无交互地执行一个会话的全部轮次：chat -> stream_generate -> task_generate
+    
+    参数:
+    - server_url: 服务器URL
+    - scenario: load_scenario 返回的场景
+    - session_id: 会话ID
+    - histograms: (轮次, 阶段) -> LatencyHistogram，轮次为 "all" 时表示所有轮次合计
+    - failures: (轮次, 阶段) -> 失败次数
+    - 其余参数同 interactive_test
+    """
+    history = history or HistoryPolicy()
+    task_store = TaskStore() if reuse_tasks else None
+    messages = []
+    
+    def record(round_number, phase, value):
+        for key in ((round_number, phase), ("all", phase)):
+            if key not in histograms:
+                histograms[key] = LatencyHistogram(f"r{key[0]}.{phase}" if key[0] != "all" else phase)
+            histograms[key].record(value)
+    
+    def fail(round_number, phase):
+        failures[(round_number, phase)] = failures.get((round_number, phase), 0) + 1
+    
+    if scenario["documents"]:
+        start_time = time.perf_counter()
+        upload_results = await upload_documents(server_url, scenario["documents"], session_id)
+        record(0, "upload", time.perf_counter() - start_time)
+        if not all(upload_results):
+            fail(0, "upload")
+    
+    for round_number, round_data in enumerate(scenario["rounds"], 1):
+        lang = round_data.get("lang", scenario["lang"])
+        messages.append({"role": "user", "content": round_data["message"]})
+        round_start = time.perf_counter()
+        
+        try:
+            chat_result = await stream_chat(server_url, history.apply(messages), session_id, lang)
+        except Exception as e:
+            # 与交互模式一致：chat失败时跳过本轮，用户消息保留在历史中
+            print(f"[{session_id}] 第 {round_number} 轮 chat 出错: {e}")
+            fail(round_number, "chat")
+            continue
+        record(round_number, "chat_ttft", chat_result.ttft)
+        record(round_number, "chat", chat_result.total)
+        chat_response = chat_result.to_dict()
+        messages.append({"role": "assistant", "content": chat_response.get("response", "")})
+        
+        is_update = round_number > 1
+        advise = None
+        if is_update:
+            update_steps = chat_response.get("updateSteps") or round_data.get("updateSteps")
+            if update_steps:
+                advise = {
+                    "updateSteps": update_steps,
+                    "reason": chat_response.get("reason") or round_data.get("reason") or "基于对话内容的自动更新"
+                }
+        
+        plan, timings = await plan_and_tasks(
+            server_url, history.apply(messages), session_id, is_update, advise, lang,
+            pipeline, task_concurrency, task_timeout, task_store,
+            writer=writer, round_number=round_number
+        )
+        record(round_number, "plan", timings["plan"])
+        if plan is None:
+            fail(round_number, "plan")
+            continue
+        record(round_number, "tasks", timings["tasks"])
+        record(round_number, "round", time.perf_counter() - round_start)
+        missing = sum(1 for step in plan["plan"] if not step.get("task"))
+        if missing:
+            failures[(round_number, "tasks")] = failures.get((round_number, "tasks"), 0) + missing
+        if output_json:
+            save_plan(plan, session_id)
+
+async def run_scenarios(server_url, scenario, sessions, concurrency, verbose=False, **session_kwargs):
+    """
+    并发执行多个场景会话，并按轮次与阶段输出耗时报告
+    
+    参数:
+    - server_url: 服务器URL
+    - scenario: load_scenario 返回的场景
+    - sessions: 会话总数
+    - concurrency: 最大并发会话数
+    - verbose: 是否保留各接口调用的逐条输出
+    - session_kwargs: 传给 run_scenario_session 的其余参数
+    
+    返回:
+    - (histograms, failures)
+    """
+    histograms = {}
+    failures = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    run_id = uuid.uuid4().hex[:8]
+    
+    async def one_session(index):
+        async with semaphore:
+            await run_scenario_session(server_url, scenario, f"scenario_{run_id}_{index}",
+                                       histograms, failures, **session_kwargs)
+    
+    print(f"场景测试: {sessions} 个会话, 并发 {concurrency}, 每个会话 {len(scenario['rounds'])} 轮")
+    start_time = time.perf_counter()
+    # 多个会话交错输出时逐条日志没有意义，默认只输出汇总报告
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+        await asyncio.gather(*(one_session(i) for i in range(sessions)))
+    duration = time.perf_counter() - start_time
+    
+    print(f"\n场景测试完成! 耗时: {duration:.2f}秒, 吞吐: {sessions / duration:.2f} 会话/秒")
+    if failures:
+        print("失败次数:")
+        for (round_number, phase), count in sorted(failures.items()):
+            print(f"  第 {round_number} 轮 {phase}: {count}")
+    phases = ["upload", "chat_ttft", "chat", "plan", "tasks", "round"]
+    # 先按轮次列出，最后是所有轮次的合计
+    ordered = sorted(histograms, key=lambda key: (key[0] == "all", 0 if key[0] == "all" else key[0], phases.index(key[1])))
+    print()
+    print(format_report([histograms[key] for key in ordered]))
+    return histograms, failures
+
 def main():
     """主函数"""
     import argparse
     
     parser = argparse.ArgumentParser(description="交互式API测试工具")
-    parser.add_argument("--server", default=DEFAULT_SERVER, help="服务器URL")
+    parser.add_argument("--server", default=DEFAULT_SERVER,
+                        help=f"服务器URL或已知部署名称（{', '.join(DEPLOYMENTS)}）")
+    parser.add_argument("--pipeline", action="store_true", help="计划流式返回时即开始逐步生成任务")
+    parser.add_argument("--task-concurrency", type=int, default=5, help="任务生成的最大并发数")
+    parser.add_argument("--task-timeout", type=float, default=None, help="单个任务生成请求的超时(秒)")
+    parser.add_argument("--no-task-cache", action="store_true", help="每轮都为所有步骤重新生成任务")
+    parser.add_argument("--scenario", help="场景模式：按场景文件无交互地执行多轮对话")
+    parser.add_argument("--sessions", type=int, default=1, help="场景模式下的会话总数")
+    parser.add_argument("--concurrency", type=int, default=10, help="场景模式下的最大并发会话数")
+    parser.add_argument("--output-json", action="store_true", help="场景模式下把每个会话的计划与任务保存到json文件")
+    parser.add_argument("--verbose", action="store_true", help="场景模式下保留逐条接口输出")
+    parser.add_argument("--ndjson", help="把课程介绍、步骤与任务一到达就追加写入该NDJSON文件（.gz/.zst 压缩），"
+                                         "之后可用 plan_writer.py compact 还原为json")
+    add_history_args(parser)
+    http_client.add_client_args(parser)
+    resilience.add_resilience_args(parser)
     
     args = parser.parse_args()
+    args.server = DEPLOYMENTS.get(args.server, args.server)
+    http_client.configure_from_args(args)
+    resilience.configure_from_args(args)
+    try:
+        history = parse_policy(args.history)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        scenario = load_scenario(args.scenario) if args.scenario else None
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    writer = PlanRecordWriter(args.ndjson) if args.ndjson else None
+    if scenario:
+        # 每个会话最多同时占用 1 个计划流和 task_concurrency 个任务请求
+        needed = args.concurrency * (args.task_concurrency + 1)
+        http_client.configure(
+            limit=max(args.limit, needed),
+            limit_per_host=max(args.limit_per_host, needed),
+        )
+    
+    async def run():
+        try:
+            if scenario:
+                await run_scenarios(
+                    args.server,
+                    scenario,
+                    args.sessions,
+                    args.concurrency,
+                    verbose=args.verbose,
+                    pipeline=args.pipeline,
+                    task_concurrency=args.task_concurrency,
+                    task_timeout=args.task_timeout,
+                    reuse_tasks=not args.no_task_cache,
+                    output_json=args.output_json,
+                    history=history,
+                    writer=writer,
+                )
+                return
+            await interactive_test(
+                args.server,
+                pipeline=args.pipeline,
+                task_concurrency=args.task_concurrency,
+                task_timeout=args.task_timeout,
+                reuse_tasks=not args.no_task_cache,
+                history=history,
+                writer=writer,
+            )
+        finally:
+            await http_client.close()
+            if writer is not None:
+                writer.close()
     
     try:
-        asyncio.run(interactive_test(args.server))
+        asyncio.run(run())
     except KeyboardInterrupt:
         print("\n程序被用户中断")
     except Exception as e:
@@ -5,28 +5,27 @@
 """
 
 import asyncio
-import aiohttp
 import json
 import sys
 import argparse
 import time
+
+import http_client
+import request_timing
+from latency_stats import LatencyHistogram, format_report
+from plan_writer import PlanRecordWriter
+from sse_parser import SSEParser, iter_sse
+
 DEFAULT_SERVER = "http://172.30.106.167:5001"
 
-async def test_stream_generate_plan(server_url, mode="create", chat_id=None):
+def build_request_data(mode, chat_id):
     """
-    测试流式生成/更新学习计划API
+    构建流式生成/更新学习计划的请求数据
     
     参数:
-    - server_url: 服务器URL
-    - mode: 操作模式，'create'表示创建新计划，'update'表示更新现有计划
-    - chat_id: 会话ID，如果为None则使用当前时间戳
+    - mode: 'create' 或 'update'
+    - chat_id: 会话ID
     """
-    if chat_id is None:
-        chat_id = f"test_{int(time.time())}"
-    
-    print(f"测试模式: {mode}, 会话ID: {chat_id}")
-    
-    # 构建请求数据
     data = {
         "id": chat_id,
         "messages": [
@@ -41,82 +40,205 @@ async def test_stream_generate_plan(server_url, mode="create", chat_id=None):
             "should_update": [1, 2],  
             "reason": "用户希望更加关注Pandas库的学习"
         })
+    return data
+
+async def test_stream_generate_plan(server_url, mode="create", chat_id=None, writer=None):
+    """
+    测试流式生成/更新学习计划API
+    
+    参数:
+    - server_url: 服务器URL
+    - mode: 操作模式，'create'表示创建新计划，'update'表示更新现有计划
+    - chat_id: 会话ID，如果为None则使用当前时间戳
+    - writer: 可选PlanRecordWriter，指定时课程介绍与步骤一到达就追加写入，不再在结束时整体保存json
+    """
+    if chat_id is None:
+        chat_id = f"test_{int(time.time())}"
+    
+    print(f"测试模式: {mode}, 会话ID: {chat_id}")
+    
+    data = build_request_data(mode, chat_id)
     url = f"{server_url}/api/learning/plan/stream_generate"
     print(f"发送请求到: {url}")
     print(f"请求数据: {json.dumps(data, ensure_ascii=False)}")
     
     try:
-        async with aiohttp.ClientSession() as session:
-            start_time = time.time()
-            async with session.post(url, json=data) as response:
-                if response.status != 200:
-                    print(f"请求失败，状态码：{response.status}")
-                    error_text = await response.text()
-                    print(f"错误信息: {error_text}")
-                    return
+        session = await http_client.get_session()
+        start_time = time.time()
+        async with session.post(url, json=data) as response:
+            if response.status != 200:
+                print(f"请求失败，状态码：{response.status}")
+                error_text = await response.text()
+                print(f"错误信息: {error_text}")
+                return
                 
-                print("开始接收流式响应...")
-                step_count = 0
+            print("开始接收流式响应...")
+            step_count = 0
                 
-                async for line in response.content:
-                    if line.startswith(b'data: '):
-                        json_str = line.decode('utf-8').replace('data: ', '')
-                        try:
-                            data_obj = json.loads(json_str)
+            async for event in iter_sse(response.content):
+                try:
+                    with request_timing.decoding():
+                        data_obj = json.loads(event.data)
+                        
+                    if "error" in data_obj:
+                        print(f"\n错误: {data_obj['error']}")
+                    elif "warning" in data_obj:
+                        print(f"\n警告: {data_obj['warning']}")
+                    elif "message" in data_obj:
+                        print(f"\n消息: {data_obj['message']}")
+                    elif "introduction" in data_obj:
+                        if writer is not None:
+                            writer.introduction(chat_id, mode, data_obj["introduction"])
+                    elif "step" in data_obj:
+                        step_count += 1
+                        step = data_obj["step"]
+                        step_number = data_obj.get("step_number", step_count)
+                        total = data_obj.get("total", "未知")
                             
-                            if "error" in data_obj:
-                                print(f"\n错误: {data_obj['error']}")
-                            elif "warning" in data_obj:
-                                print(f"\n警告: {data_obj['warning']}")
-                            elif "message" in data_obj:
-                                print(f"\n消息: {data_obj['message']}")
-                            elif "step" in data_obj:
-                                step_count += 1
-                                step = data_obj["step"]
-                                step_number = data_obj.get("step_number", step_count)
-                                total = data_obj.get("total", "未知")
+                        print(f"\n步骤 {step_number}/{total}:")
+                        print(f"标题: {step.get('title', '无标题')}")
+                        print(f"描述: {step.get('description', '无描述')[:100]}...")
+                        if "videos" in step:
+                            print(f"视频数量: {len(step.get('videos', []))}")
+                        if writer is not None:
+                            writer.step(chat_id, mode, step_number, step)
+                    elif "done" in data_obj and data_obj["done"]:
+                        end_time = time.time()
+                        duration = end_time - start_time
+                        print(f"\n计划生成完成! 耗时: {duration:.2f}秒")
+                        if "plan" in data_obj:
+                            plan = data_obj["plan"]
+                            print(f"计划包含 {len(plan.get('plan', []))} 个步骤")
+                            if writer is not None:
+                                writer.plan(chat_id, mode, plan)
+                                print(f"计划已追加到: {writer.path}")
+                                continue
                                 
-                                print(f"\n步骤 {step_number}/{total}:")
-                                print(f"标题: {step.get('title', '无标题')}")
-                                print(f"描述: {step.get('description', '无描述')[:100]}...")
-                                if "videos" in step:
-                                    print(f"视频数量: {len(step.get('videos', []))}")
-                            elif "done" in data_obj and data_obj["done"]:
-                                end_time = time.time()
-                                duration = end_time - start_time
-                                print(f"\n计划生成完成! 耗时: {duration:.2f}秒")
-                                if "plan" in data_obj:
-                                    plan = data_obj["plan"]
-                                    print(f"计划包含 {len(plan.get('plan', []))} 个步骤")
-                                    
-                                    filename = f"plan_{chat_id}_{int(time.time())}.json"
-                                    with open(filename, "w", encoding="utf-8") as f:
-                                        json.dump(plan, f, ensure_ascii=False, indent=2)
-                                    print(f"完整计划已保存到文件: {filename}")
-                        except json.JSONDecodeError as e:
-                            print(f"解析JSON失败: {e}")
-                            print(f"原始数据: {json_str}")
+                            filename = f"plan_{chat_id}_{int(time.time())}.json"
+                            with open(filename, "w", encoding="utf-8") as f:
+                                json.dump(plan, f, ensure_ascii=False, indent=2)
+                            print(f"完整计划已保存到文件: {filename}")
+                except json.JSONDecodeError as e:
+                    print(f"解析JSON失败: {e}")
+                    print(f"原始数据: {event.data}")
     
     except Exception as e:
         print(f"测试过程中出错: {e}")
     
     return chat_id
 
-async def test_create_then_update(server_url):
+async def test_create_then_update(server_url, writer=None, delay=0.0):
     """
-    先创建计划，等待10秒后再更新计划
+    先创建计划，创建的流结束（收到done帧）后再更新计划
     
     参数:
     - server_url: 服务器URL
+    - writer: 可选PlanRecordWriter
+    - delay: 创建完成后额外等待的秒数；done帧到达时计划已生成完毕，默认不等待
     """
     chat_id = f"test_{int(time.time())}"
     print(f"生成的会话ID: {chat_id}")
     print("\n===== 第1步：创建初始学习计划 =====")
-    await test_stream_generate_plan(server_url, "create", chat_id)
-    print("\n===== 等待10秒 =====")
-    await asyncio.sleep(10)
+    await test_stream_generate_plan(server_url, "create", chat_id, writer)
+    if delay > 0:
+        print(f"\n===== 等待{delay:g}秒 =====")
+        await asyncio.sleep(delay)
     print("\n===== 第2步：更新学习计划 =====")
-    await test_stream_generate_plan(server_url, "update", chat_id)
+    await test_stream_generate_plan(server_url, "update", chat_id, writer)
+
+async def timed_stream_generate(session, server_url, mode, chat_id):
+    """
+    静默执行一次流式生成/更新，只记录各阶段耗时
+    
+    参数:
+    - session: 复用的aiohttp.ClientSession
+    - server_url: 服务器URL
+    - mode: 'create' 或 'update'
+    - chat_id: 会话ID
+    
+    返回:
+    - 耗时字典: ttfb/introduction/first_step/step_gaps/total/ok
+    """
+    url = f"{server_url}/api/learning/plan/stream_generate"
+    data = build_request_data(mode, chat_id)
+    timings = {"ttfb": None, "introduction": None, "first_step": None,
+               "step_gaps": [], "total": None, "ok": False}
+    start_time = time.perf_counter()
+    last_step_time = None
+    try:
+        async with session.post(url, json=data) as response:
+            if response.status != 200:
+                await response.read()
+                return timings
+            parser = SSEParser()
+            async for event in iter_sse(response.content, parser):
+                if timings["ttfb"] is None:
+                    timings["ttfb"] = parser.first_chunk_at - start_time
+                try:
+                    with request_timing.decoding():
+                        data_obj = json.loads(event.data)
+                except json.JSONDecodeError:
+                    continue
+                now = event.timestamp
+                if "introduction" in data_obj and timings["introduction"] is None:
+                    timings["introduction"] = now - start_time
+                elif "step" in data_obj:
+                    if timings["first_step"] is None:
+                        timings["first_step"] = now - start_time
+                    else:
+                        timings["step_gaps"].append(now - last_step_time)
+                    last_step_time = now
+                elif data_obj.get("done"):
+                    timings["total"] = now - start_time
+                    timings["ok"] = "plan" in data_obj
+                    break
+    except Exception as e:
+        print(f"[{chat_id}] {mode} 出错: {e}")
+    return timings
+
+async def run_load_test(server_url, sessions, concurrency, scenario="create"):
+    """
+    并发负载测试：同时驱动多个流式计划生成会话
+    
+    参数:
+    - server_url: 服务器URL
+    - sessions: 总会话数
+    - concurrency: 最大并发会话数
+    - scenario: 'create'/'update' 单一模式，'both' 先创建再更新
+    """
+    modes = ["create", "update"] if scenario == "both" else [scenario]
+    histograms = {}
+    for mode in modes:
+        for metric in ("ttfb", "introduction", "first_step", "step_gap", "total"):
+            histograms[(mode, metric)] = LatencyHistogram(f"{mode}.{metric}")
+    failures = {mode: 0 for mode in modes}
+    semaphore = asyncio.Semaphore(concurrency)
+    run_id = int(time.time())
+    
+    async def one_session(session, index):
+        chat_id = f"load_{run_id}_{index}"
+        async with semaphore:
+            for mode in modes:
+                timings = await timed_stream_generate(session, server_url, mode, chat_id)
+                if not timings["ok"]:
+                    failures[mode] += 1
+                for metric in ("ttfb", "introduction", "first_step", "total"):
+                    histograms[(mode, metric)].record(timings[metric])
+                for gap in timings["step_gaps"]:
+                    histograms[(mode, "step_gap")].record(gap)
+    
+    print(f"负载测试: {sessions} 个会话, 并发 {concurrency}, 场景 {scenario}")
+    session = await http_client.get_session()
+    start_time = time.perf_counter()
+    await asyncio.gather(*(one_session(session, i) for i in range(sessions)))
+    duration = time.perf_counter() - start_time
+    
+    print(f"\n负载测试完成! 耗时: {duration:.2f}秒, 吞吐: {sessions / duration:.2f} 会话/秒")
+    for mode in modes:
+        print(f"{mode} 失败: {failures[mode]}/{sessions}")
+    print()
+    print(format_report(list(histograms.values()), show_buckets=True))
+    return histograms
 
 def main():
     """主函数"""
@@ -124,13 +246,37 @@ def main():
     parser.add_argument("--server", default=DEFAULT_SERVER, help="服务器URL")
     parser.add_argument("--mode", choices=["create", "update", "both"], default="both", help="操作模式")
     parser.add_argument("--id", help="会话ID")
+    parser.add_argument("--load", type=int, default=0, help="负载模式：并发运行的会话总数")
+    parser.add_argument("--concurrency", type=int, default=50, help="负载模式下的最大并发数")
+    parser.add_argument("--update-delay", type=float, default=0.0, help="both 模式下创建完成后等待多少秒再更新")
+    parser.add_argument("--ndjson", help="把课程介绍与步骤一到达就追加写入该NDJSON文件（.gz/.zst 压缩），代替结束时保存json")
+    http_client.add_client_args(parser)
     
     args = parser.parse_args()
+    http_client.configure_from_args(args)
+    if args.load > 0:
+        # 负载模式下连接池至少要容纳全部并发会话
+        http_client.configure(
+            limit=max(args.limit, args.concurrency),
+            limit_per_host=max(args.limit_per_host, args.concurrency),
+        )
+    
+    writer = PlanRecordWriter(args.ndjson) if args.ndjson else None
+    
+    async def run():
+        try:
+            if args.load > 0:
+                await run_load_test(args.server, args.load, args.concurrency, args.mode)
+            elif args.mode == "both":
+                await test_create_then_update(args.server, writer, args.update_delay)
+            else:
+                await test_stream_generate_plan(args.server, args.mode, args.id, writer)
+        finally:
+            await http_client.close()
+            if writer is not None:
+                writer.close()
     
-    if args.mode == "both":
-        asyncio.run(test_create_then_update(args.server))
-    else:
-        asyncio.run(test_stream_generate_plan(args.server, args.mode, args.id))
+    asyncio.run(run())
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
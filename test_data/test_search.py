@@ -1,9 +1,184 @@
+import argparse
 import json
 import asyncio
-import httpx
+import time
+
+import http_client
+import models
+import request_timing
+import resilience
+from latency_stats import LatencyHistogram, format_report
+from rate_limit import TokenBucket
+from search_cache import add_cache_args, cache_from_args
 
 BASE_URL = "https://study-platform.zeabur.app"  # 根据实际情况调整服务器地址和端口
 
+# 语料文件中逗号分隔时可识别的语言代码
+CORPUS_LANGS = {"zh", "en", "ja", "ko", "fr", "de", "es"}
+
+# 端点名称 -> (路径, 响应模型, 结果数量)
+SEARCH_ENDPOINTS = {
+    "web": ("/api/web/search", models.WebSearchResponse, lambda r: len(r.web_res.results)),
+    "video": ("/api/video/search", models.VideoSearchResponse, lambda r: len(r.video_res or [])),
+    "image": ("/api/image/search", models.ImageSearchResponse, lambda r: len(r.image_res or [])),
+}
+
+
+async def search_once(endpoint, keyword, lang, server_url=BASE_URL, timeout=None, cache=None):
+    """
+    调用一次搜索接口
+
+    参数:
+    - endpoint: 'web' / 'video' / 'image'
+    - keyword: 搜索关键词
+    - lang: 语言
+    - server_url: 服务器URL
+    - timeout: 本次请求的超时（秒），None表示使用共享客户端配置的超时
+    - cache: 可选SearchCache，命中时不发请求
+
+    返回:
+    - 解码后的响应模型；HTTP错误或结构不符时抛出异常
+    """
+    path, model, _ = SEARCH_ENDPOINTS[endpoint]
+    if cache is not None:
+        cached = cache.get(endpoint, keyword, lang)
+        if cached is not None:
+            return models.decode(cached, model)
+    client = await http_client.get_httpx_client()
+
+    # httpx中 timeout=None 表示不限时，未指定时不传，沿用 --connect-timeout 等配置的客户端超时
+    options = {"timeout": timeout} if timeout is not None else {}
+
+    async def attempt():
+        response = await client.post(
+            f"{server_url}{path}",
+            json={"search_keyword": keyword, "lang": lang},
+            **options
+        )
+        response.raise_for_status()
+        with request_timing.decoding():
+            return models.decode(response.content, model), response.content
+
+    # 启用 --hedge / --breaker 时按接口对冲与熔断，否则直接请求
+    result, body = await resilience.call(f"{endpoint}_search", attempt)
+    if cache is not None:
+        cache.put(endpoint, keyword, lang, body)
+    return result
+
+
+def load_corpus(path):
+    """
+    读取批量搜索语料
+
+    支持两种格式:
+    - 每行 "关键词<TAB>语言"（或逗号分隔），# 开头为注释，缺省语言为zh；
+      逗号分隔时只有最后一段是 CORPUS_LANGS 中的语言代码才视为语言，关键词含逗号时建议用TAB分隔
+    - 每行一个JSON对象 {"search_keyword": ..., "lang": ...}
+
+    返回:
+    - [(keyword, lang), ...]
+    """
+    corpus = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                corpus.append((item["search_keyword"], item.get("lang", "zh")))
+                continue
+            if "\t" in line:
+                keyword, _, lang = line.rpartition("\t")
+            else:
+                keyword, _, lang = line.rpartition(",")
+                if lang.strip() not in CORPUS_LANGS:
+                    # 最后一个逗号后不是语言代码时是关键词本身带逗号，如 "深度学习,入门"
+                    keyword, lang = line, ""
+            corpus.append((keyword.strip(), lang.strip() or "zh"))
+    return corpus
+
+
+async def run_batch(server_url, corpus, endpoints, concurrency=8, rate=None, burst=None, cache=None):
+    """
+    批量搜索：语料中每个关键词分别调用各个端点
+
+    参数:
+    - server_url: 服务器URL
+    - corpus: load_corpus 返回的 [(keyword, lang), ...]
+    - endpoints: 端点名称列表
+    - concurrency: 最大并发请求数
+    - rate: 全局请求速率上限（次/秒），None表示不限速
+    - burst: 令牌桶容量
+    - cache: 可选SearchCache；命中的请求不占用限速令牌，耗时单独记入 cache 直方图，
+      不计入接口延迟与吞吐
+
+    返回:
+    - {端点: 统计字典}
+    """
+    bucket = TokenBucket(rate, burst) if rate else None
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {
+        ep: {"latency": LatencyHistogram(f"{ep}.latency"), "cache": LatencyHistogram(f"{ep}.cache"),
+             "ok": 0, "cache_hits": 0, "failed": 0, "empty": 0, "results": 0}
+        for ep in endpoints
+    }
+
+    async def one(endpoint, keyword, lang):
+        async with semaphore:
+            cached = cache is not None and (endpoint, keyword, lang) in cache
+            if bucket and not cached:
+                await bucket.acquire()
+            s = stats[endpoint]
+            start_time = time.perf_counter()
+            try:
+                result = await search_once(endpoint, keyword, lang, server_url, cache=cache)
+            except Exception as e:
+                s["failed"] += 1
+                print(f"[{endpoint}] {keyword} 失败: {e!r}")
+                return
+            if cached:
+                s["cache"].record(time.perf_counter() - start_time)
+                s["cache_hits"] += 1
+            else:
+                s["latency"].record(time.perf_counter() - start_time)
+                s["ok"] += 1
+            count = SEARCH_ENDPOINTS[endpoint][2](result)
+            s["results"] += count
+            if count == 0:
+                s["empty"] += 1
+
+    jobs = [(ep, kw, lang) for kw, lang in corpus for ep in endpoints]
+    print(f"批量搜索: {len(corpus)} 个关键词 x {len(endpoints)} 个端点 = {len(jobs)} 次请求, "
+          f"并发 {concurrency}, 限速 {rate or '不限'} 次/秒")
+    start_time = time.perf_counter()
+    await asyncio.gather(*(one(*job) for job in jobs))
+    duration = time.perf_counter() - start_time
+
+    requests = sum(s["ok"] + s["failed"] for s in stats.values())
+    print(f"\n完成! 耗时: {duration:.2f}秒, 总吞吐: {requests / duration:.2f} 次/秒（不含缓存命中）\n")
+    print(f"{'端点':<8}{'请求':>6}{'成功':>6}{'失败率':>8}{'缓存命中':>10}{'空结果率':>10}{'平均结果数':>12}"
+          f"{'吞吐(次/秒)':>14}")
+    for ep in endpoints:
+        s = stats[ep]
+        # 请求、失败率与吞吐只算实际发出的请求；空结果与结果数按所有返回的结果（含缓存）统计
+        total = s["ok"] + s["failed"]
+        returned = s["ok"] + s["cache_hits"]
+        print(f"{ep:<8}{total:>6}{s['ok']:>6}{s['failed'] / max(total, 1):>8.1%}{s['cache_hits']:>10}"
+              f"{s['empty'] / max(returned, 1):>10.1%}{s['results'] / max(returned, 1):>12.1f}"
+              f"{total / duration:>14.2f}")
+    print()
+    histograms = [stats[ep]["latency"] for ep in endpoints]
+    histograms += [stats[ep]["cache"] for ep in endpoints if stats[ep]["cache_hits"]]
+    print(format_report(histograms))
+    if resilience.current() is not None:
+        print()
+        print(resilience.current().format_stats())
+    if cache is not None:
+        print()
+        print(cache.format_stats())
+    return stats
+
 async def test_web_search():
     """测试 web 搜索 API"""
     print("\n=== 测试 Web 搜索 API ===")
@@ -20,44 +195,44 @@ async def test_web_search():
         "lang": "en"
     }
     
-    async with httpx.AsyncClient() as client:
-        # 测试中文搜索
-        print("测试中文搜索...")
-        zh_response = await client.post(
-            f"{BASE_URL}/api/web/search",
-            json=zh_payload,
-            timeout=30.0
-        )
+    client = await http_client.get_httpx_client()
+    # 测试中文搜索
+    print("测试中文搜索...")
+    zh_response = await client.post(
+        f"{BASE_URL}/api/web/search",
+        json=zh_payload
+    )
         
-        if zh_response.status_code == 200:
-            zh_result = zh_response.json()
-            print(zh_result)
-            print(f"中文搜索成功! 获取到 {len(zh_result['web_res']['results'])} 个结果")
-            # 打印部分结果示例
-            if zh_result['web_res']['results']:
-                print(f"第一个结果标题: {zh_result['web_res']['results'][0].get('title', 'No title')}")
-        else:
-            print(f"中文搜索失败! 状态码: {zh_response.status_code}")
-            print(f"错误信息: {zh_response.text}")
+    if zh_response.status_code == 200:
+        print(zh_response.text)
+        with request_timing.decoding():
+            zh_result = models.decode(zh_response.content, models.WebSearchResponse)
+        print(f"中文搜索成功! 获取到 {len(zh_result.web_res.results)} 个结果")
+        # 打印部分结果示例
+        if zh_result.web_res.results:
+            print(f"第一个结果标题: {zh_result.web_res.results[0].title}")
+    else:
+        print(f"中文搜索失败! 状态码: {zh_response.status_code}")
+        print(f"错误信息: {zh_response.text}")
         
-        # 测试英文搜索
-        print("\n测试英文搜索...")
-        en_response = await client.post(
-            f"{BASE_URL}/api/web/search",
-            json=en_payload,
-            timeout=30.0
-        )
+    # 测试英文搜索
+    print("\n测试英文搜索...")
+    en_response = await client.post(
+        f"{BASE_URL}/api/web/search",
+        json=en_payload
+    )
         
-        if en_response.status_code == 200:
-            en_result = en_response.json()
-            print(en_result)
-            print(f"英文搜索成功! 获取到 {len(en_result['web_res']['results'])} 个结果")
-            # 打印部分结果示例
-            if en_result['web_res']['results']:
-                print(f"第一个结果标题: {en_result['web_res']['results'][0].get('title', 'No title')}")
-        else:
-            print(f"英文搜索失败! 状态码: {en_response.status_code}")
-            print(f"错误信息: {en_response.text}")
+    if en_response.status_code == 200:
+        print(en_response.text)
+        with request_timing.decoding():
+            en_result = models.decode(en_response.content, models.WebSearchResponse)
+        print(f"英文搜索成功! 获取到 {len(en_result.web_res.results)} 个结果")
+        # 打印部分结果示例
+        if en_result.web_res.results:
+            print(f"第一个结果标题: {en_result.web_res.results[0].title}")
+    else:
+        print(f"英文搜索失败! 状态码: {en_response.status_code}")
+        print(f"错误信息: {en_response.text}")
 
 
 async def test_video_search():
@@ -76,55 +251,96 @@ async def test_video_search():
         "lang": "en"
     }
     
-    async with httpx.AsyncClient() as client:
-        # 测试中文搜索
-        print("测试中文视频搜索...")
-        zh_response = await client.post(
-            f"{BASE_URL}/api/video/search",
-            json=zh_payload,
-            timeout=30.0
-        )
+    client = await http_client.get_httpx_client()
+    # 测试中文搜索
+    print("测试中文视频搜索...")
+    zh_response = await client.post(
+        f"{BASE_URL}/api/video/search",
+        json=zh_payload
+    )
         
-        if zh_response.status_code == 200:
-            zh_result = zh_response.json()
-            print(zh_result)
-            video_count = len(zh_result['video_res']) if isinstance(zh_result['video_res'], list) else 0
-            print(f"中文视频搜索成功! 获取到 {video_count} 个结果")
-            # 打印部分结果示例
-            if video_count > 0:
-                print(f"第一个视频标题: {zh_result['video_res'][0].get('title', 'No title')}")
-        else:
-            print(f"中文视频搜索失败! 状态码: {zh_response.status_code}")
-            print(f"错误信息: {zh_response.text}")
+    if zh_response.status_code == 200:
+        print(zh_response.text)
+        with request_timing.decoding():
+            zh_result = models.decode(zh_response.content, models.VideoSearchResponse)
+        video_count = len(zh_result.video_res or [])
+        print(f"中文视频搜索成功! 获取到 {video_count} 个结果")
+        # 打印部分结果示例
+        if video_count > 0:
+            print(f"第一个视频标题: {zh_result.video_res[0].title}")
+    else:
+        print(f"中文视频搜索失败! 状态码: {zh_response.status_code}")
+        print(f"错误信息: {zh_response.text}")
         
-        # 测试英文搜索
-        print("\n测试英文视频搜索...")
-        en_response = await client.post(
-            f"{BASE_URL}/api/video/search",
-            json=en_payload,
-            timeout=30.0
-        )
+    # 测试英文搜索
+    print("\n测试英文视频搜索...")
+    en_response = await client.post(
+        f"{BASE_URL}/api/video/search",
+        json=en_payload
+    )
         
-        if en_response.status_code == 200:
-            en_result = en_response.json()
-            print(en_result)
-            video_count = len(en_result['video_res']) if isinstance(en_result['video_res'], list) else 0
-            print(f"英文视频搜索成功! 获取到 {video_count} 个结果")
-            # 打印部分结果示例
-            if video_count > 0:
-                print(f"第一个视频标题: {en_result['video_res'][0].get('title', 'No title')}")
-        else:
-            print(f"英文视频搜索失败! 状态码: {en_response.status_code}")
-            print(f"错误信息: {en_response.text}")
+    if en_response.status_code == 200:
+        print(en_response.text)
+        with request_timing.decoding():
+            en_result = models.decode(en_response.content, models.VideoSearchResponse)
+        video_count = len(en_result.video_res or [])
+        print(f"英文视频搜索成功! 获取到 {video_count} 个结果")
+        # 打印部分结果示例
+        if video_count > 0:
+            print(f"第一个视频标题: {en_result.video_res[0].title}")
+    else:
+        print(f"英文视频搜索失败! 状态码: {en_response.status_code}")
+        print(f"错误信息: {en_response.text}")
 
 
 async def run_tests():
     """运行所有测试"""
-    await test_web_search()
-    await test_video_search()
+    try:
+        await test_web_search()
+        await test_video_search()
+    finally:
+        await http_client.close()
+
+
+def main():
+    """主函数"""
+    global BASE_URL
+    parser = argparse.ArgumentParser(description="测试搜索 API")
+    parser.add_argument("--server", default=BASE_URL, help="服务器URL")
+    parser.add_argument("--corpus", help="批量模式：关键词语料文件，例如 search_corpus.tsv")
+    parser.add_argument("--endpoints", default="web,video,image", help="批量模式下调用的端点，逗号分隔")
+    parser.add_argument("--concurrency", type=int, default=8, help="批量模式下的最大并发数")
+    parser.add_argument("--rate", type=float, help="批量模式下的请求速率上限(次/秒)")
+    parser.add_argument("--burst", type=float, help="令牌桶容量")
+    http_client.add_client_args(parser)
+    add_cache_args(parser)
+    resilience.add_resilience_args(parser)
+
+    args = parser.parse_args()
+    http_client.configure_from_args(args)
+    resilience.configure_from_args(args)
+    BASE_URL = args.server
+
+    if not args.corpus:
+        print("开始测试搜索 API...")
+        asyncio.run(run_tests())
+        print("\n所有测试完成!")
+        return
+
+    endpoints = [ep.strip() for ep in args.endpoints.split(",") if ep.strip()]
+    unknown = set(endpoints) - set(SEARCH_ENDPOINTS)
+    if unknown:
+        parser.error(f"未知端点: {', '.join(sorted(unknown))}")
+
+    async def run():
+        try:
+            await run_batch(args.server, load_corpus(args.corpus), endpoints,
+                            args.concurrency, args.rate, args.burst, cache_from_args(args, args.server))
+        finally:
+            await http_client.close()
+
+    asyncio.run(run())
 
 
 if __name__ == "__main__":
-    print("开始测试搜索 API...")
-    asyncio.run(run_tests())
-    print("\n所有测试完成!") 
\ No newline at end of file
+    main() 
\ No newline at end of file
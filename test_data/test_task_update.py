@@ -1,53 +1,248 @@
-import requests
+import argparse
+import asyncio
+import glob
+import itertools
 import json
+import os
+import time
+
+import http_client
+import models
+import request_timing
+import task_payload
+from latency_stats import LatencyHistogram, format_report
 
 # API a-pi
 # BASE_URL = "http://127.0.0.1:5001"
 BASE_URL="https://study-platform.zeabur.app"
-DETECT_URL = f"{BASE_URL}/api/task/update/detect"
-EXECUTE_URL = f"{BASE_URL}/api/task/update/execute"
+DETECT_PATH = "/api/task/update/detect"
+EXECUTE_PATH = "/api/task/update/execute"
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 批量模式下未指定 --messages 时使用的用户反馈
+DEFAULT_MESSAGES = [
+    "This is too basic for me. Can we go deeper into the implementation details?",
+    "这个练习太难了，能不能给一些提示？",
+    "看起来不错，不需要修改。",
+    "Please replace the quiz with a coding exercise.",
+]
 
 task_data = {'type': 'coding', 'difficulty': 'intermediate', 'ppt_slide': '# 使用工具进行简单大模型的训练操作\n## 工具选择\n选择合适的工具对于大模型训练至关重要，常见的有TensorFlow、PyTorch等。这些工具提供了丰富的API和优化器，能帮助我们更高效地完成训练。例如，PyTorch的动态图特性使得模型的构建和调试更加灵活。\n## 数据加载\n在工具中加载已处理好的数据，要注意数据的格式和批次大小。以PyTorch为例，可使用DataLoader类来批量加载数据，这样能提高训练效率。例如：\n```python\nfrom torch.utils.data import DataLoader\nloader = DataLoader(dataset, batch_size=32, shuffle=True)\n```\n## 模型构建\n依据所选工具，按照大模型架构搭建模型。在PyTorch里，可通过继承`nn.Module`类来定义模型结构。\n## 训练过程\n使用优化器和损失函数对模型进行训练，不断迭代更新模型参数，直到达到理想的效果。', 'questions': [{'question': '以下哪个是常见的大模型训练工具？', 'type': 'choice', 'options': ['Scikit - learn', 'PyTorch', 'Numpy'], 'answer': 'PyTorch'}, {'question': '在PyTorch中，用于批量加载数据的类是？', 'type': 'choice', 'options': ['DataLoader', 'DataSet', 'ModelLoader'], 'answer': 'DataLoader'}, {'question': '在PyTorch里，定义模型结构通常继承自哪个类？', 'type': 'choice', 'options': ['nn.Module', 'nn.Linear', 'nn.Conv2d'], 'answer': 'nn.Module'}], 'task': {'title': '使用PyTorch进行简单大模型训练', 'description': '使用PyTorch构建一个简单的全连接神经网络模型，并对给定的数据集进行训练。要求定义模型结构，加载数据，选择合适的优化器和损失函数，进行5个epoch的训练，并打印每个epoch的损失值。', 'starter_code': '```python\nimport torch\nimport torch.nn as nn\nfrom torch.utils.data import DataLoader\n\n# 假设已有数据集dataset\n# dataset = ...\n\n# 定义模型\nclass SimpleModel(nn.Module):\n    def __init__(self):\n        super(SimpleModel, self).__init__()\n        # 这里可以开始定义模型的层\n\n    def forward(self, x):\n        # 这里定义前向传播过程\n        return x\n\n# 创建模型实例\nmodel = SimpleModel()\n\n# 定义优化器和损失函数\noptimizer = ...\nloss_function = ...\n\n# 数据加载\nloader = DataLoader(dataset, batch_size=32, shuffle=True)\n\n# 训练循环\nfor epoch in range(5):\n    for data in loader:\n        # 这里完成训练步骤\n        pass\n```', 'answer': "```python\nimport torch\nimport torch.nn as nn\nfrom torch.utils.data import DataLoader\n\n# 假设已有数据集dataset\n# dataset = ...\n\n# 定义模型\nclass SimpleModel(nn.Module):\n    def __init__(self):\n        super(SimpleModel, self).__init__()\n        self.fc1 = nn.Linear(10, 20)\n        self.fc2 = nn.Linear(20, 1)\n\n    def forward(self, x):\n        x = torch.relu(self.fc1(x))\n        x = self.fc2(x)\n        return x\n\n# 创建模型实例\nmodel = SimpleModel()\n\n# 定义优化器和损失函数\noptimizer = torch.optim.Adam(model.parameters(), lr=0.001)\nloss_function = nn.MSELoss()\n\n# 数据加载\nloader = DataLoader(dataset, batch_size=32, shuffle=True)\n\n# 训练循环\nfor epoch in range(5):\n    running_loss = 0.0\n    for data in loader:\n        inputs, labels = data\n        optimizer.zero_grad()\n        outputs = model(inputs)\n        loss = loss_function(outputs, labels)\n        loss.backward()\n        optimizer.step()\n        running_loss += loss.item()\n    print(f'Epoch {epoch + 1}, Loss: {running_loss / len(loader)}')\n```"}, 'videos': [{'title': '原来大模型还可以这么训练？干得漂亮！', 'url': 'http://www.bilibili.com/video/av1356182736', 'cover': '//i0.hdslb.com/bfs/archive/a0d8f0c2a9aadcc56101c9afe8c4ebb5dfbfd782.jpg', 'duration': '7:25'}, {'title': '【喂饭教程】30分钟学会Qwen2.5-7B微调行业大模型，环境配置+模型微调+模型部署+效果展示详细教程！草履虫都能学会~~~', 'url': 'http://www.bilibili.com/video/av114096393423986', 'cover': '//i0.hdslb.com/bfs/archive/aa0cab99f2ce6dcd58f4c816aa1fb7a34cd5639b.jpg', 'duration': '27:41'}, {'title': 'Deepseek大模型全参数微调训练实践 | 大模型课程分享', 'url': 'http://www.bilibili.com/video/av114200093399212', 'cover': '//i2.hdslb.com/bfs/archive/b70f7e9b21ab37b44870900685e5692bce49f8c1.jpg', 'duration': '28:51'}, {'title': '【AI大模型】十分钟彻底搞懂AI大模型底层原理！带你从0构建对大模型的认知！小白也能看懂！', 'url': 'http://www.bilibili.com/video/av113677265081065', 'cover': '//i2.hdslb.com/bfs/archive/19abee31e45cbf994f8f9ad05dd39b376403cfed.jpg', 'duration': '43:59'}], 'web_res': {'query': '大模型训练实践', 'follow_up_questions': None, 'answer': '本项目是一个系统性的LLM 学习教程，将从NLP 的基本研究方法出发，根据LLM 的思路及原理逐层深入，依次为读者剖析LLM 的架构基础和训练过程。同时，我们会结合目前LLM 领域最 ...', 'images': [], 'results': [{'url': 'https://github.com/datawhalechina/happy-llm', 'title': 'datawhalechina/happy-llm: 从零开始的大语言模型原理与实践教程', 'content': '本项目是一个系统性的LLM 学习教程，将从NLP 的基本研究方法出发，根据LLM 的思路及原理逐层深入，依次为读者剖析LLM 的架构基础和训练过程。同时，我们会结合目前LLM 领域最 ...', 'score': None, 'raw_content': None}, {'url': 'https://github.com/liguodongiot/llm-action', 'title': 'GitHub - liguodongiot/llm-action: 本项目旨在分享大模型相关技术原理 ...', 'content': '下面汇总了我在大模型实践中训练相关的所有教程。从6B到65B，从全量微调到高效微调（LoRA，QLoRA，P-Tuning v2），再到RLHF（基于人工反馈的强化学习）。', 'score': None, 'raw_content': None}, {'url': 'https://zhuanlan.zhihu.com/p/682907673', 'title': '大模型实学习路线-从理论到实践 - 知乎专栏', 'content': '大模型初创或大厂自研大模型岗，具体有预训练组、后训练组（微调、强化学习对齐）、评测组、数据组、Infra优化组，但偏难。更多是大模型应用算法。 参考项目. 1、手把手教学 ...', 'score': None, 'raw_content': None}, {'url': 'https://aws.amazon.com/cn/blogs/china/practical-series-on-fine-tuning-large-language-models-part-one/', 'title': '炼石成丹：大语言模型微调实战系列（一）数据准备篇 - AWS', 'content': '利用社交平台的真实对话数据可以大大提高微调效果， 我们可以从常见的聊天工具或者社交平台上导出数据，作为训练数据，比如使用开源工具（如WeChatMsg）将聊天 ...', 'score': None, 'raw_content': None}, {'url': 'https://intro-llm.github.io/', 'title': '大规模语言模型：从理论到实践', 'content': '本书将介绍大语言模型的基础理论包括语言模型、分布式模型训练以及强化学习，并以Deepspeed-Chat框架为例介绍实现大语言模型和类ChatGPT系统的实践。 image. 张奇. 复旦大学 ...', 'score': None, 'raw_content': None}, {'url': 'https://pdf.dfcfw.com/pdf/H3_AP202502171643162092_1.pdf?1739804714000.pdf', 'title': '[PDF] 大模型概念、技术与应用实践', 'content': '本报告《大模型概念、技术与应用实践》将深入剖析大模型的. 核心 ... 练模型包含了预训练大模型（可以简称为“大模型”），预训练大模型包含了预 ...', 'score': None, 'raw_content': None}, {'url': 'https://www.infoq.cn/article/f55mgfyxqunuk6s1cqa1', 'title': '万字干货！手把手教你如何训练超大规模集群下的大语言模型| QCon', 'content': '快手总结了一套超大规模集群下大语言模型训练方案。该方案在超长文本场景下，在不改变模型表现的情况下，训练效率相较SOTA 开源方案，有显著的吞吐提升。', 'score': None, 'raw_content': None}, {'url': 'https://developer.nvidia.com/zh-cn/blog/fp8-llm-app-challenges/', 'title': 'FP8 在大模型训练中的应用、挑战及实践 - NVIDIA Developer', 'content': 'FP8 的训练效果我们一般通过观察Loss 曲线或下游任务的指标来进行评估。比如，会检查Loss 是否发散，从而判断FP8 是否有问题。同时我们也希望找到一些其他 ...', 'score': None, 'raw_content': None}, {'url': 'https://www.hiascend.com/developer/techArticles/20250623-1', 'title': '基于昇腾MindSpeed LLM的大模型微调训练实践-技术干货', 'content': '基于MindSpeed LLM高效分布式微调训练的关键特性 · 提供120+主流大模型，20种Handler风格数据集灵活切换 · 支持梯度累积/Zero冗余优化器/内存卸载/组合并行 ...', 'score': None, 'raw_content': None}, {'url': 'https://blog.csdn.net/qq_27590277/article/details/136425988', 'title': '从0开始预训练1.4b中文大模型实践 - CSDN博客', 'content': '在大模型的预训练中，数据准备与清洗是首要步骤，直接影响模型的性能和泛化能力。数据的收集应覆盖尽可能广泛的领域，确保多样性和代表性。清洗过程包括去重 ...', 'score': None, 'raw_content': None}], 'response_time': 2.200093509047292}, 'search_keyword': '大模型训练实践'}
 
-# --- Test for /api/task/update/detect ---
-print(f"--- Testing {DETECT_URL} ---")
-detect_payload = {
-    "task_data": task_data,
-    "user_message": "This is too basic for me. Can we go deeper into the implementation details?",
-    "lang": "zh",
-    "chat_id": "test_chat_123"
-}
+async def post_json(url, payload, projection="full", compression="none"):
+    """
+    使用共享客户端发送POST请求
 
-print(f"Request data: {json.dumps(detect_payload, indent=2, ensure_ascii=False)}")
+    参数:
+    - url: 请求URL
+    - payload: 请求体，其中的 task_data 按 projection 裁剪
+    - projection: task_data 投影方式，见 task_payload.PROJECTIONS
+    - compression: 请求体压缩方式，见 task_payload.COMPRESSIONS
 
-try:
-    response = requests.post(DETECT_URL, json=detect_payload)
-    response.raise_for_status()
-    print("Response:")
-    print(json.dumps(response.json(), indent=2, ensure_ascii=False))
-except requests.exceptions.RequestException as e:
-    print(f"\nRequest failed: {e}")
-    if e.response is not None:
-        print(f"Error response: {e.response.text}")
-
-print("\n" + "="*50 + "\n")
-
-print(f"--- Testing {EXECUTE_URL} ---")
-execute_payload = {
-    "task_data": task_data,
-    "suggestion": response.json()['result']['suggestion'],
-    "lang": "en",
-    "chat_id": "test_chat_456"
-}
-
-print(f"Request data: {json.dumps(execute_payload, indent=2, ensure_ascii=False)}")
-
-try:
-    response = requests.post(EXECUTE_URL, json=execute_payload)
-    response.raise_for_status()
+    返回:
+    - 成功时返回响应JSON，失败时打印错误并返回None
+    """
+    try:
+        body, headers = task_payload.encode_body(task_payload.project_payload(payload, projection), compression)
+        session = await http_client.get_session()
+        async with session.post(url, data=body, headers=headers) as response:
+            if response.status >= 400:
+                print(f"\nRequest failed: HTTP {response.status}")
+                print(f"Error response: {await response.text()}")
+                return None
+            return await request_timing.read_json(response)
+    except Exception as e:
+        print(f"\nRequest failed: {e}")
+        return None
+
+
+async def run_tests(server_url=BASE_URL, projection="full", compression="none"):
+    # 先确认样例任务仍符合任务模型，结构变化时直接报出字段路径
+    models.convert(task_data, models.Task)
+    DETECT_URL = f"{server_url}{DETECT_PATH}"
+    EXECUTE_URL = f"{server_url}{EXECUTE_PATH}"
+
+    # --- Test for /api/task/update/detect ---
+    print(f"--- Testing {DETECT_URL} ---")
+    detect_payload = {
+        "task_data": task_data,
+        "user_message": "This is too basic for me. Can we go deeper into the implementation details?",
+        "lang": "zh",
+        "chat_id": "test_chat_123"
+    }
+
+    print(f"Request data: {json.dumps(detect_payload, indent=2, ensure_ascii=False)}")
+
+    detect_result = await post_json(DETECT_URL, detect_payload, projection, compression)
+    if detect_result is None:
+        return
     print("Response:")
-    print(json.dumps(response.json(), indent=2, ensure_ascii=False))
-except requests.exceptions.RequestException as e:
-    print(f"\nRequest failed: {e}")
-    if e.response is not None:
-        print(f"Error response: {e.response.text}") 
\ No newline at end of file
+    print(json.dumps(detect_result, indent=2, ensure_ascii=False))
+
+    print("\n" + "="*50 + "\n")
+
+    print(f"--- Testing {EXECUTE_URL} ---")
+    execute_payload = {
+        "task_data": task_data,
+        "suggestion": detect_result['result']['suggestion'],
+        "lang": "en",
+        "chat_id": "test_chat_456"
+    }
+
+    print(f"Request data: {json.dumps(execute_payload, indent=2, ensure_ascii=False)}")
+
+    execute_result = await post_json(EXECUTE_URL, execute_payload, projection, compression)
+    if execute_result is not None:
+        updated = (execute_result.get("result") or {}).get("task")
+        if updated is not None:
+            execute_result["result"]["task"] = task_payload.restore_task(task_data, updated, projection)
+        print("Response:")
+        print(json.dumps(execute_result, indent=2, ensure_ascii=False))
+
+
+def load_update_corpus(plan_paths=None, messages_path=None, lang="zh"):
+    """
+    构造批量更新语料：已保存计划中的每个任务依次搭配一条用户反馈
+
+    参数:
+    - plan_paths: plan_and_tasks_*.json 文件列表，默认使用test_data下的样例
+    - messages_path: 用户反馈文件，每行一条，# 开头为注释；默认 DEFAULT_MESSAGES
+    - lang: 请求语言
+
+    返回:
+    - [{"task_data", "user_message", "lang", "chat_id"}, ...]
+    """
+    plan_paths = plan_paths or sorted(glob.glob(os.path.join(FIXTURE_DIR, "plan_and_tasks_*.json")))
+    messages = DEFAULT_MESSAGES
+    if messages_path:
+        with open(messages_path, "r", encoding="utf-8") as f:
+            messages = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    tasks = []
+    for path in plan_paths:
+        with open(path, "r", encoding="utf-8") as f:
+            plan = json.load(f)
+        chat_id = os.path.splitext(os.path.basename(path))[0].replace("plan_and_tasks_", "")
+        for step in plan.get("plan", []):
+            task = (step.get("task") or {}).get("task")
+            if task:
+                tasks.append((chat_id, task))
+    message_cycle = itertools.cycle(messages)
+    return [{"task_data": task, "user_message": next(message_cycle), "lang": lang, "chat_id": chat_id}
+            for chat_id, task in tasks]
+
+
+async def run_update_batch(server_url, items, repeat=1, detect_concurrency=8, execute_concurrency=4,
+                           projection="full", compression="none"):
+    """
+    批量任务更新：每项先detect，需要更新时再execute，两个阶段各自限制并发
+
+    detect 与 execute 使用独立的信号量，一项进入execute后立即释放detect名额，
+    因此慢的execute不会阻塞后续项的detect
+
+    参数:
+    - server_url: 服务器URL
+    - items: load_update_corpus 返回的语料
+    - repeat: 语料重复次数
+    - detect_concurrency: 同时进行的detect请求数上限
+    - execute_concurrency: 同时进行的execute请求数上限
+    - projection: task_data 投影方式
+    - compression: 请求体压缩方式
+
+    返回:
+    - 统计字典: 各阶段直方图与计数
+    """
+    stats = {
+        "detect": LatencyHistogram("detect"),
+        "execute": LatencyHistogram("execute"),
+        "end_to_end": LatencyHistogram("end_to_end"),
+        "updated": 0, "skipped": 0, "detect_failed": 0, "execute_failed": 0,
+    }
+    detect_semaphore = asyncio.Semaphore(detect_concurrency)
+    execute_semaphore = asyncio.Semaphore(execute_concurrency)
+    detect_url = f"{server_url}{DETECT_PATH}"
+    execute_url = f"{server_url}{EXECUTE_PATH}"
+
+    async def one(item):
+        start_time = time.perf_counter()
+        async with detect_semaphore:
+            detect_start = time.perf_counter()
+            detect_result = await post_json(detect_url, item, projection, compression)
+        detect_elapsed = time.perf_counter() - detect_start
+        result = (detect_result or {}).get("result") or {}
+        if not detect_result or not detect_result.get("success", True):
+            stats["detect_failed"] += 1
+            return
+        # 只记录成功调用的耗时，快速返回的错误不应拉低分位数
+        stats["detect"].record(detect_elapsed)
+        if not result.get("needUpdate"):
+            stats["skipped"] += 1
+            stats["end_to_end"].record(time.perf_counter() - start_time)
+            return
+        execute_payload = {
+            "task_data": item["task_data"],
+            "suggestion": result.get("suggestion", ""),
+            "lang": item["lang"],
+            "chat_id": item["chat_id"],
+        }
+        async with execute_semaphore:
+            execute_start = time.perf_counter()
+            execute_result = await post_json(execute_url, execute_payload, projection, compression)
+        execute_elapsed = time.perf_counter() - execute_start
+        if not execute_result or (execute_result.get("result") or {}).get("task") is None:
+            stats["execute_failed"] += 1
+            return
+        stats["execute"].record(execute_elapsed)
+        stats["updated"] += 1
+        stats["end_to_end"].record(time.perf_counter() - start_time)
+
+    total = len(items) * repeat
+    print(f"批量任务更新: {total} 项, detect并发 {detect_concurrency}, execute并发 {execute_concurrency}, "
+          f"投影 {projection}, 压缩 {compression}")
+    start_time = time.perf_counter()
+    await asyncio.gather(*(one(item) for item in items * repeat))
+    duration = time.perf_counter() - start_time
+
+    print(f"\n完成! 耗时 {duration:.2f}秒, 吞吐 {total / duration:.2f} 项/秒")
+    print(f"已更新 {stats['updated']}, 无需更新 {stats['skipped']}, "
+          f"detect失败 {stats['detect_failed']}, execute失败 {stats['execute_failed']}")
+    for stage in ("detect", "execute"):
+        count = stats[stage].count
+        print(f"{stage}: {count} 次, {count / duration:.2f} 次/秒")
+    print()
+    print(format_report([stats["detect"], stats["execute"], stats["end_to_end"]]))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测试任务更新 detect/execute API")
+    parser.add_argument("--server", default=BASE_URL, help="服务器URL")
+    parser.add_argument("--batch", action="store_true", help="批量模式：对已保存计划中的所有任务执行detect/execute")
+    parser.add_argument("--plans", nargs="*", help="批量模式使用的 plan_and_tasks_*.json，默认使用样例")
+    parser.add_argument("--messages", help="批量模式的用户反馈文件，每行一条")
+    parser.add_argument("--lang", default="zh", help="批量模式的请求语言")
+    parser.add_argument("--repeat", type=int, default=1, help="批量模式下语料重复次数")
+    parser.add_argument("--detect-concurrency", type=int, default=8, help="detect最大并发数")
+    parser.add_argument("--execute-concurrency", type=int, default=4, help="execute最大并发数")
+    task_payload.add_payload_args(parser)
+    http_client.add_client_args(parser)
+    args = parser.parse_args()
+    http_client.configure_from_args(args)
+
+    async def run():
+        try:
+            if args.batch:
+                items = load_update_corpus(args.plans, args.messages, args.lang)
+                await run_update_batch(args.server, items, args.repeat,
+                                       args.detect_concurrency, args.execute_concurrency,
+                                       args.projection, args.compress)
+            else:
+                await run_tests(args.server, args.projection, args.compress)
+        finally:
+            await http_client.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()